@@ -0,0 +1,160 @@
+# fakes.py — Simulated Hardware for Benchmarks
+# ELEC 421 Design
+# ─────────────────────────────────────────────────────────────────────
+# Responsibilities:
+#   - Put the DMS, sensor, LoRa and DCU module directories on sys.path the
+#     way the Pi deployment has them in one flat directory
+#   - Install fake smbus2, gpiozero, serial and calibration modules so the
+#     real DMS code runs unmodified on a plain Linux host
+#   - Model I2C and UART transfer time from the bus speeds, so timings of
+#     the real code paths keep roughly the Pi's proportions
+# ─────────────────────────────────────────────────────────────────────
+
+import sys
+import threading
+import time
+import types
+from pathlib import Path
+
+REPO = Path(__file__).resolve().parent.parent
+MODULE_DIRS = ("Data Management System", "Sensor Array Unit", "Network", "Dosing Control Unit")
+
+I2C_BIT_S  = 1 / 100_000   # 100 kHz standard-mode I2C
+UART_BIT_S = 1 / 115_200   # RAK3272 UART (LoRa_run.BAUD_RATE)
+
+# Readings returned by the fake EZO circuits, by I2C address
+EZO_VALUES = {0x66: "21.437", 0x64: "1234.5", 0x63: "6.21"}
+LEVEL_WET  = 700           # level pad value for "wet" (sensors.THRESHOLD is 540)
+
+
+def _busy_wait(seconds):
+    # time.sleep() is far too coarse for tens of microseconds
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+# ─────────────────────────────────────────────────────────────────────
+# smbus2
+# ─────────────────────────────────────────────────────────────────────
+
+class FakeSMBus:
+    """EZO circuits answer their last command; level boards return pad values."""
+
+    transfer_time = True       # False = no simulated wire time
+
+    def __init__(self, bus=1):
+        self.bus = bus
+        self._last = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def close(self):
+        pass
+
+    def _wire(self, nbytes):
+        if self.transfer_time:
+            # address + register + data, 9 bits per byte (ACK included)
+            _busy_wait((nbytes + 2) * 9 * I2C_BIT_S)
+
+    def write_i2c_block_data(self, addr, register, data, *args):
+        self._wire(len(data))
+        self._last[addr] = chr(register) + bytes(data).decode(errors="ignore")
+
+    def write_byte(self, addr, value):
+        self._wire(1)
+
+    def read_i2c_block_data(self, addr, register, length, *args):
+        self._wire(length)
+        if addr in EZO_VALUES:
+            body = [1] + list(EZO_VALUES[addr].encode())
+        else:
+            # water-level board: little-endian u16 per pad, two thirds wet
+            body = []
+            for i in range(length // 2):
+                value = LEVEL_WET if i % 3 else 100
+                body += [value & 0xFF, value >> 8]
+        return (body + [0] * length)[:length]
+
+
+# ─────────────────────────────────────────────────────────────────────
+# serial (RAK3272)
+# ─────────────────────────────────────────────────────────────────────
+
+class SerialException(Exception):
+    pass
+
+
+class FakeSerial:
+    """Answers AT commands with "OK" after the UART time of the command and reply."""
+
+    def __init__(self, *args, **kwargs):
+        self._rx = b""
+        self._lock = threading.Lock()
+
+    def write(self, data):
+        reply = b"OK\r\n"
+        if data.startswith(b"AT+NJS=?"):
+            reply = b"AT+NJS=1\r\nOK\r\n"
+        _busy_wait((len(data) + len(reply)) * 10 * UART_BIT_S)
+        with self._lock:
+            self._rx += reply
+        return len(data)
+
+    @property
+    def in_waiting(self):
+        return len(self._rx)
+
+    def read(self, n=1):
+        with self._lock:
+            out, self._rx = self._rx[:n], self._rx[n:]
+        return out
+
+    def fileno(self):
+        raise OSError("fake serial port has no file descriptor")
+
+    def close(self):
+        pass
+
+
+# ─────────────────────────────────────────────────────────────────────
+# gpiozero / calibration
+# ─────────────────────────────────────────────────────────────────────
+
+class FakePin:
+    def __init__(self, pin=None, *args, **kwargs):
+        self.pin = pin
+        self.value = 1
+        self.is_pressed = False
+        self.when_activated = None
+        self.when_deactivated = None
+
+    def close(self):
+        pass
+
+
+def install():
+    """Add the module directories to sys.path and install the fake hardware."""
+    for name in MODULE_DIRS:
+        path = str(REPO / name)
+        if path not in sys.path:
+            sys.path.insert(0, path)
+
+    smbus2 = types.ModuleType("smbus2")
+    smbus2.SMBus = FakeSMBus
+    serial = types.ModuleType("serial")
+    serial.Serial = FakeSerial
+    serial.SerialException = SerialException
+    gpiozero = types.ModuleType("gpiozero")
+    gpiozero.DigitalInputDevice = gpiozero.Button = gpiozero.LED = FakePin
+    calibration = types.ModuleType("calibration")
+    calibration.BTN_BACK = FakePin(5)
+    calibration.BTN_UP = FakePin(6)
+    calibration.launch_calibration_ui = lambda: None
+
+    for module in (smbus2, serial, gpiozero, calibration):
+        sys.modules[module.__name__] = module
@@ -0,0 +1,342 @@
+# run_benchmarks.py — DMS Hot-Path Benchmarks
+# ELEC 421 Design
+# ─────────────────────────────────────────────────────────────────────
+# Responsibilities:
+#   - Time the DMS hot paths against simulated hardware (fakes.py):
+#       LoRa payload encode and downlink decode, read_all_sensors on a fake
+#       bus, CSV append and limit restore at 10k/1M rows, send_at through
+#       a fake serial port, and sampler tick jitter under sensor load
+#   - Compare every result with baseline.json and exit non-zero when one
+#     is slower than the baseline by more than the threshold
+#
+#   python3 run_benchmarks.py                    # run and compare
+#   python3 run_benchmarks.py --quick            # fewer iterations, no 1M-row CSV
+#   python3 run_benchmarks.py --update-baseline  # record this machine's baseline
+#   python3 run_benchmarks.py --only codec csv   # run some groups only
+# ─────────────────────────────────────────────────────────────────────
+
+import argparse
+import contextlib
+import csv
+import io
+import json
+import logging
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import fakes
+
+fakes.install()
+
+import DMS
+import LoRa_run
+import dms_log
+import sensors
+from runtime import BridgeQueue, ServiceRuntime
+
+# ─────────────────────────────────────────────────────────────────────
+# Configuration
+# ─────────────────────────────────────────────────────────────────────
+
+BASELINE_FILE = Path(__file__).resolve().parent / "baseline.json"
+THRESHOLD     = 0.25        # Fail when a result is this much slower than baseline
+SEED          = 421
+
+# Differences smaller than this are timer noise, whatever the ratio
+ABS_SLACK = {"us": 1.0, "ms": 1.0, "s": 0.05}
+
+EZO_DELAYS = ("RTD_DELAY", "EC_TEMP_DELAY", "EC_MEAS_DELAY", "PH_TEMP_DELAY", "PH_MEAS_DELAY")
+
+BENCHMARKS = {}
+
+
+def benchmark(group):
+    def register(fn):
+        BENCHMARKS.setdefault(group, []).append(fn)
+        return fn
+    return register
+
+
+def per_op(fn, number, repeat=9):
+    """Best-of-`repeat` seconds per call of fn() over `number` calls."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+
+@contextlib.contextmanager
+def quiet():
+    """Keep DMS's dms_log records, and any stray print(), out of the benchmark output."""
+    root = logging.getLogger(dms_log.ROOT)
+    saved = root.level
+    root.setLevel(logging.CRITICAL + 1)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            yield
+    finally:
+        root.setLevel(saved)
+
+
+@contextlib.contextmanager
+def ezo_delays(scale):
+    saved = {name: getattr(sensors, name) for name in EZO_DELAYS}
+    for name, value in saved.items():
+        setattr(sensors, name, value * scale)
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            setattr(sensors, name, value)
+
+
+# ─────────────────────────────────────────────────────────────────────
+# Codec
+# ─────────────────────────────────────────────────────────────────────
+
+@benchmark("codec")
+def bench_codec(quick, workdir):
+    rng = random.Random(SEED)
+    samples = [dict(ec=rng.uniform(0, 3000), ph=rng.uniform(4, 9), temperature=rng.uniform(10, 35),
+                    o2=rng.uniform(0, 12), water_level=rng.uniform(0, 100),
+                    transpiration_count=rng.randint(0, 40), ec_pump=rng.random() < 0.1,
+                    ph_pump=rng.random() < 0.1, circ_pump=rng.random() < 0.95)
+               for _ in range(1000)]
+    it = iter(samples * 1000)
+    encode = per_op(lambda: DMS.build_lora_payload(**next(it)), 500 if quick else 2000)
+
+    downlinks = [bytes([rng.randrange(256) for _ in range(9 + i % 2)]) for i in range(1000)]
+    it2 = iter(downlinks * 1000)
+    decode = per_op(lambda: DMS.decode_downlink(next(it2)), 2000 if quick else 10000)
+    return {"codec.build_lora_payload": (encode * 1e6, "us"),
+            "codec.decode_downlink": (decode * 1e6, "us")}
+
+
+# ─────────────────────────────────────────────────────────────────────
+# Sensors
+# ─────────────────────────────────────────────────────────────────────
+
+@benchmark("sensors")
+def bench_sensors(quick, workdir):
+    sensors.init_flow_pin()
+    bus = fakes.FakeSMBus(1)
+    runs = 1 if quick else 3
+
+    # Full wall time with the real EZO conversion delays
+    walls = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        sensors.read_all_sensors(bus)
+        walls.append(time.perf_counter() - start)
+
+    tanks = [sensors.TankAddresses(f"t{i}", mux_channel=i) for i in range(3)]
+    start = time.perf_counter()
+    sensors.read_tanks(bus, tanks)
+    three = time.perf_counter() - start
+
+    # Code and bus time only (EZO delays removed)
+    with ezo_delays(0.0):
+        overhead = per_op(lambda: sensors.read_all_sensors(bus), 20 if quick else 100)
+    return {"sensors.read_all_sensors": (statistics.median(walls), "s"),
+            "sensors.read_tanks_3": (three, "s"),
+            "sensors.read_all_sensors_no_delay": (overhead * 1e3, "ms")}
+
+
+# ─────────────────────────────────────────────────────────────────────
+# CSV
+# ─────────────────────────────────────────────────────────────────────
+
+def _row(i):
+    return ["2025-01-01", f"{i % 24:02d}:00:00", 6.2, 1234.5, True, False, False,
+            21.4, 65, 5.8, 6.8, 1100, 1500, 1300, 6.2]
+
+
+def _write_csv(path, rows):
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Date", "Time", "pH", "ec", "Circulation", "pH pump", "EC pump",
+                         "Temperature", "Water Level", "pH min", "pH max", "EC min",
+                         "EC max", "EC Setpoint", "pH Setpoint"])
+        writer.writerows(_row(i) for i in range(rows))
+
+
+@benchmark("csv")
+def bench_csv(quick, workdir):
+    results = {}
+    path = workdir / "append.csv"
+    DMS.init_csv(path)
+    rows = [_row(i) for i in range(2000 if quick else 10000)]
+    start = time.perf_counter()
+    for row in rows:
+        DMS.append_csv_row(row, path)
+    results["csv.append_csv_row"] = ((time.perf_counter() - start) / len(rows) * 1e6, "us")
+
+    saved = DMS.CSV_FILE
+    try:
+        for label, n in (("10k", 10_000), ("1M", 1_000_000)):
+            if quick and n > 10_000:
+                continue
+            DMS.CSV_FILE = workdir / f"limits_{label}.csv"
+            _write_csv(DMS.CSV_FILE, n)
+            with quiet():
+                cost = per_op(DMS._load_limits_from_csv, 50)
+            results[f"csv.load_limits_{label}"] = (cost * 1e3, "ms")
+    finally:
+        DMS.CSV_FILE = saved
+    return results
+
+
+# ─────────────────────────────────────────────────────────────────────
+# LoRa
+# ─────────────────────────────────────────────────────────────────────
+
+@benchmark("lora")
+def bench_lora(quick, workdir):
+    saved = LoRa_run.ser
+    LoRa_run.ser = fakes.FakeSerial()
+    payload = DMS.build_lora_payload(1234, 6.2, 21.4, 8.0, 65, 3, False, False, True)[1]
+    try:
+        # delay=0: the time beyond the fixed reply wait (UART, lock, parsing)
+        rtt = per_op(lambda: LoRa_run.send_at(f"AT+SEND=2:{payload}", delay=0),
+                     200 if quick else 1000)
+    finally:
+        LoRa_run.ser = saved
+    return {"lora.send_at": (rtt * 1e6, "us")}
+
+
+# ─────────────────────────────────────────────────────────────────────
+# Sampler jitter
+# ─────────────────────────────────────────────────────────────────────
+
+class _JitterRecorder:
+    def __init__(self, ticks, runtime):
+        self.values  = []
+        self.ticks   = ticks
+        self.runtime = runtime
+
+    def observe(self, value, **labels):
+        self.values.append(value)
+        if len(self.values) >= self.ticks:
+            self.runtime.request_shutdown()
+
+
+@benchmark("sampler")
+def bench_sampler(quick, workdir):
+    """Sampler ticks every 50 ms while the sensor loop polls the fake bus."""
+    runtime = ServiceRuntime()
+    recorder = _JitterRecorder(60 if quick else 300, runtime)
+    saved = (DMS.runtime, DMS.CSV_FILE, DMS.INTERVAL_SEC, DMS.SAMPLER_JITTER_SECONDS)
+    DMS.runtime, DMS.CSV_FILE, DMS.INTERVAL_SEC = runtime, workdir / "sampler.csv", 0.05
+    DMS.SAMPLER_JITTER_SECONDS = recorder
+
+    async def drain_uplinks():
+        while True:
+            await DMS.uplink_queue.get()
+
+    async def start():
+        DMS.uplink_queue = BridgeQueue(runtime, maxsize=DMS.UPLINK_QUEUE_MAX, priority=True)
+        runtime.spawn("sensors", DMS.sensor_polling_loop)
+        runtime.spawn("sampler", DMS.sampling_loop)
+        runtime.spawn("uplink", drain_uplinks)
+
+    try:
+        with ezo_delays(0.02), quiet():
+            runtime.run(start)
+    finally:
+        DMS.runtime, DMS.CSV_FILE, DMS.INTERVAL_SEC, DMS.SAMPLER_JITTER_SECONDS = saved
+        DMS.uplink_queue = None
+
+    values = sorted(recorder.values)
+    pick = lambda q: values[min(len(values) - 1, int(q * len(values)))]
+    return {"sampler.jitter_p50": (pick(0.50) * 1e3, "ms"),
+            "sampler.jitter_p99": (pick(0.99) * 1e3, "ms")}
+
+
+# ─────────────────────────────────────────────────────────────────────
+# Baseline comparison
+# ─────────────────────────────────────────────────────────────────────
+
+def compare(results, baseline, threshold):
+    """Print a table against the baseline; return the names that regressed."""
+    regressed = []
+    print(f"\n{'benchmark':<36}{'result':>14}{'baseline':>14}{'change':>9}")
+    for name, (value, unit) in results.items():
+        base = baseline.get(name)
+        if base is None or base["unit"] != unit:
+            print(f"{name:<36}{value:>11.3f} {unit:<2}{'—':>14}")
+            continue
+        ratio = value / base["value"] - 1 if base["value"] else 0.0
+        slow = ratio > threshold and value - base["value"] > ABS_SLACK[unit]
+        if slow:
+            regressed.append(name)
+        print(f"{name:<36}{value:>11.3f} {unit:<2}{base['value']:>11.3f} {unit:<2}"
+              f"{ratio:>+8.0%}{'  REGRESSION' if slow else ''}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="DMS hot-path benchmarks")
+    parser.add_argument("--quick", action="store_true", help="fewer iterations, skip 1M-row CSV")
+    parser.add_argument("--only", nargs="+", choices=sorted(BENCHMARKS), help="benchmark groups to run")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD,
+                        help=f"allowed slowdown before failing (default {THRESHOLD:.0%})")
+    parser.add_argument("--update-baseline", action="store_true",
+                        help="write these results to baseline.json")
+    parser.add_argument("--json", metavar="FILE", help="also write the results to FILE")
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="dms-bench-") as tmp:
+        for group, fns in BENCHMARKS.items():
+            if args.only and group not in args.only:
+                continue
+            for fn in fns:
+                print(f"[BENCH] {fn.__name__} ...", flush=True)
+                results.update(fn(args.quick, Path(tmp)))
+
+    report = {
+        "meta": {"date": datetime.now().isoformat(timespec="seconds"),
+                 "python": platform.python_version(), "machine": platform.machine(),
+                 "platform": platform.platform(), "quick": args.quick},
+        "results": {name: {"value": round(value, 6), "unit": unit}
+                    for name, (value, unit) in results.items()},
+    }
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2) + "\n")
+
+    baseline = {}
+    if BASELINE_FILE.exists():
+        baseline = json.loads(BASELINE_FILE.read_text())["results"]
+    regressed = compare(results, baseline, args.threshold)
+
+    if args.update_baseline:
+        if BASELINE_FILE.exists():
+            merged = json.loads(BASELINE_FILE.read_text())
+            merged["meta"] = report["meta"]
+            merged["results"].update(report["results"])
+            report = merged
+        BASELINE_FILE.write_text(json.dumps(report, indent=2) + "\n")
+        print(f"\n[BENCH] Baseline written to {BASELINE_FILE}")
+        return 0
+    if not baseline:
+        print("\n[BENCH] No baseline yet — run with --update-baseline to record one.")
+        return 0
+    if regressed:
+        print(f"\n[BENCH] {len(regressed)} regression(s) over {args.threshold:.0%}: "
+              f"{', '.join(regressed)}")
+        return 1
+    print(f"\n[BENCH] No regressions over {args.threshold:.0%}.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,18 +4,23 @@
 # - LoRaWAN communication (uplink and downlink)
 # - UDP listener for local updates (e.g. from a mobile app)
 # - CSV logging of sensor data and limits
+# - Checkpoints of queued frames and runtime state for warm restarts
+# All service loops are coroutines on one asyncio runtime (runtime.py);
+# blocking I2C, serial and file calls run on its bounded executor.
 
 import sys
 if __name__ == "__main__":
     sys.modules["DMS"] = sys.modules["__main__"]
 
-from gpiozero import LED, Button
+import boot_timeline
+import asyncio
 import csv
 import json
+import signal
+import struct
 import threading
 import time
 import socket
-import queue
 from datetime import datetime
 from pathlib import Path
 #from bitarray import bitarray
@@ -23,7 +28,24 @@ from pathlib import Path
 import sensors
 import LoRa_run
 import os
-import calibration
+import alerts
+import checkpoint
+import config
+import dms_log
+import dose_journal
+import flow_monitor
+import local_http
+import live_stream
+import shm_state
+import reservoir
+import metrics
+import tracing
+import udp_listener
+from coordinator import PauseCoordinator
+from runtime import ServiceRuntime, BridgeQueue
+# calibration (framebuffer/PIL UI) is imported by the calibration monitor
+# once the system is up, so it stays off the boot critical path.
+# Importing this module has no side effects; main() does the setup.
 
 # ==========================================================
 # Initialization
@@ -38,14 +60,35 @@ except ImportError:
 I2C_BUS = 1
 
 
-#Initializing LoRa Downlink Queue
-downlink_queue = queue.Queue()
-LoRa_run.set_downlink_queue(downlink_queue)
+#LoRa Downlink Queue (created on the runtime loop in main)
+downlink_queue = None
+
+#Uplink queue (created on the runtime loop in main). Entries are
+#(priority, seq, port, payload_hex); alerts go out ahead of telemetry.
+uplink_queue = None
+UPLINK_QUEUE_MAX   = 32
+ALERT_PRIORITY     = 0
+TELEMETRY_PRIORITY = 1
+_uplink_seq = 0
+
+#Telemetry payload version. 2 appends a sequence number and the measurement
+#time so the cloud side can order and de-duplicate frames (LORA PAYLOAD FORMAT)
+PAYLOAD_VERSION = 1
+ANCHOR_EVERY    = 16     # v2: every 16th frame carries a full timestamp
+
+#Limit alerts, evaluated on every sensor poll
+alert_engine = alerts.AlertEngine()
+
+#Service runtime (created in main)
+runtime = None
+SERIAL_RX_WAIT = 5.0     # max seconds each serial RX wait blocks an executor thread
+CAL_IDLE_POLL  = 0.2     # button poll period while no calibration combo is held
 
 
 CSV_FILE = Path("/home/ohm/Documents/sensor_database.csv")
-CSV_FILE.parent.mkdir(parents=True, exist_ok=True)
-INTERVAL_SEC = 300   # user-settable logging interval
+CSV_TAIL_BYTES = 4096   # enough of the file end to hold the last row
+INTERVAL_SEC = 300   # user-settable logging interval (config.py: sampling.interval_s)
+DOSE_JOURNAL = dose_journal.JOURNAL_FILE
 
 
 # Initial Default limits
@@ -58,47 +101,79 @@ limits = {
     "ph_set": 6.8
 }
 
-def _load_limits_from_csv():
+def _csv_path(tank=None):
+    """CSV log for a reservoir; the main tank (or None) uses CSV_FILE."""
+    if tank is None or tank.csv_file is None:
+        return CSV_FILE
+    return tank.csv_file
+
+
+def _read_last_csv_row(path=None):
+    """Return (header_only, last_row) reading only the tail of the CSV."""
+    with open(path or CSV_FILE, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        start = max(0, size - CSV_TAIL_BYTES)
+        f.seek(start)
+        lines = f.read().decode(errors="ignore").splitlines()
+    if start > 0:
+        lines = lines[1:]           # first line may be cut mid-row
+    lines = [line for line in lines if line.strip()]
+    if not lines:
+        return False, None
+    if start == 0 and len(lines) == 1:
+        return True, None           # header only
+    return False, next(csv.reader([lines[-1]]))
+
+
+def _load_limits_from_csv(tank=None):
     """Restore limits from the last row of the CSV if it exists."""
-    if not CSV_FILE.exists():
-        print("[DMS] No CSV found — using default limits.")
+    path = _csv_path(tank)
+    target = tank.limits if tank is not None else limits
+    tank_name = tank.name if tank is not None else "main"
+    if not path.exists():
+        log.info("No CSV found, using default limits", tank=tank_name)
         return
     try:
-        with open(CSV_FILE, "r") as f:
-            reader = csv.reader(f)
-            header = next(reader, None)
-            if header is None:
-                return
-            last_row = None
-            for row in reader:
-                last_row = row
-            if last_row is None:
-                print("[DMS] CSV has header only — using default limits.")
-                return
-            # CSV columns: Date(0) Time(1) pH(2) ec(3) Circulation(4)
-            #   pH_pump(5) EC_pump(6) Temperature(7) Water_Level(8)
-            #   pH_min(9) pH_max(10) EC_min(11) EC_max(12) EC_set(13) pH_set(14)
-            limits["ph_min"] = float(last_row[9])
-            limits["ph_max"] = float(last_row[10])
-            limits["ec_min"] = float(last_row[11])
-            limits["ec_max"] = float(last_row[12])
-            limits["ec_set"] = float(last_row[13])
-            limits["ph_set"] = float(last_row[14])
-            print(f"[DMS] Limits restored from CSV: {limits}")
+        header_only, last_row = _read_last_csv_row(path)
+        if last_row is None:
+            if header_only:
+                log.info("CSV has header only, using default limits", tank=tank_name)
+            return
+        # CSV columns: Date(0) Time(1) pH(2) ec(3) Circulation(4)
+        #   pH_pump(5) EC_pump(6) Temperature(7) Water_Level(8)
+        #   pH_min(9) pH_max(10) EC_min(11) EC_max(12) EC_set(13) pH_set(14)
+        #   Flow_duty(15) Flow_transitions(16) Flow_longest_off(17)
+        target["ph_min"] = float(last_row[9])
+        target["ph_max"] = float(last_row[10])
+        target["ec_min"] = float(last_row[11])
+        target["ec_max"] = float(last_row[12])
+        target["ec_set"] = float(last_row[13])
+        target["ph_set"] = float(last_row[14])
+        log.info("Limits restored from CSV", tank=tank_name, **target)
     except Exception as e:
-        print(f"[DMS] Could not load limits from CSV: {e} — using defaults.")
+        log.warning("Could not load limits from CSV, using defaults", tank=tank_name, error=e)
+
 
-_load_limits_from_csv()
+def init_storage():
+    """Create CSV/journal directories and restore limits. Called once from main()."""
+    DOSE_JOURNAL.parent.mkdir(parents=True, exist_ok=True)
+    checkpoint.CHECKPOINT_FILE.parent.mkdir(parents=True, exist_ok=True)
+    for tank in reservoirs:
+        _csv_path(tank).parent.mkdir(parents=True, exist_ok=True)
+        _load_limits_from_csv(tank)
 
-limits_lock = threading.Lock()
+
+limits_lock = tracing.TracedLock("limits_lock")
 
 # Transpiration counter
 transpiration_count = 0
 transpiration_lock = threading.Lock()
 
 # Global UDP Configuration
-UDP_HOST = "0.0.0.0"
-UDP_PORT = 5001
+UDP_HOST = udp_listener.UDP_HOST
+UDP_PORT = udp_listener.UDP_PORT
+udp_ingest = None   # udp_listener.UDPIngest, created on the runtime loop
 
 #Initialize Sensors
 # (flow pin init moved into main() — GPIO may not be ready at import time)
@@ -112,10 +187,86 @@ sensor_state = {
     "ec_pump": False,
     "temperature": 0.0,
     "o2": 0.0,
-    "transpiration": 0,
+    "transpiration": 0,            # counts injected over UDP (dms_tester)
+    "transpiration_rate": None,    # L/m²/day from transpiration.py
 }
 
-sensor_lock = threading.Lock()
+sensor_lock = tracing.TracedLock("sensor_lock")
+
+# Set after the first successful sensor poll; DCU waits on it instead of
+# a fixed start-up delay
+sensors_ready = threading.Event()
+
+_INITIAL_SENSOR_STATE = dict(sensor_state)
+_DEFAULT_LIMITS       = dict(limits)
+
+# ==========================================================
+# Reservoirs (reservoir.py)
+# ==========================================================
+# The main reservoir is the original tank: it wraps the module-level
+# state above, CSV_FILE, FPorts 2/3 and the DCU_Logic pump addresses.
+# More tanks are listed under "reservoirs" in config.CONFIG_FILE, one
+# object of reservoir.Reservoir keyword arguments each, e.g.
+#   {"reservoirs": [{"name": "tank2", "i2c_bus": 3,
+#                    "ph_pump_addr": "0x57", "ec_pump_addr": "0x58",
+#                    "tank": {"rtd": "0x56", "ec": "0x54", "ph": "0x53",
+#                             "mux_channel": 1, "flow_pin": 20},
+#                    "csv_file": "/home/ohm/Documents/sensor_database_tank2.csv",
+#                    "uplink_port": 12, "alert_port": 13, "dose_port": 14}]}
+# "tank" holds sensors.TankAddresses arguments; addresses may be written
+# as hex strings. The list is read once at start-up.
+# Tanks on the same I2C bus share one polling task with overlapped EZO
+# waits; each bus gets its own task.
+
+main_reservoir = reservoir.Reservoir(
+    "main", sensor_state, limits, tank=sensors.DEFAULT_TANK, i2c_bus=I2C_BUS,
+    uplink_port=LoRa_run.UPLINK_PORT, alert_port=alerts.ALERT_PORT,
+    sensor_lock=sensor_lock, limits_lock=limits_lock,
+    sensors_ready=sensors_ready, alert_engine=alert_engine)
+
+reservoirs = [main_reservoir]
+
+_ADDRESS_KEYS = {"ph_pump_addr", "ec_pump_addr", "rtd", "ec", "ph", "level_low", "level_high"}
+
+
+def _addresses(cfg):
+    """Copy of cfg with "0x.." address strings turned into ints."""
+    return {k: int(v, 0) if k in _ADDRESS_KEYS and isinstance(v, str) else v
+            for k, v in cfg.items()}
+
+
+def _reservoir_from_config(cfg):
+    cfg = _addresses(cfg)
+    name = cfg.pop("name")
+    tank = sensors.TankAddresses(name, **_addresses(cfg.pop("tank", {})))
+    if cfg.get("csv_file") is not None:
+        cfg["csv_file"] = Path(cfg["csv_file"])
+    return reservoir.Reservoir(name, dict(_INITIAL_SENSOR_STATE), dict(_DEFAULT_LIMITS),
+                               tank=tank, **cfg)
+
+
+def init_reservoirs():
+    """Build the extra reservoirs listed in the config file. Called once from main()."""
+    for cfg in config.reservoirs():
+        try:
+            tank = _reservoir_from_config(cfg)
+        except (KeyError, TypeError, ValueError) as e:
+            log.error("Invalid reservoir in config file, skipped", name=cfg.get("name"), error=e)
+            continue
+        if any(t.name == tank.name for t in reservoirs):
+            log.error("Duplicate reservoir name in config file, skipped", name=tank.name)
+            continue
+        reservoirs.append(tank)
+    if len(reservoirs) > 1:
+        log.info("Reservoirs configured", names=",".join(t.name for t in reservoirs))
+
+
+def reservoirs_by_bus():
+    """{I2C bus number: [reservoirs on it]} in configuration order."""
+    buses = {}
+    for tank in reservoirs:
+        buses.setdefault(tank.i2c_bus, []).append(tank)
+    return buses
 
 #Backlight Control
 def backlight_off():
@@ -124,17 +275,296 @@ def backlight_off():
 #Calibration
 
 ENTRY_HOLD_SECONDS = 3.0
+PAUSE_ACK_TIMEOUT  = 10.0   # max seconds to wait for loops to go quiescent
+CAL_LOAD_MAX_WAIT  = 60     # seconds after start before the UI loads regardless
 
-BTN_BACK = calibration.BTN_BACK
-BTN_UP   = calibration.BTN_UP
+calibration = None   # calibration module, loaded by calibration_monitor_loop
 
-pause_event = threading.Event()
-pause_event.set()
+# Loops that touch hardware register here and acknowledge pauses
+coordinator = PauseCoordinator()
 
-shutdown_event = threading.Event()
 calibration_lock = threading.Lock()
 
 
+# ==========================================================
+# Logging (dms_log.py; readings and frames are DEBUG, set DMS_LOG_LEVEL)
+# ==========================================================
+
+log         = dms_log.get_logger("dms")
+sensors_log = dms_log.get_logger("sensors")
+filter_log  = dms_log.get_logger("filter")
+lora_log    = dms_log.get_logger("lora")
+udp_log     = dms_log.get_logger("udp")
+
+# ==========================================================
+# Metrics (Prometheus text at http://<pi>:HTTP_PORT/metrics)
+# ==========================================================
+
+SENSOR_READ_BUCKETS = (0.5, 1, 2, 3, 4, 5, 7.5, 10, 15, 30)
+
+SENSOR_READ_SECONDS = metrics.REGISTRY.histogram(
+    "dms_sensor_read_seconds", "Duration of one read_all_sensors() call",
+    buckets=SENSOR_READ_BUCKETS)
+I2C_LATENCY_SECONDS = metrics.REGISTRY.histogram(
+    "dms_i2c_read_seconds", "Per-device I2C read latency including EZO delays",
+    labels=("device",))
+SENSOR_POLL_ERRORS = metrics.REGISTRY.counter(
+    "dms_sensor_poll_errors_total", "Sensor polls that raised an error")
+SENSOR_OUTLIERS = metrics.REGISTRY.counter(
+    "dms_sensor_outliers_total", "Readings replaced by the Hampel filter",
+    labels=("tank", "channel"))
+SAMPLER_JITTER_SECONDS = metrics.REGISTRY.histogram(
+    "dms_sampler_jitter_seconds", "Lateness of each sampler tick against its schedule")
+AT_RTT_SECONDS = metrics.REGISTRY.histogram(
+    "dms_lora_at_rtt_seconds", "AT command round-trip time on the LoRa serial port",
+    labels=("command",))
+UPLINKS = metrics.REGISTRY.counter(
+    "dms_lora_uplinks_total", "Uplink attempts by FPort and result",
+    labels=("port", "result"))
+DOSES = metrics.REGISTRY.counter(
+    "dcu_doses_total", "Finished DCU doses by pump and result",
+    labels=("pump", "result"))
+DOSED_ML = metrics.REGISTRY.counter(
+    "dcu_dispensed_ml_total", "Millilitres dispensed by each DCU pump",
+    labels=("pump",))
+metrics.REGISTRY.gauge(
+    "dms_flow_transitions", "Debounced flow switch transitions since start", labels=("tank",),
+    fn=lambda: {(t.name,): t.flow.transitions_total for t in reservoirs if t.flow.attached})
+metrics.REGISTRY.gauge(
+    "dms_config", "Current value of each runtime setting (config.py)", labels=("key",),
+    fn=lambda: {(k,): v for k, v in config.values().items()})
+metrics.REGISTRY.gauge(
+    "dms_log_records", "Log records suppressed as repeats or dropped with the queue full",
+    labels=("stat",), fn=lambda: {(k,): v for k, v in dms_log.stats().items()})
+metrics.REGISTRY.gauge(
+    "dms_downlink_queue_depth", "Downlinks waiting for the listener",
+    fn=lambda: downlink_queue.qsize() if downlink_queue is not None else 0)
+metrics.REGISTRY.gauge(
+    "dms_uplink_queue_depth", "Frames waiting for the uplink loop",
+    fn=lambda: uplink_queue.qsize() if uplink_queue is not None else 0)
+metrics.REGISTRY.gauge(
+    "dms_pause_seconds", "Total seconds the system has spent paused for calibration",
+    fn=lambda: coordinator.paused_total + (
+        time.monotonic() - coordinator.paused_since if coordinator.paused_since else 0.0))
+metrics.REGISTRY.gauge(
+    "dms_alerts_suppressed", "Alert state changes held back by cooldown or rate limit",
+    fn=lambda: alert_engine.suppressed)
+metrics.REGISTRY.gauge(
+    "dms_task_restarts", "Restarts of each supervised runtime task", labels=("task",),
+    fn=lambda: {(name,): h["restarts"] for name, h in runtime.health().items()})
+
+http_server = local_http.LocalHTTPServer()
+
+# Live snapshot stream for LAN dashboards (GET /stream, Server-Sent Events)
+stream = live_stream.SnapshotBroadcaster()
+# Latest state in shared memory for other local processes (shm_state.py)
+shm_writer = None
+# Every dose the DCU runs, in start order (dose_journal.py); opened in start_services()
+journal = None
+
+metrics.REGISTRY.gauge("dms_stream_clients", "Connected /stream clients",
+                       fn=stream.client_count)
+metrics.REGISTRY.gauge("dms_stream_slow_drops", "/stream clients dropped for falling behind",
+                       fn=lambda: stream.slow_drops)
+
+
+# Tracing (tracing.py): SIGUSR2 toggles capture; stopping dumps a
+# Chrome/Perfetto trace to tracing.TRACE_DIR
+TRACE_AT_BOOT         = False   # start tracing as soon as services start
+TRACE_MALLOC_INTERVAL = None    # seconds between tracemalloc samples (None = off)
+
+
+def toggle_trace():
+    """SIGUSR2 handler: the dump writes a file, so it runs on the executor."""
+    runtime.executor.submit(tracing.toggle, TRACE_MALLOC_INTERVAL)
+
+
+def _stop_trace():
+    if tracing.enabled:
+        tracing.stop()
+        tracing.dump()
+
+
+def _sensor_timing(device, seconds):
+    I2C_LATENCY_SECONDS.observe(seconds, device=device)
+    tracing.complete(f"read {device}", "sensor", seconds)
+
+
+def _at_timing(command, seconds):
+    AT_RTT_SECONDS.observe(seconds, command=command)
+    tracing.complete(command, "lora", seconds)
+
+
+def _metric_pump(pump, tank):
+    return pump if tank is None or tank.is_main else f"{tank.name}.{pump}"
+
+
+def _journal(method, pump, *args):
+    """Call journal.<method>(*args); False if the journal is missing or failed."""
+    if journal is None:
+        return False
+    try:
+        return getattr(journal, method)(*args)
+    except OSError as e:
+        log.error("Could not journal dose", pump=pump, error=e)
+        return False
+
+
+def record_dose_start(job, tank=None, reading=None, setpoint=None):
+    """Journal a DoseJob the pump has just accepted (called by DCU).
+
+    `reading` and `setpoint` are the value that triggered the dose and the
+    target it was dosing towards.
+    """
+    tank_index = reservoirs.index(tank or main_reservoir)
+    _journal("begin", _metric_pump(job.pump, tank),
+             dose_journal.event_from_job(job, tank_index, reading, setpoint))
+
+
+def record_dose_failure(pump, volume_ml, rate_ml_min, tank=None, reading=None, setpoint=None):
+    """Count and journal a dose the pump would not start."""
+    DOSES.inc(pump=_metric_pump(pump, tank), result="error")
+    tank_index = reservoirs.index(tank or main_reservoir)
+    _journal("finish", _metric_pump(pump, tank),
+             dose_journal.failed_event(pump, tank_index, volume_ml, rate_ml_min,
+                                       reading, setpoint))
+
+
+def resume_dose_record(job, tank=None):
+    """Continue the journal record of a dose adopted after a restart."""
+    tank_index = reservoirs.index(tank or main_reservoir)
+    if not _journal("reopen", _metric_pump(job.pump, tank), tank_index, job.pump):
+        record_dose_start(job, tank)
+
+
+def record_dose(job, tank=None, reading=None, setpoint=None):
+    """Count a finished DoseJob and complete its journal record (DCU done-callback)."""
+    pump = _metric_pump(job.pump, tank)
+    result = "error" if job.future.exception() is not None else "ok"
+    DOSES.inc(pump=pump, result=result)
+    (tank or main_reservoir).transpiration.mark_event(time.monotonic())
+    if job.dispensed_ml:
+        DOSED_ML.inc(job.dispensed_ml, pump=pump)
+    tank_index = reservoirs.index(tank or main_reservoir)
+    _journal("finish", pump, dose_journal.event_from_job(job, tank_index, reading, setpoint))
+
+
+metrics.REGISTRY.gauge(
+    "dms_udp_ingest", "UDP listener datagram/field counts (received, dropped, rejected, ...)",
+    labels=("stat",),
+    fn=lambda: {(k,): v for k, v in udp_ingest.stats.as_dict().items()} if udp_ingest else {})
+
+
+async def metrics_handler(request, writer):
+    await local_http.respond(writer, 200, metrics.REGISTRY.render(), metrics.CONTENT_TYPE)
+
+
+async def config_handler(request, writer):
+    """GET /config — current settings and the most recent changes."""
+    body = json.dumps({"values": config.values(), "changes": list(config.history)}, indent=2)
+    await local_http.respond(writer, 200, body + "\n", "application/json")
+
+
+_analytics = {}                 # reservoir name -> analytics.Analytics
+_analytics_lock = asyncio.Lock()
+
+
+async def _run_analytics(tank):
+    """Update one reservoir's analytics tables on the executor."""
+    import analytics
+    async with _analytics_lock:
+        job = _analytics.get(tank.name)
+        if job is None:
+            job = await runtime.run_blocking(analytics.Analytics, _csv_path(tank))
+            _analytics[tank.name] = job
+        return await runtime.run_blocking(job.run, config.get("dcu.dose_rate_ml_min"))
+
+
+async def analytics_handler(request, writer):
+    """GET /analytics?tank=&table= — cached analytics tables (analytics.py)."""
+    try:
+        import analytics  # needs numpy, which the Pi may not have
+    except ImportError:
+        await local_http.respond(writer, 503, "analytics needs numpy (pip install numpy)\n")
+        return
+    query = request.query
+    tank = next((t for t in reservoirs if t.name == query.get("tank", "main")), None)
+    if tank is None:
+        await local_http.respond(writer, 404, "unknown tank\n")
+        return
+    job = _analytics.get(tank.name)
+    results = job.results if job is not None else None
+    if results is None:
+        try:
+            results = await _run_analytics(tank)
+        except FileNotFoundError:
+            await local_http.respond(writer, 404, "no CSV log yet\n")
+            return
+    if query.get("table"):
+        if query["table"] not in results:
+            await local_http.respond(writer, 400, "unknown table\n")
+            return
+        results = {"updated": results["updated"], query["table"]: results[query["table"]]}
+    await local_http.respond(writer, 200, json.dumps(results) + "\n", "application/json")
+
+
+async def doses_handler(request, writer):
+    """GET /doses?start=&end=&tank=&pump= — journaled doses as JSON."""
+    if journal is None:
+        await local_http.respond(writer, 503, "dose journal unavailable\n")
+        return
+    query = request.query
+    tank_index = None
+    if query.get("tank"):
+        tank_index = next((i for i, t in enumerate(reservoirs) if t.name == query["tank"]), None)
+        if tank_index is None:
+            await local_http.respond(writer, 404, "unknown tank\n")
+            return
+    try:
+        start, end = (datetime.fromisoformat(query[k]).timestamp() if query.get(k) else None
+                      for k in ("start", "end"))
+    except ValueError as e:
+        await local_http.respond(writer, 400, f"{e}\n")
+        return
+    events = await runtime.run_blocking(journal.query, start, end, tank_index,
+                                        query.get("pump") or None)
+    body = [dict(e._asdict(), tank=reservoirs[e.tank].name if e.tank < len(reservoirs) else e.tank,
+                 start=datetime.fromtimestamp(e.start).isoformat(timespec="seconds"))
+            for e in events]
+    await local_http.respond(writer, 200, json.dumps(body) + "\n", "application/json")
+
+
+async def export_handler(request, writer):
+    """GET /export?start=&end=&columns=&tank= — a CSV log as an Arrow IPC stream."""
+    try:
+        import export   # needs pyarrow, which the Pi may not have
+    except ImportError:
+        await local_http.respond(writer, 503, "export needs pyarrow (pip install pyarrow)\n")
+        return
+    query = request.query
+    tank = next((t for t in reservoirs if t.name == query.get("tank", "main")), None)
+    if tank is None:
+        await local_http.respond(writer, 404, "unknown tank\n")
+        return
+    columns = query["columns"].split(",") if query.get("columns") else None
+    chunks = export.ipc_stream(_csv_path(tank), query.get("start"), query.get("end"), columns)
+    try:
+        # The first chunk parses the arguments and opens the file, so
+        # errors can still get a proper status
+        chunk = await runtime.run_blocking(next, chunks, None)
+    except ValueError as e:
+        await local_http.respond(writer, 400, f"{e}\n")
+        return
+    except FileNotFoundError:
+        await local_http.respond(writer, 404, "no CSV log yet\n")
+        return
+    await local_http.start_stream(writer, export.ARROW_STREAM_TYPE)
+    while chunk is not None:
+        writer.write(chunk)
+        await writer.drain()
+        chunk = await runtime.run_blocking(next, chunks, None)
+
+
 # ==========================================================
 # GPIO
 # ==========================================================
@@ -203,83 +633,323 @@ def set_ph_pump(active: bool):
     with sensor_lock:
         sensor_state["ph_pump"] = active
 
-def sensor_polling_loop():
-    print("[SENSORS] Polling started")
+def _read_sensors_once(bus_number, tanks):
+    """Read every tank on one I2C bus; returns a dict or exception per tank."""
+    start = time.monotonic()
+    with tracing.span("read_all_sensors", "sensor"), SMBus(bus_number) as bus:
+        results = sensors.read_tanks(tracing.traced_bus(bus), [t.tank for t in tanks])
+    SENSOR_READ_SECONDS.observe(time.monotonic() - start)
+    return results
+
+
+def _poll_task_name(bus_number):
+    return "sensors" if bus_number == I2C_BUS else f"sensors-bus{bus_number}"
+
+
+def _apply_reading(tank, data):
+    """Filter and store a reading and queue any alert frames it raises.
+
+    DCU, alerts and the CSV log only ever see the filtered values; the raw
+    ones are kept next to them as <channel>_raw. `data` may hold only some
+    channels (a UDP update). Returns the tank's full filtered reading.
+    """
+    raw = data
+    data, outliers = tank.filter_reading(raw)
+    if tank.flow.attached:
+        data["circulation"] = tank.flow.is_on()   # debounced, not the single pin sample
+    for channel, (value, replacement) in outliers.items():
+        SENSOR_OUTLIERS.inc(tank=tank.name, channel=channel)
+        filter_log.info("Outlier rejected", tank=tank.name, channel=channel,
+                        value=value, median=replacement)
+    data = tank.apply_reading(data, raw)
+    if "water_level" in raw:
+        tank.record_level(time.monotonic(), data["water_level"])
+    with tank.limits_lock:
+        current_limits = dict(tank.limits)
+    for _, _, frame_hex in tank.alert_engine.evaluate(data, current_limits):
+        queue_uplink(ALERT_PRIORITY, frame_hex, tank.alert_port)
+    return data
+
+
+def _apply_poll(tank, data):
+    """Apply one local sensor poll and mark the tank's sensors ready."""
+    data = _apply_reading(tank, data)
+
+    if not tank.sensors_ready.is_set():
+        if tank.is_main:
+            boot_timeline.mark("first_sensor_reading")
+        tank.sensors_ready.set()
+        coordinator.wake()
+
+    if sensors_log.enabled(dms_log.logging.DEBUG):
+        print_data = data.copy()
+        print_data.pop("o2", None)
+        sensors_log.debug("Reading", tank=tank.name, **print_data)
+
+
+def _publish_state():
+    """Push the latest state to /stream and shared memory.
+
+    The stream carries the main tank's fields at the top level (as before)
+    and any other tank nested under its name; shared memory holds the main
+    tank only (fixed layout).
+    """
+    snapshot = main_reservoir.snapshot()
+    snapshot["alerts"] = alert_engine.active()
+    for tank in reservoirs[1:]:
+        extra = tank.snapshot()
+        extra["alerts"] = tank.alert_engine.active()
+        snapshot[tank.name] = extra
+    stream.publish(snapshot)
+    if shm_writer is not None:
+        with limits_lock:
+            current_limits = dict(limits)
+        shm_writer.publish(snapshot, current_limits, alert_engine.active_codes())
+
+
+async def sensor_polling_loop(bus_number=I2C_BUS, tanks=None):
+    """Poll every reservoir on one I2C bus (all on I2C_BUS by default)."""
+    tanks = tanks if tanks is not None else reservoirs_by_bus()[bus_number]
+    name = _poll_task_name(bus_number)
+    sensors_log.info("Polling started", bus=bus_number, tanks=",".join(t.name for t in tanks))
+    worker = coordinator.register(name)
 
     while True:
-        pause_event.wait()   # blocks here while calibration is active
+        await worker.checkpoint()   # blocks here while calibration is active
+        runtime.beat()
 
         try:
-            with SMBus(sensors.I2C_BUS) as bus:
-                data = sensors.read_all_sensors(bus)
+            results = await runtime.run_blocking(_read_sensors_once, bus_number, tanks)
 
-            with sensor_lock:
-                sensor_state["ph"] = data["ph"]
-                sensor_state["ec"] = data["ec"]
-                sensor_state["temperature"] = data["temperature"]
-                sensor_state["water_level"] = data["water_level"]
-                sensor_state["circulation"] = data["circulation"]
-                sensor_state["o2"] = data["o2"]
+            for tank, data in zip(tanks, results):
+                if isinstance(data, Exception):
+                    SENSOR_POLL_ERRORS.inc()
+                    sensors_log.error("Poll failed", tank=tank.name, error=data)
+                    continue
+                _apply_poll(tank, data)
 
-            print_data = data.copy()
-            print_data.pop("o2", None)
-            print("[SENSORS]", print_data)
+            _publish_state()
 
         except Exception as e:
-            print("[SENSORS ERROR]", e)
+            SENSOR_POLL_ERRORS.inc()
+            sensors_log.error("Poll failed", bus=bus_number, error=e)
 
         # Wait ~2 s between polls, but allow calibration to interrupt the wait
-        end_wait = time.time() + 2
-        while time.time() < end_wait:
-            if not pause_event.is_set():
-                break
-            time.sleep(0.1)
+        await worker.sleep(2)
             
+# ==========================================================
+# Local UDP updates (udp_listener.py)
+# ==========================================================
+
+def apply_udp_updates(sensor_updates, limit_updates):
+    """Apply one coalesced UDP batch to the main reservoir.
+
+    Readings go through the same filter, raw-value and alert path as a
+    local sensor poll. udp_listener has already refused the read-only
+    pump flags, and limits from hosts outside its CONTROL_HOSTS.
+    """
+    readings = {k: v for k, v in sensor_updates.items()
+                if k not in udp_listener.SUMMED_FIELDS}
+    if readings:
+        _apply_reading(main_reservoir, readings)
+    summed = {k: v for k, v in sensor_updates.items() if k in udp_listener.SUMMED_FIELDS}
+    if summed:
+        with sensor_lock:
+            for key, value in summed.items():
+                sensor_state[key] += value
+    if limit_updates:
+        with limits_lock:
+            changed = {k: v for k, v in limit_updates.items() if limits.get(k) != v}
+            limits.update(changed)
+        if changed:
+            udp_log.info("Limits updated", **changed)
+
+
+def _udp_configure(key, value):
+    """udp_listener hook for {"type": "config", ...} datagrams."""
+    config.set_value(key, value, source="udp")
+
 # ==========================================================
 # LoRaWAN interface
 # ==========================================================
 
-def lora_send(payload_hex):
-    LoRa_run.send_uplink(payload_hex)
-    print("[LoRa TX]", payload_hex)
+def lora_send(payload_hex, port=LoRa_run.UPLINK_PORT):
+    sent = LoRa_run.send_uplink(payload_hex, port)
+    UPLINKS.inc(port=str(port), result="ok" if sent else "fail")
+    lora_log.debug("Uplink", port=port, payload=payload_hex, sent=sent)
+    if sent:
+        boot_timeline.mark("first_uplink")
+    return sent
+
+
+def queue_uplink(priority, payload_hex, port=LoRa_run.UPLINK_PORT):
+    """Queue a frame for uplink_loop. Lower priority values are sent first."""
+    global _uplink_seq
+    _uplink_seq += 1
+    try:
+        uplink_queue.put_nowait((priority, _uplink_seq, port, payload_hex))
+    except asyncio.QueueFull:
+        lora_log.warning("Uplink queue full, dropping frame", port=port)
+
+
+async def config_watch_loop():
+    """Apply edits to config.CONFIG_FILE without a restart."""
+    while True:
+        runtime.beat()
+        await runtime.run_blocking(config.reload_if_changed)
+        await asyncio.sleep(config.WATCH_S)
+
+
+def checkpoint_state():
+    """Frames still queued and each tank's counters (checkpoint.py provider)."""
+    uplinks = uplink_queue.snapshot() if uplink_queue is not None else []
+    return {
+        "downlinks": downlink_queue.snapshot() if downlink_queue is not None else [],
+        "uplinks":   [[priority, port, payload_hex] for priority, _, port, payload_hex in uplinks],
+        "tanks":     {tank.name: tank.checkpoint_state() for tank in reservoirs},
+    }
+
+
+def restore_checkpoint(state, age_s):
+    for hex_data in state.get("downlinks", []):
+        downlink_queue.put(hex_data)
+    for priority, port, payload_hex in state.get("uplinks", []):
+        queue_uplink(priority, payload_hex, port)
+    by_name = {tank.name: tank for tank in reservoirs}
+    for name, tank_state in state.get("tanks", {}).items():
+        if name in by_name:
+            by_name[name].restore_checkpoint(tank_state)
+    log.info("Restored queued frames", downlinks=len(state.get("downlinks", [])),
+             uplinks=len(state.get("uplinks", [])))
+
+
+checkpoint.register("dms", checkpoint_state, restore_checkpoint)
+
+
+async def checkpoint_loop():
+    """Write a checkpoint every CHECKPOINT_S, or as soon as one is requested."""
+    last = time.monotonic()
+    while True:
+        runtime.beat()
+        if checkpoint.requested() or time.monotonic() - last >= checkpoint.CHECKPOINT_S:
+            last = time.monotonic()
+            state = checkpoint.collect()      # on the loop, which owns the state
+            try:
+                await runtime.run_blocking(checkpoint.write, state)
+            except OSError as e:
+                log.warning("Could not write checkpoint", error=e)
+        await asyncio.sleep(1)
+
+
+def _final_checkpoint():
+    # Shutdown hook: every task has stopped, so collecting off the loop is safe
+    try:
+        checkpoint.write(checkpoint.collect())
+    except OSError as e:
+        log.warning("Could not write checkpoint", error=e)
+
+
+async def flow_watch_loop():
+    """Raise flow_stalled within seconds of a tank's circulation stopping."""
+    while True:
+        runtime.beat()
+        for tank in reservoirs:
+            if not tank.flow.attached:
+                continue
+            with tank.limits_lock:
+                current_limits = dict(tank.limits)
+            snapshot = {"flow_off_s": tank.flow.off_seconds()}
+            for _, _, frame_hex in tank.alert_engine.evaluate(snapshot, current_limits):
+                queue_uplink(ALERT_PRIORITY, frame_hex, tank.alert_port)
+        await asyncio.sleep(flow_monitor.WATCH_S)
+
+
+async def analytics_loop():
+    """Fold new CSV rows into the analytics tables every RUN_EVERY_S."""
+    try:
+        import analytics
+    except ImportError:
+        log.warning("numpy not installed, analytics disabled")
+        return
+    while True:
+        runtime.beat()
+        for tank in reservoirs:
+            try:
+                result = await _run_analytics(tank)
+            except FileNotFoundError:
+                continue
+            log.info("Analytics updated", tank=tank.name, rows=result["rows_read"],
+                     seconds=result["seconds"])
+        await asyncio.sleep(analytics.RUN_EVERY_S)
+
+
+async def uplink_loop():
+    """Send queued frames one at a time, highest priority first."""
+    while True:
+        _, _, port, payload_hex = await uplink_queue.get()
+        runtime.beat()
+        await runtime.run_serial(lora_send, payload_hex, port)
 
 
 # ==========================================================
 # CSV initialization
 # ==========================================================
 
-def init_csv():
-    if not CSV_FILE.exists():
-        with open(CSV_FILE, "w", newline="") as f:
+def init_csv(path=None):
+    path = path or CSV_FILE
+    if not path.exists():
+        with open(path, "w", newline="") as f:
             writer = csv.writer(f)
             writer.writerow([
                 "Date", "Time", "pH", "ec", "Circulation",
                 "pH pump", "EC pump", "Temperature", "Water Level",
-                "pH min", "pH max", "EC min", "EC max", "EC Setpoint", "pH Setpoint"
+                "pH min", "pH max", "EC min", "EC max", "EC Setpoint", "pH Setpoint",
+                "Flow duty", "Flow transitions", "Flow longest off s"
             ])
 
 # ==========================================================
 # Calibration Function
 # ==========================================================
-def calibration_monitor_loop():
+def _load_calibration():
+    global calibration
+    import calibration as cal_module
+    calibration = cal_module
+    boot_timeline.mark("calibration_ui_loaded")
+
+
+async def calibration_monitor_loop():
+    # The BACK/UP buttons belong to calibration.py, so load it once the
+    # first reading is in (or CAL_LOAD_MAX_WAIT has passed) rather than at
+    # import time
+    for _ in range(CAL_LOAD_MAX_WAIT):
+        if sensors_ready.is_set():
+            break
+        await asyncio.sleep(1)
+    if calibration is None:
+        await runtime.run_blocking(_load_calibration)
+    BTN_BACK = calibration.BTN_BACK
+    BTN_UP   = calibration.BTN_UP
     start = None
 
     while True:
+        runtime.beat()
         if BTN_BACK.is_pressed and BTN_UP.is_pressed:
             if start is None:
                 start = time.monotonic()
 
             if time.monotonic() - start >= ENTRY_HOLD_SECONDS:
-                trigger_calibration()
+                # calibration UI blocks, so it runs on the executor
+                await runtime.run_blocking(trigger_calibration)
                 start = None
 
                 # wait for release so it does not immediately retrigger
                 while BTN_BACK.is_pressed or BTN_UP.is_pressed:
-                    time.sleep(0.05)
+                    await asyncio.sleep(0.05)
+
+            await asyncio.sleep(0.05)
         else:
             start = None
-
-        time.sleep(0.05)
+            await asyncio.sleep(CAL_IDLE_POLL)
         
         
 def trigger_calibration():
@@ -289,19 +959,19 @@ def trigger_calibration():
         return  # already calibrating
 
     try:
-        print("[DMS] Pausing system for calibration...")
-        pause_event.clear()
-
-        # give active loops a moment to stop touching hardware
-        time.sleep(0.5)
+        log.info("Pausing system for calibration")
+        if not coordinator.pause(timeout=PAUSE_ACK_TIMEOUT):
+            log.warning("Loops still busy, calibration cancelled",
+                        timeout_s=PAUSE_ACK_TIMEOUT, busy=",".join(coordinator.busy_workers()))
+            return
 
         calibration.launch_calibration_ui()
 
-        print("[DMS] Calibration finished. Resuming system...")
+        log.info("Calibration finished, resuming system")
     except Exception as e:
-        print(f"[DMS] Calibration error: {e}")
+        log.error("Calibration error", error=e)
     finally:
-        pause_event.set()
+        coordinator.resume()
         calibration_lock.release()
         
 # ==========================================================
@@ -349,186 +1019,333 @@ def build_lora_payload(ec, ph, temperature, o2, water_level,
     return bitstream, payload_hex
 
 
-def sampling_loop():
-    global transpiration_count
+def sequence_trailer(tank, measured_at):
+    """Payload v2 trailer (hex) for `tank`'s next telemetry frame.
 
-    print("[SAMPLER] Writing CSV row")
-    init_csv()
+    [seq:2][offset s:2] counts seconds from the anchor that opened this
+    group of ANCHOR_EVERY frames; an anchor is [seq:2][Unix time:4]. A
+    frame is sent as an anchor when it opens a group, when its group's
+    anchor was not sent by this tank's current sequence, or when the
+    offset does not fit in 16 bits.
+    """
+    seq = tank.uplink_seq
+    tank.uplink_seq = (seq + 1) & 0xFFFF
+    t = int(measured_at)
+    base = seq - seq % ANCHOR_EVERY
+    if seq == base:
+        tank.seq_anchor = [seq, t]
+    elif tank.seq_anchor is not None and tank.seq_anchor[0] == base \
+            and 0 <= t - tank.seq_anchor[1] <= 0xFFFF:
+        return struct.pack(">HH", seq, t - tank.seq_anchor[1]).hex().upper()
+    return struct.pack(">HI", seq, t).hex().upper()
 
-    while True:
-        pause_event.wait()   # block here while calibration is active
 
-        start_time = time.time()
-        now = datetime.now()
+def append_csv_row(row, path=None):
+    with tracing.span("csv write", "storage"), open(path or CSV_FILE, "a", newline="") as f:
+        csv.writer(f).writerow(row)
 
-        ph = read_ph()
-        ec = read_ec()
-        circulation = read_circulation()
-        temperature = read_temperature()
-        water_level = read_water_level()
-        o2 = read_o2()
-
-        ph_min = read_ph_min()
-        ph_max = read_ph_max()
-        ec_min = read_ec_min()
-        ec_max = read_ec_max()
-        ec_set = read_ec_set()
-        ph_set = read_ph_set()
-
-        # Read actual DCU pump state (set by DCU.control_loop)
-        ph_pump_on = read_ph_pump_status()
-        ec_pump_on = read_ec_pump_status()
-
-        # Get transpiration count for this interval
-        with sensor_lock:
-            interval_transpiration = sensor_state["transpiration"]
-            sensor_state["transpiration"] = 0
 
-        # Log to CSV
-        with open(CSV_FILE, "a", newline="") as f:
-            writer = csv.writer(f)
-            writer.writerow([
-                now.date().isoformat(),
-                now.time().strftime("%H:%M:%S"),
-                ph,
-                ec,
-                circulation,
-                ph_pump_on,
-                ec_pump_on,
-                temperature,
-                water_level,
-                ph_min,
-                ph_max,
-                ec_min,
-                ec_max,
-                ec_set,
-                ph_set
-            ])
+async def sampling_loop():
+    log.info("Sampler started", interval_s=INTERVAL_SEC)
+    for tank in reservoirs:
+        await runtime.run_blocking(init_csv, _csv_path(tank))
+    worker = coordinator.register("sampler")
 
-        # -------- BUILD LORA PAYLOAD (KEEP THIS EXACTLY HERE) --------
-        bitstream, payload_hex = build_lora_payload(
-            ec=ec,
-            ph=ph,
-            temperature=temperature,
-            o2=o2,
-            water_level=water_level,
-            transpiration_count=interval_transpiration,
-            ec_pump=ec_pump_on,
-            ph_pump=ph_pump_on,
-            circ_pump=circulation
-        )
+    # Don't log or uplink the placeholder state before the first real reading
+    while not await worker.sleep(None, until=sensors_ready.is_set):
+        await worker.checkpoint()
 
-        
+    next_due = None   # scheduled start of this tick, for jitter
+    while True:
+        await worker.checkpoint()   # block here while calibration is active
+        runtime.beat()
 
-        lora_send(payload_hex)
+        start_time = time.time()
+        if next_due is not None:
+            SAMPLER_JITTER_SECONDS.observe(max(0.0, start_time - next_due))
+        now = datetime.now()
 
-        # Maintain precise interval timing, but allow pause to interrupt sleep
-        elapsed = time.time() - start_time
-        remaining = max(0, INTERVAL_SEC - elapsed)
+        for tank in reservoirs:
+            # A tank that has not been read yet has only placeholder values
+            if tank.sensors_ready.is_set():
+                await _sample_reservoir(tank, now)
 
-        end_sleep = time.time() + remaining
-        while time.time() < end_sleep:
-            if not pause_event.is_set():
+        # Maintain precise interval timing, but allow pause to interrupt
+        # sleep. A config change re-times the sleep against the new
+        # INTERVAL_SEC; a pause cuts it short and that tick is not counted
+        # as jitter
+        while True:
+            seen = config.generation
+            remaining = max(0, start_time + INTERVAL_SEC - time.time())
+            if not await worker.sleep(remaining, until=config.changed_since(seen)):
+                next_due = None
+                break
+            if config.generation == seen:
+                next_due = start_time + INTERVAL_SEC
                 break
-            time.sleep(0.1)
+
+
+async def _sample_reservoir(tank, now):
+    """Log one CSV row and queue one telemetry uplink for `tank`."""
+    state = tank.snapshot()
+
+    ph = state["ph"]
+    ec = state["ec"]
+    circulation = state["circulation"]
+    temperature = state["temperature"]
+    water_level = state["water_level"]
+    o2 = state["o2"]
+
+    ph_min = state["ph_min"]
+    ph_max = state["ph_max"]
+    ec_min = state["ec_min"]
+    ec_max = state["ec_max"]
+    ec_set = state["ec_set"]
+    ph_set = state["ph_set"]
+
+    # Actual DCU pump state (set by DCU.control_loop)
+    ph_pump_on = state["ph_pump"]
+    ec_pump_on = state["ec_pump"]
+
+    # Transpiration estimate for this interval (transpiration.py)
+    interval_transpiration = tank.take_transpiration()
+
+    # Circulation over the interval (blank if the flow pin never attached)
+    flow = tank.flow.take_interval()
+    flow_columns = ["", "", ""] if flow is None else [
+        round(flow["duty"], 3), flow["transitions"], round(flow["longest_off_s"], 1)]
+
+    # Log to CSV
+    await runtime.run_blocking(append_csv_row, [
+            now.date().isoformat(),
+            now.time().strftime("%H:%M:%S"),
+            ph,
+            ec,
+            circulation,
+            ph_pump_on,
+            ec_pump_on,
+            temperature,
+            water_level,
+            ph_min,
+            ph_max,
+            ec_min,
+            ec_max,
+            ec_set,
+            ph_set,
+            *flow_columns
+        ], _csv_path(tank))
+    if tank.is_main:
+        boot_timeline.mark("first_csv_row")
+
+    # -------- BUILD LORA PAYLOAD (KEEP THIS EXACTLY HERE) --------
+    bitstream, payload_hex = build_lora_payload(
+        ec=ec,
+        ph=ph,
+        temperature=temperature,
+        o2=o2,
+        water_level=water_level,
+        transpiration_count=interval_transpiration,
+        ec_pump=ec_pump_on,
+        ph_pump=ph_pump_on,
+        circ_pump=circulation
+    )
+    if PAYLOAD_VERSION >= 2:
+        payload_hex += sequence_trailer(tank, now.timestamp())
+
+    queue_uplink(TELEMETRY_PRIORITY, payload_hex, tank.uplink_port)
+
+    # Doses finished since the last tick, including any that started and
+    # finished in between (dose_journal.py)
+    if journal is not None:
+        events, tank.dose_index = await runtime.run_blocking(
+            journal.since, tank.dose_index, reservoirs.index(tank))
+        frame_hex = dose_journal.summary_frame(events)
+        if frame_hex is not None:
+            queue_uplink(TELEMETRY_PRIORITY, frame_hex, tank.dose_port)
+
 # ==========================================================
 # LoRa receive loop (always listening)
 # ==========================================================
 
-def lora_listener_loop():
-    print("[LoRa Rx] Downlink listener started — waiting for messages.")
+async def lora_serial_rx_loop():
+    """Hand the serial port to LoRa_run between uplinks to catch downlinks."""
     while True:
-        pause_event.wait()
-
-        try:
-            hex_data = downlink_queue.get(timeout=0.5)
-        except queue.Empty:
-            continue
-
-        if not pause_event.is_set():
-            continue
+        runtime.beat()
+        await runtime.run_serial(LoRa_run.poll_downlinks, SERIAL_RX_WAIT)
+
+
+def decode_downlink(raw):
+    """Decode a limits downlink into (limits dict, reservoir index).
+
+    Downlink format (9 bytes, big-endian):
+      [ec_max:2][ec_min:2][ec_set:2][ph_max:1][ph_min:1][ph_set:1]
+      pH bytes are value * 10 (e.g. 70 = 7.0)
+    An optional 10th byte selects the reservoir (index into `reservoirs`,
+    0 = main); 9-byte downlinks target the main tank.
+    Raises ValueError if the downlink is too short.
+    """
+    if len(raw) < 9:
+        raise ValueError(f"downlink too short ({len(raw)} bytes)")
+    decoded = {
+        "ec_max": int.from_bytes(raw[0:2], "big"),
+        "ec_min": int.from_bytes(raw[2:4], "big"),
+        "ec_set": int.from_bytes(raw[4:6], "big"),
+        "ph_max": raw[6] / 10,
+        "ph_min": raw[7] / 10,
+        "ph_set": raw[8] / 10,
+    }
+    return decoded, (raw[9] if len(raw) > 9 else 0)
+
+
+async def lora_listener_loop():
+    lora_log.info("Downlink listener started")
+    worker = coordinator.register("lora_rx")
+    while True:
+        # Downlinks that arrive during calibration are held until resume
+        async with worker.idle():
+            hex_data = await downlink_queue.get()
+        runtime.beat()
 
         try:
-            print(f"[LoRa Rx] Raw hex received: {hex_data}")
+            lora_log.debug("Downlink received", payload=hex_data)
 
             raw = bytes.fromhex(hex_data)
-
-            # Downlink format (9 bytes, big-endian):
-            #   [ec_max:2][ec_min:2][ec_set:2][ph_max:1][ph_min:1][ph_set:1]
-            #   pH bytes are value * 10 (e.g. 70 = 7.0)
+            # A 6-byte 0xCF frame changes a runtime setting (config.py)
+            if raw[:1] == bytes([config.DOWNLINK_MAGIC]) and len(raw) == config.DOWNLINK.size:
+                config.apply_downlink(raw)
+                continue
             if len(raw) < 9:
-                print(f"[LoRa Rx] Downlink too short ({len(raw)} bytes), skipping.")
+                lora_log.warning("Downlink too short, skipping", length=len(raw))
                 continue
 
-            decoded = {
-                "ec_max": int.from_bytes(raw[0:2], "big"),
-                "ec_min": int.from_bytes(raw[2:4], "big"),
-                "ec_set": int.from_bytes(raw[4:6], "big"),
-                "ph_max": int.from_bytes(raw[6:7], "big") / 10,
-                "ph_min": int.from_bytes(raw[7:8], "big") / 10,
-                "ph_set": int.from_bytes(raw[8:9], "big") / 10,
-            }
-
-            updated = []
-            with limits_lock:
-                for key, val in decoded.items():
-                    limits[key] = float(val)
-                    updated.append(f"{key}={val}")
+            decoded, index = decode_downlink(raw)
+            if index >= len(reservoirs):
+                lora_log.warning("Downlink for unknown reservoir, skipping", index=index)
+                continue
+            tank = reservoirs[index]
 
-            print(f"[LoRa Rx] Limits updated: {', '.join(updated)}")
+            tank.update_limits({key: float(val) for key, val in decoded.items()})
+            lora_log.info("Limits updated", tank=tank.name, **decoded)
 
         except ValueError as e:
-            print(f"[LoRa Rx] Could not decode hex '{hex_data}': {e}")
+            lora_log.warning("Could not decode downlink", payload=hex_data, error=e)
         except Exception as e:
-            print(f"[LoRa Rx ERROR] Unexpected error: {e}")
+            lora_log.exception("Unexpected downlink error")
 
 # ==========================================================
 # Main
 # ==========================================================
 
-def main():
+async def lora_join_task():
+    await runtime.run_serial(LoRa_run.lorawan_init)
+    if LoRa_run.ser is not None:
+        boot_timeline.mark("lora_joined")
+
+
+async def start_services():
     import DCU  # imported here to avoid circular import (DCU imports DMS)
+    global downlink_queue, uplink_queue, udp_ingest, shm_writer, journal
+
+    downlink_queue = BridgeQueue(runtime)
+    uplink_queue = BridgeQueue(runtime, maxsize=UPLINK_QUEUE_MAX, priority=True)
+    udp_ingest = udp_listener.UDPIngest(apply_udp_updates, configure=_udp_configure)
+    LoRa_run.set_downlink_queue(downlink_queue)
+    runtime.on_shutdown(LoRa_run.shutdown)
+
+    sensors.set_timing_hook(_sensor_timing)
+    LoRa_run.set_timing_hook(_at_timing)
+    LoRa_run.serial_lock = tracing.TracedLock("serial_lock", LoRa_run.serial_lock)
+    http_server.route("/metrics", metrics_handler)
+    http_server.route("/stream", stream.handle)
+    http_server.route("/export", export_handler)
+    http_server.route("/config", config_handler)
+    http_server.route("/analytics", analytics_handler)
+    http_server.route("/doses", doses_handler)
+
+    # Settings apply to every module, including DCU imported above; sleeping
+    # loops re-check their waits when one changes
+    config.add_listener(lambda key, value: coordinator.wake())
+    await runtime.run_blocking(config.load)
+
+    try:
+        journal = await runtime.run_blocking(dose_journal.DoseJournal, DOSE_JOURNAL)
+        runtime.on_shutdown(journal.close)
+        for tank in reservoirs:
+            tank.dose_index = len(journal)     # cold start: summarise only new doses
+    except (OSError, ValueError) as e:
+        log.warning("Dose journal unavailable", path=DOSE_JOURNAL, error=e)
+
+    # Pick up where the last run left off: queued frames, tank counters,
+    # dose journal read positions and the DCU's dosing cycle (resumed by
+    # DCU.control_loop once it starts)
+    checkpoint.restore()
+    if journal is not None:
+        for tank in reservoirs:
+            tank.dose_index = min(tank.dose_index, len(journal))
+    runtime.on_shutdown(_final_checkpoint)
+
+    try:
+        shm_writer = shm_state.Writer()
+        runtime.on_shutdown(shm_writer.close)
+    except OSError as e:
+        log.warning("Shared-memory state unavailable", error=e)
+
+    runtime.on_signal(signal.SIGUSR2, toggle_trace)
+    runtime.on_shutdown(_stop_trace)
+    if TRACE_AT_BOOT:
+        tracing.start(TRACE_MALLOC_INTERVAL)
+
+    runtime.spawn("cal_monitor",    calibration_monitor_loop)
+    for bus_number, tanks in reservoirs_by_bus().items():
+        runtime.spawn(_poll_task_name(bus_number),
+                      lambda b=bus_number, t=tanks: sensor_polling_loop(b, t))
+    runtime.spawn("sampler",        sampling_loop)
+    runtime.spawn("flow",           flow_watch_loop)
+    runtime.spawn("config",         config_watch_loop)
+    runtime.spawn("analytics",      analytics_loop)
+    runtime.spawn("checkpoint",     checkpoint_loop)
+    runtime.spawn("lora_rx",        lora_listener_loop)
+    runtime.spawn("uplink",         uplink_loop)
+    # opens the serial port; the serial RX loop idles until it is open
+    runtime.spawn("lora_join",      lora_join_task)
+    runtime.spawn("lora_serial_rx", lora_serial_rx_loop)
+    for tank in reservoirs:
+        runtime.spawn("dcu" if tank.is_main else f"dcu-{tank.name}",
+                      lambda t=tank: DCU.control_loop(coordinator, runtime, t))
+    runtime.spawn("http",           http_server.serve)
+    runtime.spawn("udp",            lambda: udp_listener.serve(udp_ingest, UDP_HOST, UDP_PORT))
+
+    boot_timeline.mark("services_started")
+    log.info("System running. Ctrl+C to exit (SIGUSR1 logs task health, SIGUSR2 toggles tracing)")
+
+
+def main():
+    global runtime
+    dms_log.configure()     # first, so the boot milestones below are written
+    boot_timeline.mark("dms_imported")
+
+    init_reservoirs()
 
     # Init GPIO — retry if pin isn't reeased yet at boot
     for attempt in range(5):
         try:
-            sensors.init_flow_pin()
+            for pin in {t.tank.flow_pin for t in reservoirs}:
+                sensors.init_flow_pin(pin)
+            for tank in reservoirs:
+                tank.flow.attach(sensors.flow_pins[tank.tank.flow_pin])
             break
         except Exception as e:
-            print(f"[DMS] GPIO init attempt {attempt+1}/5 failed: {e}")
+            log.warning("GPIO init failed", attempt=f"{attempt+1}/5", error=e)
             time.sleep(2)
 
     # turning off backlight
     backlight_off()
 
-    sensors_thread = threading.Thread(target=sensor_polling_loop,        daemon=True)
-    sampler        = threading.Thread(target=sampling_loop,              daemon=True)
-    lora_serial_rx = threading.Thread(target=LoRa_run.downlink_listener, daemon=True)
-    lora_rx        = threading.Thread(target=lora_listener_loop,         daemon=True)
-    lora_join      = threading.Thread(target=LoRa_run.lorawan_init,      daemon=True)
-    dcu = threading.Thread(target=DCU.control_loop, args=(pause_event,), daemon=True)
-    cal_monitor = threading.Thread(target=calibration_monitor_loop, daemon=True)
-    
-    
-    
-    cal_monitor.start()
-    sensors_thread.start()
-    sampler.start()
-    lora_rx.start()
-    lora_join.start()       # opens serial port — must start before downlink listener
-    time.sleep(3)           # allow serial port to open before listener reads it
-    lora_serial_rx.start()
-    dcu.start()
-
-    print("System running. Ctrl+C to exit.")
-    
-
-    
-    try:
-        while True:
-            time.sleep(1)
-    except KeyboardInterrupt:
-        print("Shutting down.")
+    init_storage()
+    runtime = ServiceRuntime()
+    runtime.run(start_services)
+    log.info("Shut down")
+    dms_log.shutdown()
 
 
 if __name__ == "__main__":
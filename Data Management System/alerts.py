@@ -0,0 +1,174 @@
+# alerts.py — On-Device Limit Alerts
+# ELEC 421 Design
+# ─────────────────────────────────────────────────────────────────────
+# Responsibilities:
+#   - Evaluate alert rules against every sensor poll (~2 s)
+#   - Debounce: a rule must fail (or recover) on several consecutive
+#     polls before it changes state
+#   - Hysteresis: a raised alert only clears once the value is back
+#     inside the limit by a margin
+#   - Deduplicate and rate-limit: only state changes produce frames, a
+#     rule cannot re-raise within its cooldown, and a token bucket caps
+#     the total alert traffic on the LoRa link
+#   - Encode alerts as compact 6-byte frames sent on ALERT_PORT
+# ─────────────────────────────────────────────────────────────────────
+
+import time
+
+import dms_log
+import flow_monitor
+
+# ─────────────────────────────────────────────────────────────────────
+# Configuration
+# ─────────────────────────────────────────────────────────────────────
+
+ALERT_PORT       = 3      # LoRaWAN FPort for alert frames (telemetry uses 2)
+DEBOUNCE_POLLS   = 3      # Consecutive polls needed to raise or clear an alert
+RULE_COOLDOWN    = 600    # Seconds before the same rule may raise again
+BUCKET_SIZE      = 4      # Alert frames that may be sent back-to-back
+BUCKET_REFILL    = 120    # Seconds to earn one more alert frame
+
+log = dms_log.get_logger("alert")
+
+# Alert frame (6 bytes, big-endian):
+#   [code:1][state:1][value:2 signed][limit:2 signed]
+#   state 1 = raised, 0 = cleared. value/limit are scaled by the rule's
+#   scale (pH x100, EC, water level and seconds without flow raw).
+STATE_CLEARED = 0
+STATE_RAISED  = 1
+
+
+class AlertRule:
+    """One limit check on a sensor value.
+
+    `limit_key` names the limits entry to compare against (None uses the
+    fixed `limit`). direction is "below" or "above".
+    """
+
+    def __init__(self, code, name, sensor_key, direction, limit_key=None,
+                 limit=None, hysteresis=0.0, scale=1):
+        self.code       = code
+        self.name       = name
+        self.sensor_key = sensor_key
+        self.direction  = direction
+        self.limit_key  = limit_key
+        self.limit      = limit
+        self.hysteresis = hysteresis
+        self.scale      = scale
+
+        self.active     = False
+        self.reported   = STATE_CLEARED   # last state sent over LoRa
+        self.streak     = 0          # consecutive polls disagreeing with `active`
+        self.last_raise = None       # time.monotonic() of the last raised frame
+
+    def threshold(self, limits):
+        return limits[self.limit_key] if self.limit_key is not None else self.limit
+
+    def violated(self, value, limit):
+        """True if `value` is outside the limit, using hysteresis to clear."""
+        margin = self.hysteresis if self.active else 0.0
+        if self.direction == "below":
+            return value < limit + margin
+        return value > limit - margin
+
+
+def default_rules():
+    """Fresh copy of the default rule set. Limits follow the live DMS limits dict."""
+    return [
+        AlertRule(0x01, "ph_low",      "ph",          "below", "ph_min", hysteresis=0.1, scale=100),
+        AlertRule(0x02, "ph_high",     "ph",          "above", "ph_max", hysteresis=0.1, scale=100),
+        AlertRule(0x03, "ec_low",      "ec",          "below", "ec_min", hysteresis=20),
+        AlertRule(0x04, "ec_high",     "ec",          "above", "ec_max", hysteresis=20),
+        AlertRule(0x05, "water_empty", "water_level", "below", limit=5),
+        # fed by DMS's flow watch every WATCH_S, not by the sensor poll
+        AlertRule(0x06, "flow_stalled", "flow_off_s", "above", limit=flow_monitor.STALL_S),
+    ]
+
+
+def encode_frame(rule, state, value, limit):
+    """Pack an alert into its 6-byte frame and return it as upper-case hex."""
+    def s16(x):
+        return max(-32768, min(32767, int(round(x * rule.scale))))
+    frame = (bytes([rule.code, state])
+             + s16(value).to_bytes(2, "big", signed=True)
+             + s16(limit).to_bytes(2, "big", signed=True))
+    return frame.hex().upper()
+
+
+class AlertEngine:
+    """Runs the rules and decides which state changes go out as frames."""
+
+    def __init__(self, rules=None, debounce=DEBOUNCE_POLLS,
+                 cooldown=RULE_COOLDOWN, bucket_size=BUCKET_SIZE,
+                 bucket_refill=BUCKET_REFILL):
+        self.rules         = list(rules) if rules is not None else default_rules()
+        self.debounce      = debounce
+        self.cooldown      = cooldown
+        self.bucket_size   = bucket_size
+        self.bucket_refill = bucket_refill
+        self._tokens       = float(bucket_size)
+        self._refilled     = time.monotonic()
+        self.suppressed    = 0       # state changes not sent (cooldown/rate limit)
+
+    def active(self):
+        """Names of the rules currently raised."""
+        return [rule.name for rule in self.rules if rule.active]
+
+    def active_codes(self):
+        return [rule.code for rule in self.rules if rule.active]
+
+    def evaluate(self, snapshot, limits):
+        """Check one poll. Returns a list of (rule, state, frame_hex) to send.
+
+        A rule whose state differs from what was last reported keeps
+        retrying on later polls until the cooldown and rate limit allow it,
+        so the cloud always converges on the current state.
+        """
+        now = time.monotonic()
+        frames = []
+        for rule in self.rules:
+            value = snapshot.get(rule.sensor_key)
+            if value is None:
+                continue
+            limit = rule.threshold(limits)
+
+            changed = False
+            if rule.violated(value, limit) == rule.active:
+                rule.streak = 0
+            else:
+                rule.streak += 1
+                if rule.streak >= self.debounce:
+                    rule.streak = 0
+                    rule.active = not rule.active
+                    changed = True
+                    log.warning("Alert raised" if rule.active else "Alert cleared",
+                                rule=rule.name, sensor=rule.sensor_key, value=value, limit=limit)
+
+            state = STATE_RAISED if rule.active else STATE_CLEARED
+            if state == rule.reported:
+                continue
+            if not self._allow(rule, state, now):
+                if changed:
+                    self.suppressed += 1
+                continue
+
+            rule.reported = state
+            if state == STATE_RAISED:
+                rule.last_raise = now
+            frames.append((rule, state, encode_frame(rule, state, value, limit)))
+        return frames
+
+    def _allow(self, rule, state, now):
+        # A rule may only re-raise once per cooldown, so a flapping sensor
+        # produces at most one raise/clear pair per RULE_COOLDOWN
+        if (state == STATE_RAISED and rule.last_raise is not None
+                and now - rule.last_raise < self.cooldown):
+            return False
+
+        elapsed = now - self._refilled
+        self._refilled = now
+        self._tokens = min(self.bucket_size, self._tokens + elapsed / self.bucket_refill)
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
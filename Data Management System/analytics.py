@@ -0,0 +1,506 @@
+# analytics.py — On-device Analytics over the Sensor Log
+# ELEC 421 Design
+# ─────────────────────────────────────────────────────────────────────
+# Responsibilities:
+#   - Run NumPy-vectorized jobs over a DMS sensor CSV:
+#       correlation   pairwise Pearson matrix of the sensor channels
+#       drift         daily and rolling 7-day pH/EC drift (least squares,
+#                     rows during and just after a dose left out)
+#       consumption   daily pump run time and reagent volume
+#       response      pH/EC change per dose, per pump
+#   - Work incrementally: every job keeps mergeable sums, and a run reads
+#     only the bytes appended to the CSV since the previous run
+#   - Cache the sums and the finished tables in a JSON file beside the CSV
+#     so a restart resumes where it stopped; DMS serves the tables at
+#     GET /analytics
+#   Needs numpy. DMS only imports this module from the analytics task and
+#   the /analytics handler.
+#
+# Usage:
+#   python3 analytics.py                       # update and print the tables
+#   python3 analytics.py --csv log.csv --full  # recompute from the start
+# ─────────────────────────────────────────────────────────────────────
+
+import argparse
+import json
+import os
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+# ─────────────────────────────────────────────────────────────────────
+# Configuration
+# ─────────────────────────────────────────────────────────────────────
+
+CSV_FILE      = Path("/home/ohm/Documents/sensor_database.csv")   # DMS.CSV_FILE
+RUN_EVERY_S   = 3600       # How often DMS updates the tables
+CHANNELS      = ["ph", "ec", "temperature", "water_level", "flow_duty"]
+RESPONSE_S    = 300        # Rows this long after a dose show its effect (DCU.CIRC_WAIT)
+MAX_GAP_S     = 900        # Longer gaps between rows are downtime, not pump time
+DOSE_RATE_ML  = 0.5        # mL/min when converting pump time (DCU.DOSE_RATE_ML)
+ROLLING_DAYS  = 7
+DAYS_KEPT     = 400        # Days of drift/consumption history kept
+STATE_VERSION = 1
+
+PUMPS = ("ph", "ec")
+
+# CSV header -> channel name, for the columns the jobs read
+CSV_COLUMNS = {
+    "pH": "ph", "ec": "ec", "Temperature": "temperature", "Water Level": "water_level",
+    "Flow duty": "flow_duty", "pH pump": "ph_pump", "EC pump": "ec_pump",
+}
+
+
+def state_path(csv_path):
+    """Cache file for `csv_path`: sensor_database.csv -> sensor_database.analytics.json."""
+    csv_path = Path(csv_path)
+    return csv_path.with_name(csv_path.stem + ".analytics.json")
+
+
+# ─────────────────────────────────────────────────────────────────────
+# Reading new rows
+# ─────────────────────────────────────────────────────────────────────
+
+def _floats(values):
+    try:
+        return np.array(values, dtype=float)
+    except ValueError:
+        out = np.full(len(values), np.nan)
+        for i, v in enumerate(values):
+            try:
+                out[i] = float(v)
+            except ValueError:
+                pass
+        return out
+
+
+def parse_rows(lines, header):
+    """Columns of `lines` (CSV rows as str) as arrays.
+
+    Returns {"t": int64 seconds, channel: float64, "ph_pump"/"ec_pump":
+    bool}. Channels missing from `header` (an old log without the flow
+    columns) are NaN; rows too short for the header's columns, or with a
+    bad date, are skipped.
+    """
+    index = {CSV_COLUMNS[name]: i for i, name in enumerate(header) if name in CSV_COLUMNS}
+    need = max(index.values(), default=1) + 1
+    parts = [line.split(",") for line in lines]
+    parts = [p for p in parts if len(p) >= need]
+    stamps = np.array([f"{p[0]}T{p[1]}" for p in parts], dtype="U19")
+    try:
+        t = stamps.astype("datetime64[s]").astype(np.int64)
+    except ValueError:
+        t = np.array([_stamp(s) for s in stamps], dtype=np.int64)
+    keep = t != _BAD_STAMP
+    cols = {"t": t[keep]}
+    for name in CHANNELS:
+        i = index.get(name)
+        cols[name] = _floats([p[i] for p in parts])[keep] if i is not None \
+            else np.full(int(keep.sum()), np.nan)
+    for name in ("ph_pump", "ec_pump"):
+        i = index.get(name)
+        cols[name] = (np.array([p[i] for p in parts]) == "True")[keep] if i is not None \
+            else np.zeros(int(keep.sum()), dtype=bool)
+    return cols
+
+
+_BAD_STAMP = np.iinfo(np.int64).min
+
+
+def _stamp(text):
+    try:
+        return np.datetime64(text, "s").astype(np.int64)
+    except ValueError:
+        return _BAD_STAMP
+
+
+def _concat(a, b):
+    return {k: np.concatenate([a[k], b[k]]) for k in a}
+
+
+def _slice(cols, start):
+    return {k: v[start:] for k, v in cols.items()}
+
+
+# ─────────────────────────────────────────────────────────────────────
+# Jobs — each update() takes only new rows; sums merge across runs
+# ─────────────────────────────────────────────────────────────────────
+
+class Correlation:
+    """Pearson matrix of CHANNELS from running sums, pairwise complete.
+
+    Each pair uses every row where both channels have a value, so a log
+    that gained the flow columns part-way still correlates pH with EC over
+    its whole length. Values are shifted by the first batch's means so the
+    sums do not lose precision as they grow.
+    """
+
+    def __init__(self, state=None):
+        k = len(CHANNELS)
+        state = state or {}
+        self.rows  = state.get("rows", 0)
+        self.shift = np.array(state["shift"]) if state.get("shift") else None
+        self.n  = np.array(state.get("n",  np.zeros((k, k))))   # rows with both i and j
+        self.s  = np.array(state.get("s",  np.zeros((k, k))))   # Σx_i where j present
+        self.q  = np.array(state.get("q",  np.zeros((k, k))))   # Σx_i² where j present
+        self.p  = np.array(state.get("p",  np.zeros((k, k))))   # Σx_i·x_j
+
+    def update(self, cols):
+        x = np.column_stack([cols[c] for c in CHANNELS])
+        if not len(x):
+            return
+        present = ~np.isnan(x)
+        if self.shift is None:
+            counts = present.sum(axis=0)
+            self.shift = np.where(counts > 0, np.nansum(x, axis=0) / np.maximum(counts, 1), 0.0)
+        x = np.where(present, x - self.shift, 0.0)
+        m = present.astype(float)
+        self.rows += len(x)
+        self.n += m.T @ m
+        self.s += x.T @ m
+        self.q += (x * x).T @ m
+        self.p += x.T @ x
+
+    def table(self):
+        n, s, q = self.n, self.s, self.q
+        with np.errstate(divide="ignore", invalid="ignore"):
+            cov = n * self.p - s * s.T
+            var = n * q - s * s
+            r = cov / np.sqrt(var * var.T)
+        r = np.where((n >= 3) & (var > 0) & (var.T > 0), np.clip(r, -1, 1), np.nan)
+        return {"channels": CHANNELS, "rows": self.rows,
+                "n": n.astype(int).tolist(),
+                "r": [[None if np.isnan(v) else round(float(v), 4) for v in row] for row in r]}
+
+    def state(self):
+        return {"rows": self.rows, "shift": None if self.shift is None else self.shift.tolist(),
+                "n": self.n.tolist(), "s": self.s.tolist(), "q": self.q.tolist(),
+                "p": self.p.tolist()}
+
+
+# Per-day regression sums: n, Σt, Σt², then Σy, Σty per drift channel,
+# with t in hours from the start of the day
+_DRIFT = ("ph", "ec")
+_N, _ST, _STT = 0, 1, 2
+_SY  = {c: 3 + 2 * i for i, c in enumerate(_DRIFT)}
+_STY = {c: 4 + 2 * i for i, c in enumerate(_DRIFT)}
+_WIDTH = 3 + 2 * len(_DRIFT)
+
+
+def _group(days, weights_by_col):
+    """Sum each weights column per distinct day: (unique days, [k, m] sums)."""
+    uniq, inverse = np.unique(days, return_inverse=True)
+    sums = np.column_stack([np.bincount(inverse, weights=w, minlength=len(uniq))
+                            for w in weights_by_col])
+    return uniq, sums
+
+
+class Drift:
+    """Daily least-squares slope of pH and EC, and its rolling 7-day form.
+
+    Rows taken while a pump runs or within RESPONSE_S of one are left out,
+    so the slope is the tank's own drift rather than the dosing.
+    """
+
+    def __init__(self, state=None):
+        state = state or {}
+        self.days = {int(d): np.array(s) for d, s in state.get("days", {}).items()}
+
+    def update(self, cols, quiet):
+        ok = quiet & ~np.isnan(cols["ph"]) & ~np.isnan(cols["ec"])
+        t = cols["t"][ok]
+        if not len(t):
+            return
+        day = t // 86400
+        h = (t - day * 86400) / 3600.0
+        ph, ec = cols["ph"][ok], cols["ec"][ok]
+        weights = [np.ones_like(h), h, h * h, ph, h * ph, ec, h * ec]
+        uniq, sums = _group(day, weights)
+        for d, s in zip(uniq.tolist(), sums):
+            self.days[d] = self.days.get(d, np.zeros(_WIDTH)) + s
+        _prune(self.days)
+
+    @staticmethod
+    def _slopes(s):
+        denom = s[_N] * s[_STT] - s[_ST] ** 2
+        if s[_N] < 3 or denom <= 0:
+            return {c: None for c in _DRIFT}
+        return {c: float((s[_N] * s[_STY[c]] - s[_ST] * s[_SY[c]]) / denom) for c in _DRIFT}
+
+    def table(self):
+        rows = []
+        for d in sorted(self.days):
+            day_fit = self._slopes(self.days[d])
+            # Re-express earlier days' sums on day d's time axis and add them
+            window = np.zeros(_WIDTH)
+            for back in range(ROLLING_DAYS):
+                s = self.days.get(d - back)
+                if s is None:
+                    continue
+                c = -24.0 * back
+                shifted = s.copy()
+                shifted[_ST]  = s[_ST] + c * s[_N]
+                shifted[_STT] = s[_STT] + 2 * c * s[_ST] + c * c * s[_N]
+                for ch in _DRIFT:
+                    shifted[_STY[ch]] = s[_STY[ch]] + c * s[_SY[ch]]
+                window += shifted
+            rolling = self._slopes(window)
+            rows.append([_date(d), int(self.days[d][_N]),
+                         _round(day_fit["ph"], 5), _round(day_fit["ec"], 3),
+                         _round(rolling["ph"], 5), _round(rolling["ec"], 3)])
+        return {"columns": ["date", "rows", "ph_per_h", "ec_per_h",
+                            f"ph_per_h_{ROLLING_DAYS}d", f"ec_per_h_{ROLLING_DAYS}d"],
+                "rows": rows}
+
+    def state(self):
+        return {"days": {str(d): s.tolist() for d, s in self.days.items()}}
+
+
+class Consumption:
+    """Daily pump run time, estimated from the sampled pump flags.
+
+    A row's flag is taken to hold since the previous row (gaps over
+    MAX_GAP_S count as downtime). Sampling every INTERVAL_SEC this is an
+    unbiased estimate of run time; it is exact only to within a few doses.
+    """
+
+    def __init__(self, state=None):
+        state = state or {}
+        self.days = {int(d): np.array(s) for d, s in state.get("days", {}).items()}
+
+    def update(self, cols, prev_t):
+        t = cols["t"]
+        if not len(t):
+            return
+        dt = np.diff(t, prepend=t[0] if prev_t is None else prev_t).astype(float)
+        dt[(dt < 0) | (dt > MAX_GAP_S)] = 0.0
+        weights = [dt * cols[f"{p}_pump"] for p in PUMPS]
+        uniq, sums = _group(t // 86400, weights)
+        for d, s in zip(uniq.tolist(), sums):
+            self.days[d] = self.days.get(d, np.zeros(len(PUMPS))) + s
+        _prune(self.days)
+
+    def table(self, rate_ml_min=DOSE_RATE_ML):
+        rows = []
+        for d in sorted(self.days):
+            on_s = self.days[d]
+            rows.append([_date(d)] + [round(float(s)) for s in on_s]
+                        + [round(float(s) / 60 * rate_ml_min, 2) for s in on_s])
+        return {"columns": ["date"] + [f"{p}_pump_s" for p in PUMPS]
+                + [f"{p}_ml" for p in PUMPS], "rows": rows}
+
+    def state(self):
+        return {"days": {str(d): s.tolist() for d, s in self.days.items()}}
+
+
+class Response:
+    """pH and EC change across each dose, summarised per pump.
+
+    A dose is a row whose pump flag turns on. Its effect is the reading at
+    the first row RESPONSE_S or more later minus the row before the dose.
+    A dose is counted in the run that first sees its "after" row, so runs
+    carry a short tail of rows (see Analytics.tail).
+    """
+
+    def __init__(self, state=None):
+        state = state or {}
+        # pump -> [doses, Σdph, Σdph², Σdec, Σdec²]
+        self.sums = {p: np.array(state.get(p, np.zeros(5))) for p in PUMPS}
+
+    def update(self, cols, new_from):
+        t = cols["t"]
+        for pump in PUMPS:
+            on = cols[f"{pump}_pump"]
+            starts = np.flatnonzero(on[1:] & ~on[:-1]) + 1
+            if not len(starts):
+                continue
+            after = np.searchsorted(t, t[starts] + RESPONSE_S)
+            ok = (after < len(t)) & (after >= new_from)
+            before, after = starts[ok] - 1, after[ok]
+            d_ph = cols["ph"][after] - cols["ph"][before]
+            d_ec = cols["ec"][after] - cols["ec"][before]
+            valid = ~np.isnan(d_ph) & ~np.isnan(d_ec)
+            d_ph, d_ec = d_ph[valid], d_ec[valid]
+            self.sums[pump] += [len(d_ph), d_ph.sum(), (d_ph ** 2).sum(),
+                                d_ec.sum(), (d_ec ** 2).sum()]
+
+    def table(self):
+        rows = []
+        for pump in PUMPS:
+            n, sp, spp, se, see = self.sums[pump]
+            if n:
+                mp, me = sp / n, se / n
+                sdp = np.sqrt(max(spp / n - mp * mp, 0.0))
+                sde = np.sqrt(max(see / n - me * me, 0.0))
+                rows.append([pump, int(n), round(mp, 4), round(sdp, 4), round(me, 2), round(sde, 2)])
+            else:
+                rows.append([pump, 0, None, None, None, None])
+        return {"columns": ["pump", "doses", "ph_change", "ph_change_sd",
+                            "ec_change", "ec_change_sd"], "rows": rows}
+
+    def state(self):
+        return {p: s.tolist() for p, s in self.sums.items()}
+
+
+def _prune(days):
+    for d in sorted(days)[:-DAYS_KEPT]:
+        del days[d]
+
+
+def _date(day):
+    return str(np.datetime64(int(day), "D"))
+
+
+def _round(value, digits):
+    return None if value is None else round(value, digits)
+
+
+# ─────────────────────────────────────────────────────────────────────
+# Incremental runner
+# ─────────────────────────────────────────────────────────────────────
+
+class Analytics:
+    """All jobs for one CSV log, with the read position and cached tables."""
+
+    def __init__(self, csv_path=CSV_FILE, cache_path=None):
+        self.csv_path   = Path(csv_path)
+        self.cache_path = Path(cache_path) if cache_path else state_path(csv_path)
+        self._load()
+
+    def _fresh(self):
+        self.offset      = 0
+        self.header      = None
+        self.prev_t      = None      # time of the last row read
+        self.last_dose_t = None      # last row with a pump running
+        self.tail        = None      # recent rows kept for Response
+        self.results     = None
+        self.correlation = Correlation()
+        self.drift       = Drift()
+        self.consumption = Consumption()
+        self.response    = Response()
+
+    def _load(self):
+        self._fresh()
+        try:
+            state = json.loads(self.cache_path.read_text())
+        except (OSError, ValueError):
+            return
+        if state.get("version") != STATE_VERSION:
+            return
+        self.offset      = state["offset"]
+        self.header      = state["header"]
+        self.prev_t      = state["prev_t"]
+        self.last_dose_t = state["last_dose_t"]
+        self.tail        = {k: np.array(v, dtype=bool if k.endswith("_pump") else None)
+                            for k, v in state["tail"].items()} if state["tail"] else None
+        self.correlation = Correlation(state["correlation"])
+        self.drift       = Drift(state["drift"])
+        self.consumption = Consumption(state["consumption"])
+        self.response    = Response(state["response"])
+        self.results     = state.get("results")
+
+    def _save(self):
+        state = {
+            "version": STATE_VERSION, "offset": self.offset, "header": self.header,
+            "prev_t": self.prev_t, "last_dose_t": self.last_dose_t,
+            "tail": {k: v.tolist() for k, v in self.tail.items()} if self.tail else None,
+            "correlation": self.correlation.state(), "drift": self.drift.state(),
+            "consumption": self.consumption.state(), "response": self.response.state(),
+            "results": self.results,
+        }
+        tmp = self.cache_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(state, separators=(",", ":")))
+        os.replace(tmp, self.cache_path)
+
+    def _read_new(self):
+        """Complete lines appended since the last run, as a list of str."""
+        with open(self.csv_path, "rb") as f:
+            header = f.readline()
+            names = header.decode().strip().split(",")
+            size = os.fstat(f.fileno()).st_size
+            if names != self.header or size < self.offset:
+                self._fresh()         # new or rotated log: start over
+                self.header = names
+                self.offset = len(header)
+            f.seek(self.offset)
+            data = f.read(size - self.offset)
+        end = data.rfind(b"\n") + 1   # leave a half-written last row for next time
+        self.offset += end
+        return data[:end].decode(errors="replace").splitlines()
+
+    def run(self, rate_ml_min=DOSE_RATE_ML):
+        """Process rows appended since the last run; return the tables.
+
+        Returns {"rows_read", "seconds", ...tables}. Raises
+        FileNotFoundError if the CSV does not exist yet.
+        """
+        began = time.monotonic()
+        lines = self._read_new()
+        cols = parse_rows(lines, self.header)
+        n = len(cols["t"])
+        if n:
+            pumping = cols["ph_pump"] | cols["ec_pump"]
+            # Time of the most recent pumping row at or before each row;
+            # `no_dose` marks rows with no dose before them (all quiet)
+            no_dose = np.iinfo(np.int64).min
+            pump_t = np.where(pumping, cols["t"], no_dose)
+            if self.last_dose_t is not None:
+                pump_t[0] = max(pump_t[0], self.last_dose_t)
+            pump_t = np.maximum.accumulate(pump_t)
+            quiet = (pump_t == no_dose) | (cols["t"] - pump_t >= RESPONSE_S)
+
+            self.correlation.update(cols)
+            self.drift.update(cols, quiet)
+            self.consumption.update(cols, self.prev_t)
+            joined = _concat(self.tail, cols) if self.tail else cols
+            self.response.update(joined, len(joined["t"]) - n)
+
+            self.prev_t = int(cols["t"][-1])
+            if pumping.any():
+                self.last_dose_t = int(cols["t"][pumping][-1])
+            # Keep every row a not-yet-answered dose could need, plus the
+            # row before it
+            keep = np.searchsorted(joined["t"], self.prev_t - RESPONSE_S, side="right") - 1
+            self.tail = _slice(joined, max(keep, 0))
+
+        if n or self.results is None:
+            self.results = {
+                "updated":     datetime.now().isoformat(timespec="seconds"),
+                "rows":        self.correlation.rows,
+                "correlation": self.correlation.table(),
+                "drift":       self.drift.table(),
+                "consumption": self.consumption.table(rate_ml_min),
+                "response":    self.response.table(),
+            }
+            self._save()
+        return dict(self.results, rows_read=n, seconds=round(time.monotonic() - began, 3))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Update the DMS sensor-log analytics tables")
+    parser.add_argument("--csv", type=Path, default=CSV_FILE)
+    parser.add_argument("--full", action="store_true", help="discard the cache and start over")
+    args = parser.parse_args()
+
+    if args.full:
+        state_path(args.csv).unlink(missing_ok=True)
+    result = Analytics(args.csv).run()
+    print(f"[ANALYTICS] {result['rows_read']} new rows in {result['seconds']}s "
+          f"({result['rows']} rows total) -> {state_path(args.csv)}")
+    corr = result["correlation"]
+    if result["rows"]:
+        print("correlation " + " ".join(f"{c:>11}" for c in corr["channels"]))
+        for name, row in zip(corr["channels"], corr["r"]):
+            print(f"{name:>11} " + " ".join(
+                f"{'-' if v is None else format(v, '.3f'):>11}" for v in row))
+    for key in ("drift", "consumption", "response"):
+        table = result[key]
+        print(f"\n{key}: " + ", ".join(table["columns"]))
+        for row in table["rows"][-7:]:
+            print("  " + ", ".join("-" if v is None else str(v) for v in row))
+
+
+if __name__ == "__main__":
+    main()
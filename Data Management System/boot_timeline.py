@@ -0,0 +1,74 @@
+# boot_timeline.py — DMS Boot Timeline
+# ELEC 421 Design
+# ─────────────────────────────────────────────────────────────────────
+# Responsibilities:
+#   - Record named startup milestones as seconds since the process started
+#     (read from /proc, so interpreter start-up and imports are included)
+#   - Log each milestone once through dms_log, then a summary as soon as
+#     the first valid sensor reading, first CSV row and first uplink have
+#     all happened
+# ─────────────────────────────────────────────────────────────────────
+
+import os
+import threading
+import time
+
+import dms_log
+
+# Milestones that complete the boot summary
+KEY_MILESTONES = ("first_sensor_reading", "first_csv_row", "first_uplink")
+
+log = dms_log.get_logger("boot")
+
+
+def _process_start_time():
+    """Wall-clock time the process started, falling back to import time."""
+    try:
+        with open("/proc/self/stat") as f:
+            # comm (field 2) may contain spaces, so split after its ')'
+            fields = f.read().rsplit(")", 1)[1].split()
+        start_ticks = int(fields[19])          # field 22: starttime
+        with open("/proc/stat") as f:
+            btime = next(int(line.split()[1]) for line in f if line.startswith("btime"))
+        return btime + start_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError, StopIteration):
+        return time.time()
+
+
+PROCESS_START = _process_start_time()
+
+_marks = {}
+_lock  = threading.Lock()
+_summary_printed = False
+
+
+def elapsed():
+    """Seconds since the process started."""
+    return time.time() - PROCESS_START
+
+
+def mark(name):
+    """Record `name` the first time it is reached. Later calls are ignored."""
+    global _summary_printed
+    with _lock:
+        if name in _marks:
+            return
+        t = elapsed()
+        _marks[name] = t
+        done = not _summary_printed and all(m in _marks for m in KEY_MILESTONES)
+        if done:
+            _summary_printed = True
+    log.info("Milestone", name=name, t_s=round(t, 2))
+    if done:
+        log_timeline()
+
+
+def timeline():
+    """Return [(milestone, seconds since process start)] in order reached."""
+    with _lock:
+        return sorted(_marks.items(), key=lambda item: item[1])
+
+
+def log_timeline():
+    """One "Boot timeline" record: each milestone's seconds since process start."""
+    log.info("Boot timeline", **{name: round(t, 2) for name, t in timeline()})
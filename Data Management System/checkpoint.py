@@ -0,0 +1,120 @@
+# checkpoint.py — Warm-Restart Checkpoints
+# ELEC 421 Design
+# ─────────────────────────────────────────────────────────────────────
+# Responsibilities:
+#   - Collect runtime state that would otherwise die with the process
+#     from the modules that own it (DMS queues and per-tank counters, the
+#     DCU's in-progress dosing cycle and learned dose model), each
+#     registered under a name with a save and a restore function
+#   - Write it every CHECKPOINT_S, or sooner when asked (a dose just
+#     started), crash-safely: temp file, fsync, atomic rename
+#   - Skip the write when nothing has changed, so an idle system does not
+#     wear the SD card
+#   - On boot, hand each module its part and the checkpoint's age, so it
+#     can decide what is still worth resuming
+# ─────────────────────────────────────────────────────────────────────
+
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+import dms_log
+
+# ─────────────────────────────────────────────────────────────────────
+# Configuration
+# ─────────────────────────────────────────────────────────────────────
+
+CHECKPOINT_FILE = Path("/home/ohm/Documents/dms_checkpoint.json")
+CHECKPOINT_S    = 60       # Longest time between checkpoints while state changes
+VERSION         = 1
+
+log = dms_log.get_logger("checkpoint")
+
+_providers = {}            # name -> (save, restore)
+_requested = threading.Event()
+_last_body = None
+_lock      = threading.Lock()
+
+
+def register(name, save, restore):
+    """Include `save()` in checkpoints; call `restore(state, age_s)` on boot.
+
+    `save` runs on the DMS event loop and must return JSON-serialisable
+    data quickly.
+    """
+    _providers[name] = (save, restore)
+
+
+def request():
+    """Ask for a checkpoint before the next CHECKPOINT_S (any thread)."""
+    _requested.set()
+
+
+def requested():
+    return _requested.is_set()
+
+
+def collect():
+    """Every provider's state, keyed by provider name."""
+    _requested.clear()
+    state = {}
+    for name, (save, _) in _providers.items():
+        try:
+            state[name] = save()
+        except Exception:
+            log.exception("Checkpoint provider failed", provider=name)
+    return state
+
+
+def write(state, path=None):
+    """Write `state` atomically. Returns False if it matched the last write."""
+    global _last_body
+    path = Path(path or CHECKPOINT_FILE)
+    body = json.dumps(state, sort_keys=True, separators=(",", ":"))
+    with _lock:
+        if body == _last_body:
+            return False
+        data = f'{{"version":{VERSION},"saved":{time.time():.3f},"state":{body}}}\n'
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "w") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+        dir_fd = os.open(path.parent, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)        # make the rename itself durable
+        finally:
+            os.close(dir_fd)
+        _last_body = body
+        return True
+
+
+def restore(path=None):
+    """Hand each provider its part of the last checkpoint. Returns the age in s.
+
+    Returns None if there is no readable checkpoint.
+    """
+    path = Path(path or CHECKPOINT_FILE)
+    try:
+        saved = json.loads(path.read_text())
+        if saved.get("version") != VERSION:
+            raise ValueError(f"checkpoint version {saved.get('version')}")
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        log.warning("Ignoring unreadable checkpoint", path=path, error=e)
+        return None
+    age_s = max(0.0, time.time() - saved["saved"])
+    state = saved["state"]
+    for name, (_, restore_fn) in _providers.items():
+        if name not in state:
+            continue
+        try:
+            restore_fn(state[name], age_s)
+        except Exception:
+            log.exception("Could not restore checkpoint state", provider=name)
+    log.info("Checkpoint restored", age_s=round(age_s), parts=",".join(sorted(state)))
+    return age_s
@@ -0,0 +1,259 @@
+# config.py — Runtime Configuration
+# ELEC 421 Design
+# ─────────────────────────────────────────────────────────────────────
+# Responsibilities:
+#   - Typed registry of the tunable module constants: sampling interval
+#     and payload version, EZO read delays, DCU dose sizes and waits,
+#     LoRa join polling
+#   - Apply a change by setting the module attribute the running loops
+#     read on every use, so it takes effect without a restart; sleepers
+#     waiting on the old value are woken through change listeners
+#   - Load overrides from CONFIG_FILE at start-up, reload it when it
+#     changes on disk, and save live changes back to it
+#   - Read the extra tank definitions kept under RESERVOIRS_KEY in the
+#     same file (DMS.init_reservoirs, start-up only)
+#   - Accept changes from a LoRa downlink (6-byte frame below), the local
+#     UDP port ({"type": "config", "key": ..., "value": ...}) or code, and
+#     log each one with the time it took effect
+# ─────────────────────────────────────────────────────────────────────
+
+import collections
+import importlib
+import json
+import math
+import os
+import struct
+import sys
+import threading
+from datetime import datetime
+from pathlib import Path
+
+import dms_log
+
+# ─────────────────────────────────────────────────────────────────────
+# Configuration
+# ─────────────────────────────────────────────────────────────────────
+
+CONFIG_FILE    = Path("/home/ohm/Documents/dms_config.json")
+WATCH_S        = 5         # How often DMS checks CONFIG_FILE for edits
+HISTORY_MAX    = 50        # Changes kept for GET /config
+RESERVOIRS_KEY = "reservoirs"   # Extra tanks in CONFIG_FILE; not a setting, kept by save()
+
+# Config downlink (6 bytes, big-endian):
+#   [magic:1 = 0xCF][setting code:1][value:f32]
+DOWNLINK_MAGIC = 0xCF
+DOWNLINK       = struct.Struct(">BBf")
+
+log = dms_log.get_logger("config")
+
+
+class Setting:
+    """One tunable: `module.attr`, its type and allowed range."""
+
+    def __init__(self, code, key, module, attr, kind, lo, hi):
+        self.code    = code
+        self.key     = key
+        self.module  = module
+        self.attr    = attr
+        self.kind    = kind       # int or float
+        self.lo      = lo
+        self.hi      = hi
+        self.default = None       # module value before any override
+
+    def coerce(self, value):
+        if isinstance(value, bool) or not isinstance(value, (int, float)) \
+                or not math.isfinite(value):
+            raise ValueError(f"{self.key}: non-numeric value {value!r}")
+        if not self.lo <= value <= self.hi:
+            raise ValueError(f"{self.key}: {value} outside [{self.lo}, {self.hi}]")
+        return int(round(value)) if self.kind is int else float(value)
+
+    def target(self):
+        module = sys.modules.get(self.module)
+        return module if module is not None else importlib.import_module(self.module)
+
+
+SETTINGS = [
+    Setting(0x01, "sampling.interval_s",      "DMS",           "INTERVAL_SEC",      int,   10,    86400),
+    Setting(0x02, "sensors.rtd_delay_s",      "sensors",       "RTD_DELAY",         float, 0.3,   5.0),
+    Setting(0x03, "sensors.ec_temp_delay_s",  "sensors",       "EC_TEMP_DELAY",     float, 0.1,   5.0),
+    Setting(0x04, "sensors.ec_meas_delay_s",  "sensors",       "EC_MEAS_DELAY",     float, 0.3,   5.0),
+    Setting(0x05, "sensors.ph_temp_delay_s",  "sensors",       "PH_TEMP_DELAY",     float, 0.1,   5.0),
+    Setting(0x06, "sensors.ph_meas_delay_s",  "sensors",       "PH_MEAS_DELAY",     float, 0.3,   5.0),
+    Setting(0x07, "sampling.payload_version", "DMS",           "PAYLOAD_VERSION",   int,   1,     2),
+    Setting(0x10, "dcu.dose_ph_ml",           "DCU",           "DOSE_PH_ML",        float, 0.1,   20.0),
+    Setting(0x11, "dcu.dose_ec_ml",           "DCU",           "DOSE_EC_ML",        float, 0.1,   50.0),
+    Setting(0x12, "dcu.dose_rate_ml_min",     "DCU",           "DOSE_RATE_ML",      float, 0.5,   105.0),
+    Setting(0x13, "dcu.circ_wait_s",          "DCU",           "CIRC_WAIT",         int,   30,    3600),
+    Setting(0x14, "dcu.poll_interval_s",      "DCU",           "POLL_INTERVAL",     int,   10,    3600),
+    Setting(0x15, "dcu.concurrent_dosing",    "DCU",           "CONCURRENT_DOSING", int,   0,     1),
+    Setting(0x16, "dcu.ph_per_ml",            "dose_coupling", "PH_PER_ML",         float, 0.005, 5.0),
+    Setting(0x17, "dcu.ec_ph_coupling",       "dose_coupling", "COUPLING",          float, -1.0,  1.0),
+    Setting(0x20, "lora.join_poll_delay_s",   "LoRa_run",      "JOIN_POLL_DELAY",   int,   1,     60),
+    Setting(0x21, "lora.join_poll_max",       "LoRa_run",      "JOIN_POLL_MAX",     int,   1,     100),
+]
+BY_KEY  = {s.key: s for s in SETTINGS}
+BY_CODE = {s.code: s for s in SETTINGS}
+
+generation = 0       # bumped on every applied change
+history    = collections.deque(maxlen=HISTORY_MAX)
+_listeners = []
+_lock      = threading.RLock()
+_file_mtime = None
+
+
+def add_listener(fn):
+    """Call fn(key, value) after each applied change."""
+    _listeners.append(fn)
+
+
+def changed_since(seen):
+    """Predicate for worker.sleep(until=...): true once a change is applied after `seen`."""
+    return lambda: generation != seen
+
+
+def get(key):
+    setting = BY_KEY[key]
+    return getattr(setting.target(), setting.attr)
+
+
+def values():
+    return {s.key: get(s.key) for s in SETTINGS}
+
+
+def _capture_defaults():
+    for setting in SETTINGS:
+        if setting.default is None:
+            setting.default = getattr(setting.target(), setting.attr)
+
+
+def set_value(key, value, source="api", persist=True):
+    """Validate and apply one setting. Returns True if the value changed.
+
+    Raises ValueError for an unknown key or a value outside the range.
+    """
+    setting = BY_KEY.get(key)
+    if setting is None:
+        raise ValueError(f"unknown setting {key!r}")
+    return _apply(setting, setting.coerce(value), source, persist)
+
+
+def _apply(setting, value, source, persist):
+    global generation
+    key = setting.key
+    with _lock:
+        _capture_defaults()
+        module = setting.target()
+        old = getattr(module, setting.attr)
+        if old == value:
+            return False
+        setattr(module, setting.attr, value)
+        generation += 1
+        effective = datetime.now().isoformat(timespec="seconds")
+        history.append({"key": key, "old": old, "new": value, "source": source,
+                        "effective": effective})
+    log.info("Setting changed", key=key, old=old, new=value, source=source, effective=effective)
+    for fn in _listeners:
+        fn(key, value)
+    if persist:
+        save()
+    return True
+
+
+def apply_downlink(raw):
+    """Apply a 6-byte config downlink; returns the key. Raises ValueError."""
+    if len(raw) != DOWNLINK.size or raw[0] != DOWNLINK_MAGIC:
+        raise ValueError("not a config downlink")
+    _, code, value = DOWNLINK.unpack(raw)
+    setting = BY_CODE.get(code)
+    if setting is None:
+        raise ValueError(f"unknown setting code 0x{code:02X}")
+    set_value(setting.key, value, source="lora")
+    return setting.key
+
+
+def encode_downlink(key, value):
+    """Hex payload for a config downlink (for the network server side/tests)."""
+    return DOWNLINK.pack(DOWNLINK_MAGIC, BY_KEY[key].code, float(value)).hex().upper()
+
+
+# ─────────────────────────────────────────────────────────────────────
+# File
+# ─────────────────────────────────────────────────────────────────────
+
+def save(path=None):
+    """Write settings that differ from their defaults (atomically)."""
+    path = Path(path or CONFIG_FILE)
+    global _file_mtime
+    with _lock:
+        _capture_defaults()
+        overrides = {s.key: get(s.key) for s in SETTINGS if get(s.key) != s.default}
+        tanks = _read(path).get(RESERVOIRS_KEY)
+        if tanks is not None:
+            overrides[RESERVOIRS_KEY] = tanks
+        try:
+            tmp = path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(overrides, indent=2, sort_keys=True) + "\n")
+            os.replace(tmp, path)
+            _file_mtime = path.stat().st_mtime_ns
+        except OSError as e:
+            log.warning("Could not save config", path=path, error=e)
+
+
+def _read(path):
+    """The config file's JSON object, or {} if it is missing or unreadable."""
+    try:
+        data = json.loads(path.read_text())
+    except (OSError, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def reservoirs(path=None):
+    """The extra tank definitions (list of dicts) stored under RESERVOIRS_KEY."""
+    tanks = _read(Path(path or CONFIG_FILE)).get(RESERVOIRS_KEY, [])
+    if not isinstance(tanks, list) or not all(isinstance(t, dict) for t in tanks):
+        log.warning("Ignoring reservoirs in config file: expected a list of objects")
+        return []
+    return tanks
+
+
+def load(path=None, source="file"):
+    """Apply CONFIG_FILE; settings missing from it go back to their defaults."""
+    path = Path(path or CONFIG_FILE)
+    global _file_mtime
+    try:
+        mtime = path.stat().st_mtime_ns
+        overrides = json.loads(path.read_text())
+        if not isinstance(overrides, dict):
+            raise ValueError("config file must hold a JSON object")
+    except FileNotFoundError:
+        overrides, mtime = {}, None
+    except (OSError, ValueError) as e:
+        log.warning("Could not read config", path=path, error=e)
+        return
+    with _lock:
+        _file_mtime = mtime
+        _capture_defaults()
+        for key in overrides:
+            if key not in BY_KEY and key != RESERVOIRS_KEY:
+                log.warning("Unknown setting in config file", key=key)
+        for setting in SETTINGS:
+            if setting.key not in overrides:
+                _apply(setting, setting.default, source, persist=False)
+                continue
+            try:
+                set_value(setting.key, overrides[setting.key], source=source, persist=False)
+            except ValueError as e:
+                log.warning("Invalid setting in config file", error=e)
+
+
+def reload_if_changed(path=None):
+    """Re-apply the config file if it was edited since the last load/save."""
+    path = Path(path or CONFIG_FILE)
+    try:
+        mtime = path.stat().st_mtime_ns
+    except OSError:
+        return
+    if mtime != _file_mtime:
+        load(path, source="file reload")
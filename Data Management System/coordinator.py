@@ -0,0 +1,211 @@
+# coordinator.py — Pause/Resume Coordinator
+# ELEC 421 Design
+# ─────────────────────────────────────────────────────────────────────
+# Responsibilities:
+#   - Let DMS stop every hardware-touching loop before calibration starts
+#   - Each loop registers as a worker and acknowledges when it is
+#     quiescent: parked at a checkpoint or asleep in a coordinator wait
+#   - pause() returns as soon as the last worker has acknowledged, so
+#     calibration entry no longer depends on a fixed grace period
+#   - Worker waits are asyncio events woken immediately on pause/resume
+#     instead of polling an Event every 100 ms. pause() itself blocks, so
+#     it can be called from the executor thread that runs calibration
+#   - Plain threads (the pump monitor) use the *_blocking variants of
+#     checkpoint() and sleep(), which wait on the coordinator's condition
+# ─────────────────────────────────────────────────────────────────────
+
+import asyncio
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+
+
+class Worker:
+    """Handle a service coroutine uses to cooperate with the coordinator.
+
+    A worker is quiescent while it is awaiting checkpoint(), sleep() or
+    idle(). After sleep() returns False (pause requested) the task must
+    reach checkpoint() before touching hardware again. Worker threads
+    call checkpoint_blocking() and sleep_blocking() instead.
+    """
+
+    def __init__(self, coordinator, name):
+        self.coordinator = coordinator
+        self.name        = name
+        self.quiescent   = False
+
+    def _set_quiescent(self, value):
+        c = self.coordinator
+        with c._cond:
+            self.quiescent = value
+            c._cond.notify_all()
+
+    async def checkpoint(self):
+        """Wait while the system is paused. Await before touching hardware."""
+        c = self.coordinator
+        with c._cond:
+            if not c._paused:
+                self.quiescent = False
+                return
+        self._set_quiescent(True)
+        with c._subscribe() as changed:
+            while True:
+                changed.clear()
+                with c._cond:
+                    if not c._paused:
+                        self.quiescent = False
+                        return
+                await changed.wait()
+
+    async def sleep(self, seconds, until=None):
+        """Sleep up to `seconds`, returning early if a pause is requested.
+
+        `until` is an optional predicate that also ends the sleep; pair it
+        with coordinator.wake() from whatever makes it true. `seconds` may
+        be None to wait on `until` alone. Returns False if the sleep was cut
+        short by a pause, True otherwise.
+        """
+        c = self.coordinator
+        deadline = None if seconds is None else time.monotonic() + seconds
+        self._set_quiescent(True)
+        with c._subscribe() as changed:
+            while True:
+                changed.clear()
+                with c._cond:
+                    if c._paused:
+                        return False
+                if until is not None and until():
+                    break
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    break
+                try:
+                    await asyncio.wait_for(changed.wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+        with c._cond:
+            if c._paused:
+                return False
+            self.quiescent = False
+            return True
+
+    def checkpoint_blocking(self):
+        """checkpoint() for a worker thread: block while the system is paused."""
+        c = self.coordinator
+        with c._cond:
+            if c._paused:
+                self.quiescent = True
+                c._cond.notify_all()
+                while c._paused:
+                    c._cond.wait()
+            self.quiescent = False
+
+    def sleep_blocking(self, seconds, until=None):
+        """sleep() for a worker thread, with the same arguments and result.
+
+        `until` is checked with the coordinator's lock held, so it must be
+        quick and must not wait on the coordinator itself.
+        """
+        c = self.coordinator
+        deadline = None if seconds is None else time.monotonic() + seconds
+        with c._cond:
+            self.quiescent = True
+            c._cond.notify_all()
+            while True:
+                if c._paused:
+                    return False
+                if until is not None and until():
+                    break
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    break
+                c._cond.wait(remaining)
+            self.quiescent = False
+            return True
+
+    @asynccontextmanager
+    async def idle(self):
+        """Mark the worker quiescent around an await such as queue.get()."""
+        self._set_quiescent(True)
+        try:
+            yield
+        finally:
+            await self.checkpoint()
+
+
+class PauseCoordinator:
+    """Pauses registered workers and waits for each to acknowledge."""
+
+    def __init__(self):
+        self._cond    = threading.Condition()
+        self._paused  = False
+        self._workers = {}
+        self._waiters = set()       # (loop, asyncio.Event) of awaiting workers
+        self.paused_since  = None
+        self.paused_total  = 0.0    # seconds spent paused since start
+
+    def register(self, name):
+        with self._cond:
+            worker = Worker(self, name)
+            self._workers[name] = worker
+            return worker
+
+    def is_paused(self):
+        with self._cond:
+            return self._paused
+
+    def busy_workers(self):
+        """Names of registered workers that have not acknowledged a pause."""
+        with self._cond:
+            return [w.name for w in self._workers.values() if not w.quiescent]
+
+    def pause(self, timeout=None):
+        """Request a pause and wait for every worker to become quiescent.
+
+        Returns True once all workers have acknowledged, or False if
+        `timeout` expired first. The system stays paused either way until
+        resume() is called.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            if not self._paused:
+                self._paused = True
+                self.paused_since = time.monotonic()
+                self._notify()
+            while any(not w.quiescent for w in self._workers.values()):
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return True
+
+    def resume(self):
+        with self._cond:
+            if self._paused:
+                self.paused_total += time.monotonic() - self.paused_since
+                self.paused_since = None
+            self._paused = False
+            self._notify()
+
+    def wake(self):
+        """Re-check sleep() predicates, e.g. from a Future done-callback."""
+        with self._cond:
+            self._notify()
+
+    def _notify(self):
+        # Caller holds self._cond. Wakes blocking pause() calls and every
+        # awaiting worker, whichever thread or event loop they live on.
+        self._cond.notify_all()
+        for loop, changed in list(self._waiters):
+            loop.call_soon_threadsafe(changed.set)
+
+    @contextmanager
+    def _subscribe(self):
+        entry = (asyncio.get_running_loop(), asyncio.Event())
+        with self._cond:
+            self._waiters.add(entry)
+        try:
+            yield entry[1]
+        finally:
+            with self._cond:
+                self._waiters.discard(entry)
@@ -0,0 +1,201 @@
+# dms_log.py — Structured Logging
+# ELEC 421 Design
+# ─────────────────────────────────────────────────────────────────────
+# Responsibilities:
+#   - Give DMS, DCU and LoRa leveled loggers under "dms.*" whose records
+#     carry key/value fields, written as one logfmt line each:
+#       level=info tag=lora msg="Uplink sent" port=2
+#   - Hand records to a queue and write them on a listener thread, so the
+#     hot loops never format a line or block on stdout/journald
+#   - Skip disabled levels before any formatting (readings are DEBUG)
+#   - Suppress identical warnings/errors repeated within REPEAT_WINDOW_S,
+#     counting them and reporting the count on the next line let through
+#   Modules outside this directory (LoRa_run) use plain logging.getLogger
+#   with extra={"fields": {...}} so they do not depend on this module.
+# ─────────────────────────────────────────────────────────────────────
+
+import collections
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+
+# ─────────────────────────────────────────────────────────────────────
+# Configuration
+# ─────────────────────────────────────────────────────────────────────
+
+LOG_LEVEL       = os.environ.get("DMS_LOG_LEVEL", "INFO").upper()
+QUEUE_MAX       = 1000    # Records waiting for the writer; newer ones are dropped
+REPEAT_WINDOW_S = 300     # Identical warnings/errors let through once per window
+REPEAT_KEYS_MAX = 256     # Distinct messages remembered for suppression
+
+ROOT = "dms"
+
+_listener = None
+_handler  = None
+_lock     = threading.Lock()
+
+
+# ─────────────────────────────────────────────────────────────────────
+# Formatting
+# ─────────────────────────────────────────────────────────────────────
+
+def _quote(value):
+    text = str(value)
+    if text == "" or any(c in text for c in ' ="\n'):
+        return '"' + text.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+    return text
+
+
+class KeyValueFormatter(logging.Formatter):
+    """level=... tag=... msg=... followed by the record's fields."""
+
+    def format(self, record):
+        tag = record.name[len(ROOT) + 1:] if record.name.startswith(ROOT + ".") else record.name
+        parts = [f"level={record.levelname.lower()}", f"tag={tag}",
+                 f"msg={_quote(record.getMessage())}"]
+        for key, value in getattr(record, "fields", {}).items():
+            if isinstance(value, float):
+                value = round(value, 4)
+            parts.append(f"{key}={_quote(value)}")
+        if record.exc_info:
+            parts.append(f"exc={_quote(self.formatException(record.exc_info))}")
+        return " ".join(parts)
+
+
+# ─────────────────────────────────────────────────────────────────────
+# Repeat suppression and the non-blocking handler
+# ─────────────────────────────────────────────────────────────────────
+
+class RepeatFilter(logging.Filter):
+    """Let an identical WARNING+ record through once per `window` seconds.
+
+    The next copy let through after a quiet period carries repeated=N,
+    the number held back in between.
+    """
+
+    def __init__(self, window=REPEAT_WINDOW_S, max_keys=REPEAT_KEYS_MAX):
+        super().__init__()
+        self.window     = window
+        self.max_keys   = max_keys
+        self.suppressed = 0
+        self._seen      = collections.OrderedDict()   # key -> [first_time, held back]
+        self._lock      = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno < logging.WARNING:
+            return True
+        fields = getattr(record, "fields", None)
+        key = (record.name, record.levelno, record.msg, repr(record.args),
+               repr(sorted(fields.items())) if fields else "")
+        now = time.monotonic()
+        with self._lock:
+            seen = self._seen.get(key)
+            if seen is not None and now - seen[0] < self.window:
+                seen[1] += 1
+                self.suppressed += 1
+                return False
+            if seen is not None and seen[1]:
+                record.fields = dict(fields or {}, repeated=seen[1])
+            self._seen[key] = [now, 0]
+            self._seen.move_to_end(key)
+            if len(self._seen) > self.max_keys:
+                self._seen.popitem(last=False)
+        return True
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that never blocks or formats on the caller's thread."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Fields are built fresh per call, so the record can be queued as-is
+        # and formatted by the listener
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+# ─────────────────────────────────────────────────────────────────────
+# Set-up and loggers
+# ─────────────────────────────────────────────────────────────────────
+
+def configure(level=None, stream=None):
+    """Install the queue handler and start the writer thread (once)."""
+    global _listener, _handler
+    with _lock:
+        if _handler is not None:
+            return
+        writer = logging.StreamHandler(stream or sys.stdout)
+        writer.setFormatter(KeyValueFormatter())
+        _handler = DroppingQueueHandler(queue.Queue(QUEUE_MAX))
+        _handler.addFilter(RepeatFilter())
+        root = logging.getLogger(ROOT)
+        root.setLevel(level or LOG_LEVEL)
+        root.addHandler(_handler)
+        root.propagate = False
+        _listener = logging.handlers.QueueListener(_handler.queue, writer)
+        _listener.start()
+
+
+def shutdown():
+    """Write out everything queued and stop the writer thread."""
+    global _listener
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
+def stats():
+    """Counts for DMS's metrics: records suppressed as repeats or dropped."""
+    if _handler is None:
+        return {"suppressed": 0, "dropped": 0}
+    repeat = next(f for f in _handler.filters if isinstance(f, RepeatFilter))
+    return {"suppressed": repeat.suppressed, "dropped": _handler.dropped}
+
+
+class Logger:
+    """A "dms.<tag>" logger taking fields as keyword arguments.
+
+    log.info("Limits updated", tank="main", ph_min=5.8)
+    """
+
+    def __init__(self, tag):
+        self.logger = logging.getLogger(f"{ROOT}.{tag}")
+
+    def enabled(self, level):
+        return self.logger.isEnabledFor(level)
+
+    def _log(self, level, msg, fields, exc_info=None):
+        if self.logger.isEnabledFor(level):
+            self.logger._log(level, msg, (), exc_info=exc_info, extra={"fields": fields})
+
+    def debug(self, msg, **fields):
+        self._log(logging.DEBUG, msg, fields)
+
+    def info(self, msg, **fields):
+        self._log(logging.INFO, msg, fields)
+
+    def warning(self, msg, **fields):
+        self._log(logging.WARNING, msg, fields)
+
+    def error(self, msg, **fields):
+        self._log(logging.ERROR, msg, fields)
+
+    def exception(self, msg, **fields):
+        self._log(logging.ERROR, msg, fields, exc_info=True)
+
+
+def get_logger(tag):
+    return Logger(tag)
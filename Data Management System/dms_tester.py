@@ -57,9 +57,6 @@ def main():
             temperature = round(random.uniform(90.0, 101.0), 2)
             o2 = round(random.uniform(5.0, 8.0), 2)
 
-            ph_pump = ph < ph_min
-            ec_pump = ec < ec_min
-
             transpiration = random.randint(0, 20)
 
             # ----------------------------------------------
@@ -72,8 +69,6 @@ def main():
             send_json({"type": "circulation", "timestamp": now, "value": circulation})
             send_json({"type": "temperature", "timestamp": now, "value": temperature})
             send_json({"type": "o2", "timestamp": now, "value": o2})
-            send_json({"type": "ph_pump", "timestamp": now, "value": ph_pump})
-            send_json({"type": "ec_pump", "timestamp": now, "value": ec_pump})
             send_json({"type": "transpiration", "timestamp": now, "value": transpiration})
 
             # ----------------------------------------------
@@ -0,0 +1,269 @@
+# dose_journal.py — Dosing Event Journal
+# ELEC 421 Design
+# ─────────────────────────────────────────────────────────────────────
+# Responsibilities:
+#   - Record every dose the DCU runs as one fixed-size binary record:
+#     start time, tank, pump, commanded and confirmed volume, rate,
+#     duration, the reading that triggered it and the setpoint it was
+#     dosing towards. The record is written when the dose starts (status
+#     "running") and completed in place when it finishes; a dose that
+#     could not be started is recorded as an error
+#   - Keep records in start-time order, so the file itself is the index
+#     and a time-range query is a binary search, O(log n + k). Starts
+#     normally arrive in order and are appended; an earlier start (the
+#     clock stepped back) is inserted at its place, never re-dated
+#   - Pack the doses finished since the last uplink into a small summary
+#     frame sent on DOSE_PORT
+#   - Survive a crash mid-write: a partial trailing record is dropped when
+#     the journal is opened, and doses the dead process left "running"
+#     are marked "interrupted" (or taken back over with reopen())
+# ─────────────────────────────────────────────────────────────────────
+
+import collections
+import os
+import struct
+import threading
+import time
+from pathlib import Path
+
+# ─────────────────────────────────────────────────────────────────────
+# Configuration
+# ─────────────────────────────────────────────────────────────────────
+
+JOURNAL_FILE = Path("/home/ohm/Documents/dose_journal.bin")
+DOSE_PORT    = 4        # LoRaWAN FPort for dose summaries (telemetry 2, alerts 3)
+
+# File: 8-byte header [b"DOSJ"][version:2][record size:2], then records
+# (little-endian):
+#   [start:f64 Unix time][tank:1][pump:1][status:1][pad:1]
+#   [commanded mL:f32][confirmed mL:f32][rate mL/min:f32][duration s:f32]
+#   [triggering reading:f32][setpoint:f32]
+MAGIC    = b"DOSJ"
+VERSION  = 1
+HEADER   = struct.Struct("<4sHH")
+RECORD   = struct.Struct("<dBBBxffffff")
+
+PUMPS    = ("ph", "ec")
+STATUSES = ("ok", "error", "running", "interrupted")
+OPEN_SCAN = 256          # Newest records checked on open for doses left running
+
+# Dose summary uplink (7 bytes, big-endian):
+#   [pH doses:1][pH mL x10:2][EC doses:1][EC mL x10:2][failed doses:1]
+SUMMARY  = struct.Struct(">BHBHB")
+
+DoseEvent = collections.namedtuple("DoseEvent", [
+    "start", "tank", "pump", "status", "commanded_ml", "confirmed_ml",
+    "rate_ml_min", "duration_s", "reading", "setpoint"])
+
+
+def _pack(event):
+    nan = float("nan")
+    return RECORD.pack(
+        event.start, event.tank, PUMPS.index(event.pump), STATUSES.index(event.status),
+        event.commanded_ml, event.confirmed_ml, event.rate_ml_min, event.duration_s,
+        nan if event.reading is None else event.reading,
+        nan if event.setpoint is None else event.setpoint)
+
+
+def _unpack(data, offset=0):
+    start, tank, pump, status, *values = RECORD.unpack_from(data, offset)
+    values = [None if v != v else v for v in values]      # NaN = not recorded
+    return DoseEvent(start, tank, PUMPS[pump], STATUSES[status], *values)
+
+
+def _offset(index):
+    return HEADER.size + index * RECORD.size
+
+
+class DoseJournal:
+    """File of DoseEvents, ordered by start time.
+
+    begin()/finish() are called from the DCU and pump threads and queries
+    from DMS's executor, so all go through one lock. I/O uses os.pread and
+    os.pwrite at explicit offsets on a shared descriptor.
+    """
+
+    def __init__(self, path=JOURNAL_FILE):
+        self.path  = Path(path)
+        self._lock = threading.Lock()
+        self._open = {}          # (tank, pump) -> index of its running dose
+        self._fd   = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        size = os.fstat(self._fd).st_size
+        if size < HEADER.size:
+            os.ftruncate(self._fd, 0)
+            os.pwrite(self._fd, HEADER.pack(MAGIC, VERSION, RECORD.size), 0)
+            size = HEADER.size
+        magic, version, record_size = HEADER.unpack(os.pread(self._fd, HEADER.size, 0))
+        if magic != MAGIC or version != VERSION or record_size != RECORD.size:
+            os.close(self._fd)
+            raise ValueError(f"{self.path} is not a version {VERSION} dose journal")
+        torn = (size - HEADER.size) % RECORD.size
+        if torn:
+            os.ftruncate(self._fd, size - torn)   # crashed mid-append
+        self._count = (size - torn - HEADER.size) // RECORD.size
+        self._last_start = self._start_at(self._count - 1) if self._count else 0.0
+        self._mark_interrupted()
+
+    def close(self):
+        with self._lock:
+            os.close(self._fd)
+
+    def __len__(self):
+        return self._count
+
+    # ── Writing ──────────────────────────────────────────────────────
+
+    def begin(self, event):
+        """Record a dose that has just started (status "running")."""
+        with self._lock:
+            key = (event.tank, event.pump)
+            self._open[key] = self._insert(event._replace(status="running"))
+            os.fsync(self._fd)
+
+    def finish(self, event):
+        """Complete the tank/pump's running record with `event`.
+
+        The start time recorded by begin() is kept. Without a running
+        record (the dose never started) `event` is inserted as it is.
+        """
+        with self._lock:
+            index = self._open.pop((event.tank, event.pump), None)
+            if index is None:
+                self._insert(event)
+            else:
+                event = event._replace(start=self._start_at(index))
+                os.pwrite(self._fd, _pack(event), _offset(index))
+            os.fsync(self._fd)
+
+    def reopen(self, tank, pump):
+        """Mark the tank/pump's newest interrupted dose running again.
+
+        For a dose the pump was still dispensing when DMS restarted; the
+        next finish() completes it. Returns False if there is none.
+        """
+        with self._lock:
+            for index in range(self._count - 1, max(-1, self._count - 1 - OPEN_SCAN), -1):
+                event = self._read(index, 1)[0]
+                if (event.tank, event.pump) == (tank, pump) and event.status == "interrupted":
+                    os.pwrite(self._fd, _pack(event._replace(status="running")), _offset(index))
+                    os.fsync(self._fd)
+                    self._open[(tank, pump)] = index
+                    return True
+            return False
+
+    def _insert(self, event):
+        # Append, or for an earlier start (clock stepped back) write it at
+        # its place and move the later records up one. Returns its index.
+        index = self._count
+        if event.start < self._last_start:
+            index = self._bisect(event.start, self._count, right=True)
+        tail = os.pread(self._fd, (self._count - index) * RECORD.size, _offset(index))
+        os.pwrite(self._fd, _pack(event) + tail, _offset(index))
+        self._count += 1
+        self._last_start = max(self._last_start, event.start)
+        for key, open_index in self._open.items():
+            if open_index >= index:
+                self._open[key] = open_index + 1
+        return index
+
+    def _mark_interrupted(self):
+        # Doses the previous process recorded as running can't be finished
+        # by it any more
+        first = max(0, self._count - OPEN_SCAN)
+        marked = False
+        for offset, event in enumerate(self._read(first, self._count - first)):
+            if event.status == "running":
+                os.pwrite(self._fd, _pack(event._replace(status="interrupted")),
+                          _offset(first + offset))
+                marked = True
+        if marked:
+            os.fsync(self._fd)
+
+    # ── Reading ──────────────────────────────────────────────────────
+
+    def _read(self, first, count):
+        data = os.pread(self._fd, count * RECORD.size, _offset(first))
+        return [_unpack(data, i * RECORD.size) for i in range(len(data) // RECORD.size)]
+
+    def _start_at(self, index):
+        return struct.unpack_from("<d", os.pread(self._fd, 8, _offset(index)))[0]
+
+    def _bisect(self, t, count, right=False):
+        # First record index whose start is >= t (> t with `right`)
+        lo, hi = 0, count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start = self._start_at(mid)
+            if start < t or right and start == t:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def query(self, start=None, end=None, tank=None, pump=None):
+        """DoseEvents with start time in [start, end) (Unix seconds)."""
+        with self._lock:
+            count = self._count
+            first = self._bisect(start, count) if start is not None else 0
+            last = self._bisect(end, count) if end is not None else count
+            events = self._read(first, max(0, last - first))
+        return [e for e in events
+                if (tank is None or e.tank == tank) and (pump is None or e.pump == pump)]
+
+    def since(self, index, tank=None):
+        """(finished events at or after record `index`, next index).
+
+        Stops at the first of the tank's doses still running, so that dose
+        is returned once it has finished.
+        """
+        with self._lock:
+            events = self._read(index, max(0, self._count - index))
+        done = []
+        for event in events:
+            if tank is None or event.tank == tank:
+                if event.status == "running":
+                    break
+            done.append(event)
+        return [e for e in done if tank is None or e.tank == tank], index + len(done)
+
+
+def event_from_job(job, tank_index, reading=None, setpoint=None):
+    """DoseEvent for a pump_manager.DoseJob, running or finished."""
+    now = time.monotonic()
+    started = job.started if job.started is not None else now
+    if not job.done():
+        status, duration = "running", 0.0
+    else:
+        status = "error" if job.future.exception() is not None else "ok"
+        duration = (job.finished if job.finished is not None else now) - started
+    return DoseEvent(
+        start=time.time() - (now - started),
+        tank=tank_index, pump=job.pump, status=status,
+        commanded_ml=job.volume_ml, confirmed_ml=job.dispensed_ml,
+        rate_ml_min=job.rate_ml_min, duration_s=max(0.0, duration),
+        reading=reading, setpoint=setpoint)
+
+
+def failed_event(pump, tank_index, volume_ml, rate_ml_min, reading=None, setpoint=None):
+    """DoseEvent for a dose the pump would not start."""
+    return DoseEvent(
+        start=time.time(), tank=tank_index, pump=pump, status="error",
+        commanded_ml=volume_ml, confirmed_ml=0.0, rate_ml_min=rate_ml_min,
+        duration_s=0.0, reading=reading, setpoint=setpoint)
+
+
+def summary_frame(events):
+    """Hex SUMMARY frame for `events`, or None if there are none."""
+    if not events:
+        return None
+    counts = {p: 0 for p in PUMPS}
+    volume = {p: 0.0 for p in PUMPS}
+    failed = 0
+    for e in events:
+        counts[e.pump] += 1
+        volume[e.pump] += e.confirmed_ml
+        failed += e.status != "ok"
+    return SUMMARY.pack(
+        min(counts["ph"], 255), min(round(volume["ph"] * 10), 0xFFFF),
+        min(counts["ec"], 255), min(round(volume["ec"] * 10), 0xFFFF),
+        min(failed, 255)).hex().upper()
@@ -0,0 +1,280 @@
+# export.py — Columnar Export of the Sensor Log
+# ELEC 421 Design
+# ─────────────────────────────────────────────────────────────────────
+# Responsibilities:
+#   - Stream a DMS sensor CSV through pyarrow's vectorized CSV reader in
+#     BLOCK_SIZE chunks, so memory stays bounded however long the log is
+#   - Type every column (timestamp, float32, bool, int) and write Parquet
+#     (zstd) or Arrow IPC files partitioned by month, day or year
+#   - Select a time range without parsing the rows before it: the log is
+#     in time order, so the start is found by binary search on the file
+#     and reading stops at the end of the range
+#   - Select columns, and serve the same stream as Arrow IPC over DMS's
+#     local HTTP server (GET /export)
+#   Needs pyarrow (pip install pyarrow). DMS only imports this module when
+#   /export is requested.
+#
+# Usage:
+#   python3 export.py --out /home/ohm/Documents/export
+#   python3 export.py --out exp --start 2026-01-01 --end 2026-02-01 --columns ph,ec
+#   python3 export.py --out exp --format arrow --partition day
+# ─────────────────────────────────────────────────────────────────────
+
+import argparse
+import io
+import os
+import time
+from datetime import datetime
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+import pyarrow.dataset as ds
+
+# ─────────────────────────────────────────────────────────────────────
+# Configuration
+# ─────────────────────────────────────────────────────────────────────
+
+CSV_FILE    = Path("/home/ohm/Documents/sensor_database.csv")   # DMS.CSV_FILE
+BLOCK_SIZE  = 4 << 20      # CSV bytes parsed per batch
+COMPRESSION = "zstd"
+PARTITIONS  = {"year": "%Y", "month": "%Y-%m", "day": "%Y-%m-%d"}
+ARROW_STREAM_TYPE = "application/vnd.apache.arrow.stream"
+
+# CSV header -> (output column, type), in DMS's column order after Date, Time
+COLUMNS = {
+    "pH":                 ("ph",                 pa.float32()),
+    "ec":                 ("ec",                 pa.float32()),
+    "Circulation":        ("circulation",        pa.bool_()),
+    "pH pump":            ("ph_pump",            pa.bool_()),
+    "EC pump":            ("ec_pump",            pa.bool_()),
+    "Temperature":        ("temperature",        pa.float32()),
+    "Water Level":        ("water_level",        pa.int16()),
+    "pH min":             ("ph_min",             pa.float32()),
+    "pH max":             ("ph_max",             pa.float32()),
+    "EC min":             ("ec_min",             pa.float32()),
+    "EC max":             ("ec_max",             pa.float32()),
+    "EC Setpoint":        ("ec_set",             pa.float32()),
+    "pH Setpoint":        ("ph_set",             pa.float32()),
+    "Flow duty":          ("flow_duty",          pa.float32()),
+    "Flow transitions":   ("flow_transitions",   pa.int32()),
+    "Flow longest off s": ("flow_longest_off_s", pa.float32()),
+}
+CSV_HEADER = ["Date", "Time", *COLUMNS]
+OUTPUT_NAMES = {name: csv_name for csv_name, (name, _) in COLUMNS.items()}
+
+
+def output_schema(columns=None):
+    """Schema of exported batches: timestamp plus `columns` (default all)."""
+    names = list(OUTPUT_NAMES) if columns is None else columns
+    unknown = [n for n in names if n not in OUTPUT_NAMES]
+    if unknown:
+        raise ValueError(f"unknown column(s) {unknown}; choose from {list(OUTPUT_NAMES)}")
+    return pa.schema([("timestamp", pa.timestamp("s"))]
+                     + [(n, COLUMNS[OUTPUT_NAMES[n]][1]) for n in names])
+
+
+def _parse_time(value):
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(value)
+
+
+# ─────────────────────────────────────────────────────────────────────
+# Locating rows in the file without parsing it
+# ─────────────────────────────────────────────────────────────────────
+
+def _line_at(f, pos):
+    """(offset, bytes) of the first line starting at or after `pos`."""
+    f.seek(max(pos - 1, 0))
+    if pos > 0:
+        f.readline()              # finish the line that byte pos-1 belongs to
+    start = f.tell()
+    return start, f.readline()
+
+
+def _first_line(f, lo, hi, pred):
+    """Offset of the first line in [lo, hi) for which `pred` holds.
+
+    `lo` must be a line start and `pred` must be False then True along the
+    file (rows are appended in time order). Returns hi if no line matches.
+    """
+    while lo < hi:
+        mid = (lo + hi) // 2
+        start, line = _line_at(f, mid)
+        if start < hi and line and not pred(line):
+            lo = start + len(line)
+        else:
+            hi = mid
+    return lo
+
+
+class _Range(io.RawIOBase):
+    """Read-only view of bytes [start, end) of an open file."""
+
+    def __init__(self, f, start, end):
+        self._f = f
+        self._pos = start
+        self._end = end
+
+    def readable(self):
+        return True
+
+    def readinto(self, buf):
+        n = min(len(buf), self._end - self._pos)
+        if n <= 0:
+            return 0
+        self._f.seek(self._pos)
+        data = self._f.read(n)
+        buf[:len(data)] = data
+        self._pos += len(data)
+        return len(data)
+
+
+def _segments(f, size, start):
+    """[(offset, end, column names)] covering the rows from `start` on.
+
+    A log created before the flow columns existed keeps its old 15-column
+    header while newer rows carry all 18 columns; that file is read as two
+    segments split where the longer rows begin.
+    """
+    header = f.readline()
+    names = header.decode().strip().split(",")
+    lo = len(header)
+    if start is not None:
+        key = start.date().isoformat().encode()
+        lo = _first_line(f, lo, size, lambda line: line[:10] >= key)
+    if len(names) >= len(CSV_HEADER):
+        return [(lo, size, names)]
+    split = _first_line(f, lo, size, lambda line: line.count(b",") + 1 > len(names))
+    segments = [(lo, split, names), (split, size, CSV_HEADER)]
+    return [s for s in segments if s[0] < s[1]]
+
+
+# ─────────────────────────────────────────────────────────────────────
+# Reading
+# ─────────────────────────────────────────────────────────────────────
+
+def iter_batches(csv_path=CSV_FILE, start=None, end=None, columns=None, block_size=BLOCK_SIZE):
+    """Yield typed RecordBatches (see output_schema) for rows in [start, end)."""
+    start, end = _parse_time(start), _parse_time(end)
+    schema = output_schema(columns)
+    wanted = [OUTPUT_NAMES[n] for n in schema.names[1:]]
+    convert = pacsv.ConvertOptions(
+        column_types={"Date": pa.string(), "Time": pa.string(),
+                      **{csv_name: COLUMNS[csv_name][1] for csv_name in wanted}},
+        include_columns=["Date", "Time", *wanted],
+        include_missing_columns=True)
+    lo_ts = pa.scalar(start, pa.timestamp("s")) if start is not None else None
+    hi_ts = pa.scalar(end, pa.timestamp("s")) if end is not None else None
+
+    with open(csv_path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        for offset, stop, names in _segments(f, size, start):
+            reader = pacsv.open_csv(
+                io.BufferedReader(_Range(f, offset, stop), buffer_size=1 << 16),
+                read_options=pacsv.ReadOptions(column_names=names, block_size=block_size),
+                convert_options=convert)
+            for batch in reader:
+                if batch.num_rows == 0:
+                    continue
+                stamp = pc.strptime(
+                    pc.binary_join_element_wise(batch.column("Date"), batch.column("Time"), " "),
+                    format="%Y-%m-%d %H:%M:%S", unit="s")
+                mask = None
+                if lo_ts is not None:
+                    mask = pc.greater_equal(stamp, lo_ts)
+                if hi_ts is not None:
+                    below = pc.less(stamp, hi_ts)
+                    mask = below if mask is None else pc.and_(mask, below)
+                out = pa.RecordBatch.from_arrays(
+                    [stamp] + [batch.column(c) for c in wanted], schema=schema)
+                if mask is not None:
+                    out = out.filter(mask)
+                if out.num_rows:
+                    yield out
+                if hi_ts is not None and pc.greater_equal(stamp[-1], hi_ts).as_py():
+                    return
+
+
+def ipc_stream(csv_path=CSV_FILE, start=None, end=None, columns=None):
+    """Yield the selection as chunks of one Arrow IPC stream (for GET /export)."""
+    schema = output_schema(columns)
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        for batch in iter_batches(csv_path, start, end, columns):
+            writer.write_batch(batch)
+            yield sink.getvalue()
+            sink.seek(0)
+            sink.truncate()
+    yield sink.getvalue()
+
+
+# ─────────────────────────────────────────────────────────────────────
+# Writing
+# ─────────────────────────────────────────────────────────────────────
+
+def export(csv_path=CSV_FILE, out_dir="export", fmt="parquet", start=None, end=None,
+           columns=None, partition="month", block_size=BLOCK_SIZE):
+    """Write the selection to `out_dir` as <partition>=<value>/part-0.<ext>.
+
+    Partitions covered by the export are replaced; others are left alone.
+    Returns {"rows", "files", "bytes"}.
+    """
+    if partition not in PARTITIONS:
+        raise ValueError(f"partition must be one of {list(PARTITIONS)}")
+    schema = output_schema(columns).append(pa.field(partition, pa.string()))
+    rows = 0
+
+    def with_partition():
+        nonlocal rows
+        for batch in iter_batches(csv_path, start, end, columns, block_size):
+            rows += batch.num_rows
+            key = pc.strftime(batch.column("timestamp"), format=PARTITIONS[partition])
+            yield pa.RecordBatch.from_arrays(batch.columns + [key], schema=schema)
+
+    if fmt == "parquet":
+        file_format = ds.ParquetFileFormat()
+        options = file_format.make_write_options(compression=COMPRESSION)
+    elif fmt == "arrow":
+        file_format = ds.IpcFileFormat()
+        options = file_format.make_write_options(compression=COMPRESSION)
+    else:
+        raise ValueError("format must be parquet or arrow")
+
+    written = []
+    ds.write_dataset(
+        pa.RecordBatchReader.from_batches(schema, with_partition()), out_dir,
+        format=file_format, file_options=options,
+        partitioning=ds.partitioning(pa.schema([schema.field(partition)]), flavor="hive"),
+        basename_template=f"part-{{i}}.{fmt}",
+        existing_data_behavior="delete_matching",
+        file_visitor=lambda f: written.append(f.path))
+    return {"rows": rows, "files": len(written),
+            "bytes": sum(os.path.getsize(p) for p in written)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the DMS sensor CSV to Parquet or Arrow")
+    parser.add_argument("--csv", type=Path, default=CSV_FILE)
+    parser.add_argument("--out", type=Path, required=True, help="output directory")
+    parser.add_argument("--format", choices=("parquet", "arrow"), default="parquet")
+    parser.add_argument("--partition", choices=list(PARTITIONS), default="month")
+    parser.add_argument("--start", help="ISO date/time, inclusive")
+    parser.add_argument("--end", help="ISO date/time, exclusive")
+    parser.add_argument("--columns", help=f"comma-separated, from: {','.join(OUTPUT_NAMES)}")
+    args = parser.parse_args()
+
+    columns = args.columns.split(",") if args.columns else None
+    began = time.monotonic()
+    result = export(args.csv, args.out, args.format, args.start, args.end, columns, args.partition)
+    elapsed = time.monotonic() - began
+    csv_bytes = args.csv.stat().st_size
+    print(f"[EXPORT] {result['rows']} rows -> {result['files']} file(s), "
+          f"{result['bytes'] / 1e6:.2f} MB ({result['bytes'] / csv_bytes:.0%} of the "
+          f"{csv_bytes / 1e6:.2f} MB CSV) in {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,448 @@
+# fleet_loadgen.py — Fleet Load Generator
+# ELEC 421 Design
+# ─────────────────────────────────────────────────────────────────────
+# Responsibilities:
+#   - Simulate N devices (dms_tester.py simulates one) at a configurable
+#     sample rate, with correlated pH/EC/temperature/O2/water-level
+#     trajectories: diurnal temperature, uptake-driven pH and EC drift,
+#     transpiration, DCU-style doses and top-ups
+#   - Emit each sample as one of:
+#       json    nine JSON datagrams per sample (dms_tester format) to UDP 5001
+#       binary  one batched binary frame per sample to UDP 5001
+#       hex     LoRa payload hex events for batch_ingest.py (TCP queue or
+#               a *.jsonl file for its drop directory)
+#   - Measure end-to-end ingest latency and loss: UDP modes request an ack
+#     from udp_listener.py; hex mode can watch the ingest SQLite database
+#
+#   python3 fleet_loadgen.py --devices 50 --rate 1 --mode binary --duration 30
+#   python3 fleet_loadgen.py --devices 200 --rate 0.5 --mode hex --verify-db measurements.db
+# ─────────────────────────────────────────────────────────────────────
+
+import argparse
+import heapq
+import json
+import math
+import random
+import selectors
+import socket
+import sqlite3
+import struct
+import threading
+import time
+from datetime import datetime, timezone
+
+import udp_listener
+
+# ─────────────────────────────────────────────────────────────────────
+# Configuration
+# ─────────────────────────────────────────────────────────────────────
+
+UDP_TARGET    = ("127.0.0.1", udp_listener.UDP_PORT)
+INGEST_TARGET = ("127.0.0.1", 5002)     # batch_ingest.py --listen
+ACK_TIMEOUT_S = 2.0       # An unacked datagram older than this counts as lost
+REPORT_S      = 5.0       # Seconds between progress reports
+MAX_SOCKETS   = 64        # UDP source sockets (each has its own 16-bit seq space)
+DB_POLL_S     = 0.05      # --verify-db poll interval
+
+SENSOR_FIELDS = ("ph", "ec", "water_level", "circulation", "temperature", "o2",
+                 "transpiration")    # UDP fields; the pump flags are read-only there
+
+# LoRa payload as built by DMS.build_lora_payload() (big-endian):
+#   [ec:u16][ph x10:u8][temperature x10:u16][o2 x10:u16][level:u8]
+#   [transpiration:u8][ec_pump|ph_pump|flow in the top three bits]
+LORA_PAYLOAD = struct.Struct(">HBHHBBB")
+
+
+# ─────────────────────────────────────────────────────────────────────
+# Device model
+# ─────────────────────────────────────────────────────────────────────
+
+class Device:
+    """One simulated tank. step() advances simulated time and returns a sample.
+
+    All variables share one driver, the plant uptake rate (higher with light
+    and temperature), so they move together the way a real tank does:
+    water level falls and EC concentrates as plants transpire, pH drifts
+    down with nutrient uptake, dissolved O2 falls as the water warms. Doses
+    and top-ups cause the step changes the DCU would.
+    """
+
+    def __init__(self, index, seed):
+        rng = random.Random(seed * 100003 + index)
+        self.rng         = rng
+        self.index       = index
+        self.base_temp   = rng.uniform(19.0, 23.0)
+        self.uptake      = rng.uniform(0.7, 1.3)       # plant vigour
+        self.ph_min, self.ph_set = 5.8, 6.2
+        self.ec_min, self.ec_set = 1100.0, 1300.0
+        self.ph          = rng.uniform(5.9, 6.4)
+        self.ec          = rng.uniform(1150.0, 1400.0)
+        self.temperature = self.base_temp
+        self.water_level = rng.uniform(75.0, 95.0)
+        self.o2          = 8.0
+        self.circulation = True
+        self.ph_pump     = False
+        self.ec_pump     = False
+        self.hour        = rng.uniform(0.0, 24.0)      # simulated time of day
+
+    def step(self, dt_h):
+        rng = self.rng
+        self.hour = (self.hour + dt_h) % 24.0
+        light = max(0.0, math.sin(2 * math.pi * (self.hour - 6.0) / 24.0))
+        root = math.sqrt(dt_h)
+        shared = rng.gauss(0.0, 1.0)                   # common noise term
+
+        # Temperature relaxes towards a diurnal target
+        target = self.base_temp + 3.0 * math.sin(2 * math.pi * (self.hour - 9.0) / 24.0)
+        self.temperature += (target - self.temperature) * (1 - math.exp(-dt_h / 1.5)) \
+                            + 0.08 * root * (0.6 * shared + 0.8 * rng.gauss(0.0, 1.0))
+
+        u = self.uptake * (0.25 + 0.75 * light) * (1 + 0.04 * (self.temperature - 20.0))
+        water_loss = 0.6 * u * dt_h                    # % of tank per hour
+        self.water_level -= water_loss
+        transpiration = sum(1 for _ in range(3) if rng.random() < min(1.0, 4 * u * dt_h))
+
+        # EC: concentrated by water loss, lowered by uptake; pH drifts down
+        self.ec += self.ec * water_loss / max(self.water_level, 1.0) - 25.0 * u * dt_h \
+                   + 4.0 * root * (0.7 * shared + 0.7 * rng.gauss(0.0, 1.0))
+        self.ph -= 0.05 * u * dt_h - 0.01 * root * (-0.5 * shared + 0.85 * rng.gauss(0.0, 1.0))
+
+        # Dissolved O2 follows solubility, which falls as temperature rises
+        saturation = 14.6 - 0.39 * self.temperature + 0.0077 * self.temperature ** 2
+        self.o2 += (0.9 * saturation - self.o2) * (1 - math.exp(-dt_h)) + 0.05 * root * rng.gauss(0.0, 1.0)
+
+        # DCU-style corrections and refills
+        self.ph_pump = self.ph < self.ph_min
+        if self.ph_pump:
+            self.ph += 0.1
+            self.ec += 8.0                             # base adds ions too
+        self.ec_pump = self.ec < self.ec_min and not self.ph_pump
+        if self.ec_pump:
+            self.ec += 60.0
+            self.ph -= 0.03                            # nutrient is slightly acidic
+        if self.water_level < 60.0:
+            self.ec *= self.water_level / 95.0         # top-up dilutes
+            self.water_level = 95.0
+        self.circulation = rng.random() > 0.002
+
+        return {
+            "ph": round(self.ph, 2),
+            "ec": round(self.ec, 1),
+            "water_level": round(self.water_level, 1),
+            "circulation": self.circulation,
+            "temperature": round(self.temperature, 2),
+            "o2": round(self.o2, 2),
+            "ph_pump": self.ph_pump,
+            "ec_pump": self.ec_pump,
+            "transpiration": transpiration,
+        }
+
+
+def lora_payload_hex(sample):
+    flags = (0x80 if sample["ec_pump"] else 0) | (0x40 if sample["ph_pump"] else 0) \
+            | (0x20 if sample["circulation"] else 0)
+    return LORA_PAYLOAD.pack(
+        min(max(int(round(sample["ec"])), 0), 65535),
+        min(max(int(round(sample["ph"] * 10)), 0), 255),
+        min(max(int(round(sample["temperature"] * 10)), 0), 65535),
+        min(max(int(round(sample["o2"] * 10)), 0), 65535),
+        min(max(int(round(sample["water_level"])), 0), 255),
+        min(sample["transpiration"], 255),
+        flags,
+    ).hex().upper()
+
+
+# ─────────────────────────────────────────────────────────────────────
+# Latency / loss tracking
+# ─────────────────────────────────────────────────────────────────────
+
+class Tracker:
+    """Send times of outstanding messages; records latency when they are seen."""
+
+    def __init__(self, timeout=ACK_TIMEOUT_S):
+        self.timeout   = timeout
+        self.pending   = {}
+        self.lock      = threading.Lock()
+        self.sent      = 0
+        self.acked     = 0
+        self.rejected  = 0      # acked with a rejected status
+        self.lost      = 0
+        self.latencies = []     # seconds, since the last report
+        self.all_latencies = []
+
+    def sent_one(self, key):
+        now = time.perf_counter()
+        with self.lock:
+            if key in self.pending:     # seq wrapped before an ack arrived
+                self.lost += 1
+            self.pending[key] = now
+            self.sent += 1
+
+    def seen(self, key, rejected=False, at=None):
+        at = at if at is not None else time.perf_counter()
+        with self.lock:
+            sent_at = self.pending.pop(key, None)
+            if sent_at is None:
+                return
+            self.acked += 1
+            self.rejected += rejected
+            self.latencies.append(at - sent_at)
+
+    def expire(self, final=False):
+        cutoff = time.perf_counter() - (0 if final else self.timeout)
+        with self.lock:
+            old = [k for k, t in self.pending.items() if t < cutoff]
+            for key in old:
+                del self.pending[key]
+            self.lost += len(old)
+
+    def take_latencies(self):
+        with self.lock:
+            out, self.latencies = self.latencies, []
+        self.all_latencies.extend(out)
+        return out
+
+
+def percentiles(values):
+    if not values:
+        return "no samples"
+    values = sorted(values)
+    pick = lambda q: values[min(len(values) - 1, int(q * len(values)))] * 1000
+    return (f"p50 {pick(0.50):.1f} ms  p95 {pick(0.95):.1f} ms  "
+            f"p99 {pick(0.99):.1f} ms  max {values[-1] * 1000:.1f} ms")
+
+
+# ─────────────────────────────────────────────────────────────────────
+# Outputs
+# ─────────────────────────────────────────────────────────────────────
+
+class UDPOutput:
+    """json/binary datagrams to udp_listener, spread over several source sockets."""
+
+    def __init__(self, mode, target, tracker, n_sockets):
+        self.mode    = mode
+        self.target  = target
+        self.tracker = tracker
+        self.socks   = []
+        self.seqs    = []
+        self.selector = selectors.DefaultSelector()
+        for i in range(n_sockets):
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+            sock.setblocking(False)
+            self.socks.append(sock)
+            self.seqs.append(0)
+            self.selector.register(sock, selectors.EVENT_READ, i)
+        self.send_errors = 0
+        self._stop = threading.Event()
+        self._rx = threading.Thread(target=self._ack_loop, name="acks", daemon=True)
+        self._rx.start()
+
+    def _next_seq(self, i):
+        self.seqs[i] = (self.seqs[i] + 1) & 0xFFFF
+        return self.seqs[i]
+
+    def _send(self, i, data, seq):
+        self.tracker.sent_one((i, seq))
+        try:
+            self.socks[i].sendto(data, self.target)
+        except OSError:
+            self.send_errors += 1   # stays pending and expires as lost
+
+    def send(self, device, sample, stamp):
+        i = device.index % len(self.socks)
+        if self.mode == "binary":
+            seq = self._next_seq(i)
+            self._send(i, udp_listener.encode_frame(sample, seq, ack=True), seq)
+            return
+        for name in SENSOR_FIELDS:
+            seq = self._next_seq(i)
+            msg = {"type": name, "timestamp": stamp, "value": sample[name],
+                   "device": device.index, "seq": seq, "ack": True}
+            self._send(i, json.dumps(msg).encode(), seq)
+
+    def _ack_loop(self):
+        while not self._stop.is_set():
+            for key, _ in self.selector.select(timeout=0.1):
+                sock, i = key.fileobj, key.data
+                while True:
+                    try:
+                        data = sock.recv(64)
+                    except (BlockingIOError, InterruptedError):
+                        break
+                    except OSError:
+                        break     # e.g. ICMP port unreachable: nothing listening
+                    if len(data) == udp_listener.ACK.size:
+                        magic, seq, status = udp_listener.ACK.unpack(data)
+                        if magic == udp_listener.ACK_MAGIC:
+                            self.tracker.seen((i, seq), status != udp_listener.ACK_APPLIED)
+
+    def close(self):
+        self._stop.set()
+        self._rx.join()
+        for sock in self.socks:
+            sock.close()
+
+
+class HexOutput:
+    """LoRa payload events for batch_ingest.py, over its TCP queue or into a file."""
+
+    def __init__(self, tracker, target=None, path=None, verify_db=None):
+        self.tracker = tracker
+        self.file = open(path, "a") if path else None
+        self.conn = None if path else socket.create_connection(target)
+        self.watcher = None
+        if verify_db:
+            self.watcher = DbWatcher(verify_db, tracker)
+
+    def send(self, device, sample, stamp):
+        event = {"payloadHex": lora_payload_hex(sample), "recorded_at": stamp,
+                 "device": device.index}
+        line = json.dumps(event) + "\n"
+        if self.watcher is not None:
+            self.tracker.sent_one(stamp)
+        else:
+            self.tracker.sent += 1
+        if self.file is not None:
+            self.file.write(line)
+        else:
+            self.conn.sendall(line.encode())
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+        if self.conn is not None:
+            self.conn.close()
+        if self.watcher is not None:
+            self.watcher.stop()
+
+
+class DbWatcher:
+    """Polls the ingest SQLite database for rows this run sent (by recorded_at)."""
+
+    def __init__(self, path, tracker):
+        self.path    = path
+        self.tracker = tracker
+        self.since   = datetime.now(timezone.utc).isoformat()
+        self._stop   = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="db-watch", daemon=True)
+        self._thread.start()
+
+    def _loop(self):
+        conn = sqlite3.connect(self.path)
+        try:
+            while not self._stop.wait(DB_POLL_S):
+                try:
+                    rows = conn.execute("SELECT recorded_at FROM measurements WHERE recorded_at > ? "
+                                        "ORDER BY recorded_at", (self.since,)).fetchall()
+                except sqlite3.OperationalError:
+                    continue          # table not created yet / database busy
+                now = time.perf_counter()
+                for (recorded_at,) in rows:
+                    self.tracker.seen(recorded_at, at=now)
+                if rows:
+                    self.since = rows[-1][0]
+        finally:
+            conn.close()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+
+# ─────────────────────────────────────────────────────────────────────
+# Main loop
+# ─────────────────────────────────────────────────────────────────────
+
+def run(devices, output, tracker, rate, duration, speed, measure):
+    """Send one sample per device every 1/rate s for `duration` seconds."""
+    period = 1.0 / rate
+    start = time.perf_counter()
+    # Stagger devices across the first period so they don't fire together
+    due = [(start + period * d.index / len(devices), d.index) for d in devices]
+    heapq.heapify(due)
+    last_step = {d.index: start for d in devices}
+    next_report, last_sent = start + REPORT_S, 0
+    behind = 0.0
+
+    while due:
+        t, idx = due[0]
+        now = time.perf_counter()
+        if now >= start + duration:
+            break
+        if t > now:
+            time.sleep(min(t - now, max(0.0, next_report - now)) or 0.0005)
+        else:
+            heapq.heapreplace(due, (t + period, idx))
+            behind = max(behind, now - t)
+            device = devices[idx]
+            sample = device.step((now - last_step[idx]) * speed / 3600.0)
+            last_step[idx] = now
+            output.send(device, sample, datetime.now(timezone.utc).isoformat())
+
+        now = time.perf_counter()
+        if now >= next_report:
+            if measure:
+                tracker.expire()
+            lat = tracker.take_latencies()
+            rate_now = (tracker.sent - last_sent) / REPORT_S
+            print(f"[LOADGEN] t={now - start:5.1f}s  {rate_now:,.0f} msg/s  sent={tracker.sent}"
+                  + (f"  acked={tracker.acked}  lost={tracker.lost}  {percentiles(lat)}"
+                     if measure else "")
+                  + (f"  (sender {behind * 1000:.0f} ms behind)" if behind > 0.1 else ""))
+            next_report, last_sent, behind = next_report + REPORT_S, tracker.sent, 0.0
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate a fleet of DMS devices")
+    parser.add_argument("--devices", type=int, default=10)
+    parser.add_argument("--rate", type=float, default=1 / 60,
+                        help="samples per device per second (default 1/60, like the DMS sampler)")
+    parser.add_argument("--mode", choices=("json", "binary", "hex"), default="binary")
+    parser.add_argument("--duration", type=float, default=60.0, help="seconds to run")
+    parser.add_argument("--speed", type=float, default=60.0,
+                        help="simulated seconds per real second (default 60: an hour a minute)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--host", default=UDP_TARGET[0])
+    parser.add_argument("--port", type=int, help="UDP port (json/binary) or TCP port (hex)")
+    parser.add_argument("--out", metavar="FILE", help="hex mode: append events to FILE instead of TCP")
+    parser.add_argument("--verify-db", metavar="DB",
+                        help="hex mode: measure latency/loss by watching batch_ingest's SQLite DB")
+    args = parser.parse_args()
+
+    tracker = Tracker()
+    devices = [Device(i, args.seed) for i in range(args.devices)]
+    if args.mode == "hex":
+        output = HexOutput(tracker, (args.host, args.port or INGEST_TARGET[1]),
+                           args.out, args.verify_db)
+        measure = args.verify_db is not None
+    else:
+        output = UDPOutput(args.mode, (args.host, args.port or UDP_TARGET[1]), tracker,
+                           min(args.devices, MAX_SOCKETS))
+        measure = True
+
+    print(f"[LOADGEN] {args.devices} devices x {args.rate:g}/s, mode {args.mode}, "
+          f"{args.duration:g}s at {args.speed:g}x simulated time")
+    try:
+        elapsed = run(devices, output, tracker, args.rate, args.duration, args.speed, measure)
+    except KeyboardInterrupt:
+        elapsed = None
+    if measure:
+        time.sleep(tracker.timeout)     # let late acks/rows arrive
+    output.close()
+    if measure:
+        tracker.expire(final=True)
+    tracker.take_latencies()
+
+    print(f"[LOADGEN] Done. sent={tracker.sent}"
+          + (f" in {elapsed:.1f}s ({tracker.sent / elapsed:,.0f} msg/s)" if elapsed else ""))
+    if measure:
+        loss = tracker.lost / tracker.sent * 100 if tracker.sent else 0.0
+        print(f"[LOADGEN] acked={tracker.acked} rejected={tracker.rejected} "
+              f"lost={tracker.lost} ({loss:.2f}%)")
+        print(f"[LOADGEN] latency: {percentiles(tracker.all_latencies)}")
+
+
+if __name__ == "__main__":
+    main()
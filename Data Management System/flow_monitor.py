@@ -0,0 +1,133 @@
+# flow_monitor.py — Flow Switch Monitoring
+# ELEC 421 Design
+# ─────────────────────────────────────────────────────────────────────
+# Responsibilities:
+#   - Follow a tank's flow switch through gpiozero edge callbacks rather
+#     than sampling the pin once per poll
+#   - Debounce in software: a new state counts only once the pin has held
+#     it for DEBOUNCE_S, and is dated from when it settled
+#   - Keep per-interval circulation statistics: on-time duty cycle,
+#     transitions and the longest off streak
+#   - Report how long flow has been off so DMS can raise a stall alarm
+#     within seconds
+# ─────────────────────────────────────────────────────────────────────
+
+import threading
+import time
+
+# ─────────────────────────────────────────────────────────────────────
+# Configuration
+# ─────────────────────────────────────────────────────────────────────
+
+DEBOUNCE_S  = 0.05     # Pin must hold a new state this long to count
+STALL_S     = 5.0      # Flow off this long = stalled (alert rule flow_stalled)
+WATCH_S     = 1.0      # How often DMS checks for a stall
+
+
+class FlowMonitor:
+    """Debounced state and statistics for one flow switch.
+
+    Callbacks arrive on gpiozero's thread; DMS reads from its own tasks,
+    so everything goes through one lock. Pending edges are settled lazily
+    whenever the monitor is touched, so no timer thread is needed.
+    """
+
+    def __init__(self, debounce_s=DEBOUNCE_S, clock=time.monotonic):
+        self.debounce_s = debounce_s
+        self.clock      = clock
+        self.device     = None
+        self.on         = None      # debounced state, None until attached
+        self.transitions_total = 0
+        self._lock      = threading.Lock()
+        self._pending   = None      # (state, time it was first seen)
+        self._since     = None      # time the current state began
+        self._start_interval(clock())
+
+    def attach(self, device):
+        """Take over `device`'s (a DigitalInputDevice) edge callbacks."""
+        now = self.clock()
+        with self._lock:
+            self.device = device
+            self.on     = bool(device.value)
+            self._since = now
+            self._start_interval(now)
+        device.when_activated   = lambda *_: self._edge(True)
+        device.when_deactivated = lambda *_: self._edge(False)
+
+    @property
+    def attached(self):
+        return self.device is not None
+
+    def _start_interval(self, now):
+        self._interval_start = now
+        self._on_s           = 0.0
+        self._transitions    = 0
+        self._longest_off    = 0.0
+
+    def _edge(self, state):
+        now = self.clock()
+        with self._lock:
+            self._settle(now)
+            if state == self.on:
+                self._pending = None          # bounced back before settling
+            elif self._pending is None or self._pending[0] != state:
+                self._pending = (state, now)
+
+    def _settle(self, now):
+        # Accept a pending state once it has held for debounce_s
+        if self._pending is None:
+            return
+        state, seen = self._pending
+        if now - seen < self.debounce_s:
+            return
+        self._pending = None
+        self._close_run(seen)
+        self.on = state
+        self._since = seen
+        self._transitions += 1
+        self.transitions_total += 1
+
+    def _close_run(self, end):
+        # Add the run from _since to `end` to this interval's totals
+        start = max(self._since, self._interval_start)
+        length = max(0.0, end - start)
+        if self.on:
+            self._on_s += length
+        else:
+            self._longest_off = max(self._longest_off, length)
+
+    def is_on(self):
+        """Debounced flow state, or None if no pin is attached."""
+        with self._lock:
+            self._settle(self.clock())
+            return self.on
+
+    def off_seconds(self):
+        """Seconds flow has been continuously off (0 while flowing)."""
+        now = self.clock()
+        with self._lock:
+            self._settle(now)
+            if self.on is None or self.on:
+                return 0.0
+            return now - self._since
+
+    def take_interval(self):
+        """Return this interval's stats and start a new interval.
+
+        Returns None if no pin is attached, else a dict with duty (0-1),
+        transitions and longest_off_s.
+        """
+        now = self.clock()
+        with self._lock:
+            if self.on is None:
+                return None
+            self._settle(now)
+            self._close_run(now)
+            elapsed = now - self._interval_start
+            stats = {
+                "duty":          self._on_s / elapsed if elapsed > 0 else (1.0 if self.on else 0.0),
+                "transitions":   self._transitions,
+                "longest_off_s": self._longest_off,
+            }
+            self._start_interval(now)
+            return stats
@@ -0,0 +1,116 @@
+# live_stream.py — Local Live Snapshot Stream
+# ELEC 421 Design
+# ─────────────────────────────────────────────────────────────────────
+# Responsibilities:
+#   - Fan each sensor poll snapshot out to any number of LAN clients as a
+#     Server-Sent Events stream (GET /stream on the local HTTP server)
+#   - Send a full snapshot on connect, then delta-only messages holding
+#     just the fields that changed since the previous poll
+#   - Give every client a small bounded buffer; a client that falls
+#     behind is disconnected instead of ever blocking the poll loop
+# ─────────────────────────────────────────────────────────────────────
+
+import asyncio
+import json
+import time
+
+import dms_log
+import local_http
+
+# ─────────────────────────────────────────────────────────────────────
+# Configuration
+# ─────────────────────────────────────────────────────────────────────
+
+CLIENT_BUFFER   = 32      # Messages queued per client before it is dropped
+MAX_CLIENTS     = 16
+HEARTBEAT_S     = 15      # Comment line sent when idle so dead peers are noticed
+RETRY_MS        = 3000    # Reconnect delay suggested to EventSource clients
+
+log = dms_log.get_logger("stream")
+
+_MISSING = object()
+
+
+class _Client:
+    def __init__(self, writer):
+        self.writer  = writer
+        self.peer    = writer.get_extra_info("peername")
+        self.queue   = asyncio.Queue(maxsize=CLIENT_BUFFER)
+        self.dropped = False
+
+
+class SnapshotBroadcaster:
+    """Publishes snapshots as deltas to subscribed SSE clients.
+
+    publish() runs on the event loop and never waits on a client.
+    """
+
+    def __init__(self):
+        self._clients  = set()
+        self._last     = {}
+        self.seq       = 0
+        self.published = 0      # delta messages produced
+        self.slow_drops = 0     # clients disconnected for falling behind
+
+    def client_count(self):
+        return len(self._clients)
+
+    def publish(self, snapshot):
+        """Fan out the fields of `snapshot` that changed since the last call."""
+        changes = {k: v for k, v in snapshot.items() if self._last.get(k, _MISSING) != v}
+        self._last = dict(snapshot)
+        if not changes:
+            return
+        self.seq += 1
+        self.published += 1
+        message = ("delta", self.seq, {"ts": round(time.time(), 3), "changes": changes})
+        for client in list(self._clients):
+            try:
+                client.queue.put_nowait(message)
+            except asyncio.QueueFull:
+                self._drop(client)
+
+    def _drop(self, client):
+        client.dropped = True
+        self._clients.discard(client)
+        self.slow_drops += 1
+        # Wake the client's handler and abort the socket, in case the
+        # handler is stuck in drain() on a stalled peer
+        while not client.queue.empty():
+            client.queue.get_nowait()
+        client.queue.put_nowait(None)
+        client.writer.transport.abort()
+        log.warning("Dropped slow client", peer=client.peer)
+
+    async def handle(self, request, writer):
+        """local_http handler for GET /stream."""
+        if len(self._clients) >= MAX_CLIENTS:
+            await local_http.respond(writer, 503, "too many stream clients\n")
+            return
+        client = _Client(writer)
+        self._clients.add(client)
+        log.info("Client connected", peer=client.peer, clients=len(self._clients))
+        try:
+            await local_http.start_stream(writer, "text/event-stream")
+            writer.write(f"retry: {RETRY_MS}\n\n".encode())
+            await _send(writer, "snapshot", self.seq, {"ts": round(time.time(), 3),
+                                                       "changes": dict(self._last)})
+            while True:
+                try:
+                    message = await asyncio.wait_for(client.queue.get(), HEARTBEAT_S)
+                except asyncio.TimeoutError:
+                    writer.write(b": ping\n\n")
+                    await writer.drain()
+                    continue
+                if message is None:
+                    return
+                await _send(writer, *message)
+        finally:
+            self._clients.discard(client)
+            if not client.dropped:
+                log.info("Client disconnected", peer=client.peer, clients=len(self._clients))
+
+
+async def _send(writer, event, seq, data):
+    writer.write(f"event: {event}\nid: {seq}\ndata: {json.dumps(data)}\n\n".encode())
+    await writer.drain()
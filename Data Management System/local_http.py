@@ -0,0 +1,127 @@
+# local_http.py — Local HTTP Endpoint
+# ELEC 421 Design
+# ─────────────────────────────────────────────────────────────────────
+# Responsibilities:
+#   - Minimal asyncio HTTP/1.1 server for LAN-only DMS endpoints
+#     (e.g. /metrics), with no third-party web framework on the Pi
+#   - Route GET requests by path to async handlers that write their own
+#     response, so a handler can also hold the connection open and stream
+# ─────────────────────────────────────────────────────────────────────
+
+import asyncio
+from urllib.parse import parse_qs, urlsplit
+
+import dms_log
+
+# ─────────────────────────────────────────────────────────────────────
+# Configuration
+# ─────────────────────────────────────────────────────────────────────
+
+HTTP_HOST       = "0.0.0.0"
+HTTP_PORT       = 9108
+REQUEST_TIMEOUT = 5.0      # Seconds to receive the request head
+MAX_HEADER_LINES = 64
+
+log = dms_log.get_logger("http")
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+class Request:
+    def __init__(self, method, target, headers):
+        parts        = urlsplit(target)
+        self.method  = method
+        self.path    = parts.path
+        self.query   = {k: v[-1] for k, v in parse_qs(parts.query).items()}
+        self.headers = headers
+
+
+async def respond(writer, status, body, content_type="text/plain; charset=utf-8"):
+    """Write a complete response and close the connection."""
+    if isinstance(body, str):
+        body = body.encode()
+    head = (f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: close\r\n\r\n")
+    writer.write(head.encode() + body)
+    await writer.drain()
+
+
+async def start_stream(writer, content_type):
+    """Write headers for an open-ended response; the handler then streams the body."""
+    writer.write((f"HTTP/1.1 200 OK\r\n"
+                  f"Content-Type: {content_type}\r\n"
+                  f"Cache-Control: no-cache\r\n"
+                  f"Access-Control-Allow-Origin: *\r\n"
+                  f"Connection: close\r\n\r\n").encode())
+    await writer.drain()
+
+
+class LocalHTTPServer:
+    """Routes GET requests to `async handler(request, writer)` callables."""
+
+    def __init__(self, host=HTTP_HOST, port=HTTP_PORT):
+        self.host    = host
+        self.port    = port
+        self._routes = {}
+        self._conns  = set()      # connection handler tasks, cancelled on stop
+
+    def route(self, path, handler):
+        self._routes[path] = handler
+
+    async def serve(self):
+        """Serve until cancelled (run as a runtime task)."""
+        server = await asyncio.start_server(self._handle, self.host, self.port)
+        log.info("Serving", routes=",".join(sorted(self._routes)), host=self.host, port=self.port)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            # Long-lived handlers (streams) are not stopped by closing the server
+            for task in list(self._conns):
+                task.cancel()
+            await asyncio.gather(*self._conns, return_exceptions=True)
+
+    async def _handle(self, reader, writer):
+        task = asyncio.current_task()
+        self._conns.add(task)
+        try:
+            request = await asyncio.wait_for(self._read_request(reader), REQUEST_TIMEOUT)
+            if request is None:
+                await respond(writer, 400, "bad request\n")
+            elif request.method != "GET":
+                await respond(writer, 405, "GET only\n")
+            elif request.path not in self._routes:
+                await respond(writer, 404, "not found\n")
+            else:
+                await self._routes[request.path](request, writer)
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        except asyncio.CancelledError:
+            # Server stopping. Return normally: start_server's done-callback
+            # calls task.exception(), which raises on a cancelled task (3.11)
+            pass
+        except Exception as e:
+            log.exception("Request failed", error=e)
+            try:
+                await respond(writer, 500, "internal error\n")
+            except ConnectionError:
+                pass
+        finally:
+            self._conns.discard(task)
+            writer.close()
+
+    async def _read_request(self, reader):
+        line = (await reader.readline()).decode("latin-1").split()
+        if len(line) != 3:
+            return None
+        headers = {}
+        for _ in range(MAX_HEADER_LINES):
+            raw = (await reader.readline()).decode("latin-1").strip()
+            if not raw:
+                break
+            name, _, value = raw.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        return Request(line[0], line[1], headers)
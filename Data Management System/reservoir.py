@@ -0,0 +1,167 @@
+# reservoir.py — Reservoir Instances
+# ELEC 421 Design
+# ─────────────────────────────────────────────────────────────────────
+# Responsibilities:
+#   - Hold everything DMS keeps per tank: sensor addresses and I2C bus,
+#     live sensor state, limits, alert engine, readiness flag, CSV log,
+#     LoRa FPorts and dosing pump addresses
+#   - Give DCU and the DMS loops one object per tank to read and write
+#     through, each with its own locks
+#   - Run each tank's readings through its own outlier filters, keeping
+#     the raw values alongside the filtered ones
+#   - Estimate each tank's transpiration rate from its water level
+#   - Track each tank's flow switch (flow_monitor.py)
+#   - Remember which dose journal records were last summarised for the
+#     tank's dose uplink (dose_journal.py)
+#   - Save and restore the tank's transpiration counter, estimator,
+#     telemetry sequence number and dose journal read position for warm
+#     restarts (checkpoint.py)
+#   The first ("main") reservoir wraps DMS's module-level state, so code
+#   that uses DMS.read_ph() and friends keeps working unchanged.
+# ─────────────────────────────────────────────────────────────────────
+
+import random
+import threading
+
+import alerts
+import dose_journal
+import flow_monitor
+import sensor_filter
+import sensors
+import transpiration
+
+READING_KEYS = ("ph", "ec", "temperature", "water_level", "circulation", "o2")
+
+
+class Reservoir:
+    """One tank: its sensor array, state, limits, log and LoRa ports."""
+
+    def __init__(self, name, sensor_state, limits, tank=None, i2c_bus=sensors.I2C_BUS,
+                 ph_pump_addr=0x67, ec_pump_addr=0x68, csv_file=None,
+                 uplink_port=2, alert_port=3, dose_port=dose_journal.DOSE_PORT,
+                 sensor_lock=None, limits_lock=None,
+                 sensors_ready=None, alert_engine=None,
+                 tank_litres=transpiration.TANK_LITRES, canopy_m2=transpiration.CANOPY_M2):
+        self.name          = name
+        self.tank          = tank if tank is not None else sensors.TankAddresses(name)
+        self.i2c_bus       = i2c_bus
+        self.ph_pump_addr  = ph_pump_addr
+        self.ec_pump_addr  = ec_pump_addr
+        self.csv_file      = csv_file      # None = DMS.CSV_FILE
+        self.uplink_port   = uplink_port
+        self.alert_port    = alert_port
+        self.dose_port     = dose_port
+        self.dose_index    = 0             # next journal record to summarise
+        # Next telemetry sequence number (payload v2). Without a checkpoint
+        # it starts at random, so it doesn't reuse numbers still in flight
+        self.uplink_seq    = random.randrange(0x10000)
+        self.seq_anchor    = None          # [seq, Unix time] of this group's anchor frame
+
+        self.sensor_state  = sensor_state
+        self.limits        = limits
+        self.sensor_lock   = sensor_lock if sensor_lock is not None else threading.Lock()
+        self.limits_lock   = limits_lock if limits_lock is not None else threading.Lock()
+        self.sensors_ready = sensors_ready if sensors_ready is not None else threading.Event()
+        self.alert_engine  = alert_engine if alert_engine is not None else alerts.AlertEngine()
+        self.filters       = sensor_filter.ChannelFilters()
+        self.transpiration = transpiration.TranspirationEstimator(tank_litres, canopy_m2)
+        self.flow          = flow_monitor.FlowMonitor()   # attached in DMS.main()
+
+    @property
+    def is_main(self):
+        return self.name == "main"
+
+    # ── State access ─────────────────────────────────────────────────
+
+    def _state(self, key):
+        with self.sensor_lock:
+            return self.sensor_state[key]
+
+    def _limit(self, key):
+        with self.limits_lock:
+            return self.limits[key]
+
+    def read_ph(self):           return self._state("ph")
+    def read_ec(self):           return self._state("ec")
+    def read_water_level(self):  return self._state("water_level")
+    def read_circulation(self):  return self._state("circulation")
+    def read_ph_min(self):       return self._limit("ph_min")
+    def read_ph_max(self):       return self._limit("ph_max")
+    def read_ph_set(self):       return self._limit("ph_set")
+    def read_ec_min(self):       return self._limit("ec_min")
+    def read_ec_set(self):       return self._limit("ec_set")
+
+    def set_ph_pump(self, active):
+        with self.sensor_lock:
+            self.sensor_state["ph_pump"] = active
+
+    def set_ec_pump(self, active):
+        with self.sensor_lock:
+            self.sensor_state["ec_pump"] = active
+
+    def filter_reading(self, data):
+        """Return (filtered reading, outliers) from sensor_filter.ChannelFilters.apply."""
+        return self.filters.apply(data)
+
+    def apply_reading(self, data, raw=None):
+        """Store a sensor reading, and the unfiltered values if given.
+
+        `data` may hold only some channels (a UDP update); the others keep
+        their values. Returns the tank's full reading after the update.
+        """
+        with self.sensor_lock:
+            for key in READING_KEYS:
+                if key in data:
+                    self.sensor_state[key] = data[key]
+            if raw is not None:
+                for key in self.filters.filters:
+                    if key in raw:
+                        self.sensor_state[f"{key}_raw"] = raw[key]
+            return {key: self.sensor_state[key] for key in READING_KEYS}
+
+    def record_level(self, t, level):
+        """Feed one water-level reading to the transpiration estimator."""
+        with self.sensor_lock:
+            dosing = self.sensor_state["ph_pump"] or self.sensor_state["ec_pump"]
+        rate = self.transpiration.add(t, level, dosing)
+        with self.sensor_lock:
+            self.sensor_state["transpiration_rate"] = rate
+
+    def take_transpiration(self):
+        """Return this interval's uplink transpiration value.
+
+        Counts injected over UDP (dms_tester) are taken and reset as before;
+        otherwise it is the estimator's current rate.
+        """
+        with self.sensor_lock:
+            count = self.sensor_state["transpiration"]
+            self.sensor_state["transpiration"] = 0
+        return count if count else self.transpiration.payload_value()
+
+    def checkpoint_state(self):
+        with self.sensor_lock:
+            count = self.sensor_state["transpiration"]
+        return {"transpiration": count, "estimator": self.transpiration.state(),
+                "uplink_seq": self.uplink_seq, "seq_anchor": self.seq_anchor,
+                "dose_index": self.dose_index}
+
+    def restore_checkpoint(self, state):
+        with self.sensor_lock:
+            self.sensor_state["transpiration"] += state["transpiration"]
+        self.transpiration.restore(state["estimator"])
+        self.uplink_seq = state.get("uplink_seq", self.uplink_seq)
+        self.seq_anchor = state.get("seq_anchor")
+        self.dose_index = state.get("dose_index", self.dose_index)
+
+    def snapshot(self):
+        """Copy of sensor state and limits in one flat dict."""
+        with self.sensor_lock:
+            snap = dict(self.sensor_state)
+        with self.limits_lock:
+            snap.update(self.limits)
+        snap["outliers"] = self.filters.counts()
+        return snap
+
+    def update_limits(self, values):
+        with self.limits_lock:
+            self.limits.update(values)
@@ -0,0 +1,218 @@
+# runtime.py — DMS Service Runtime
+# ELEC 421 Design
+# ─────────────────────────────────────────────────────────────────────
+# Responsibilities:
+#   - Run every DMS service loop as a coroutine on one asyncio event loop
+#   - Push blocking I2C and file calls onto a bounded thread pool, and
+#     LoRa serial calls onto their own thread, so a stuck join or a
+#     long downlink poll never holds a pool worker
+#   - Supervise tasks: restart crashed loops, record per-task health
+#   - Shut down cleanly on SIGINT/SIGTERM by cancelling every task and
+#     running registered shutdown hooks
+# ─────────────────────────────────────────────────────────────────────
+
+import asyncio
+import functools
+import signal
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import dms_log
+
+# ─────────────────────────────────────────────────────────────────────
+# Configuration
+# ─────────────────────────────────────────────────────────────────────
+
+EXECUTOR_WORKERS = 6      # Threads available for blocking hardware/file calls
+RESTART_DELAY    = 5      # Seconds before a crashed task is restarted
+SHUTDOWN_TIMEOUT = 10     # Seconds to wait for cancelled tasks to unwind
+
+log = dms_log.get_logger("runtime")
+
+
+class TaskHealth:
+    """Health record for one supervised task."""
+
+    def __init__(self, name):
+        self.name       = name
+        self.state      = "starting"   # starting | running | restarting | done | failed | cancelled
+        self.started    = time.monotonic()
+        self.last_beat  = None         # time.monotonic() of the task's last beat()
+        self.restarts   = 0
+        self.last_error = None
+
+    def as_dict(self):
+        now = time.monotonic()
+        return {
+            "state": self.state,
+            "uptime_s": round(now - self.started, 1),
+            "last_beat_age_s": None if self.last_beat is None else round(now - self.last_beat, 1),
+            "restarts": self.restarts,
+            "last_error": self.last_error,
+        }
+
+
+class _ListedQueue(asyncio.Queue):
+    def snapshot(self):
+        return list(self._queue)
+
+
+class _ListedPriorityQueue(asyncio.PriorityQueue):
+    def snapshot(self):
+        return sorted(self._queue)
+
+
+class BridgeQueue:
+    """asyncio.Queue that executor/background threads can put() into.
+
+    Duck-types the put() side of queue.Queue, so modules like LoRa_run
+    keep working unchanged while consumers await get(). With `priority`
+    it is an asyncio.PriorityQueue: lowest item first.
+    """
+
+    def __init__(self, runtime, maxsize=0, priority=False):
+        self._runtime = runtime
+        self._queue   = (_ListedPriorityQueue if priority else _ListedQueue)(maxsize)
+
+    def put(self, item):
+        self._runtime.call_soon(self._queue.put_nowait, item)
+
+    def put_nowait(self, item):
+        """Put from the event loop; raises asyncio.QueueFull when full."""
+        self._queue.put_nowait(item)
+
+    async def get(self):
+        return await self._queue.get()
+
+    def qsize(self):
+        return self._queue.qsize()
+
+    def snapshot(self):
+        """Items waiting to be taken, in get() order (call on the event loop)."""
+        return self._queue.snapshot()
+
+
+class ServiceRuntime:
+    """Owns the event loop, the blocking-call executors and every service task."""
+
+    def __init__(self, max_workers=EXECUTOR_WORKERS):
+        self.executor  = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="dms-io")
+        self.serial_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="dms-serial")
+        self.loop      = None
+        self._tasks    = {}
+        self._health   = {}
+        self._hooks    = []
+        self._shutdown = None
+
+    # ── Blocking work ────────────────────────────────────────────────
+
+    async def run_blocking(self, fn, *args, **kwargs):
+        """Run a blocking call on the bounded executor and await its result."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(fn, *args, **kwargs))
+
+    async def run_serial(self, fn, *args, **kwargs):
+        """Run a LoRa serial call on the single serial thread and await its result.
+
+        Serial calls run one at a time in submission order, so an uplink
+        waits for a join in progress instead of starting a second one.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.serial_executor,
+                                          functools.partial(fn, *args, **kwargs))
+
+    def call_soon(self, fn, *args):
+        """Schedule `fn` on the event loop from any thread."""
+        self.loop.call_soon_threadsafe(fn, *args)
+
+    # ── Task supervision ─────────────────────────────────────────────
+
+    def spawn(self, name, factory, restart=True):
+        """Start `factory()` as a supervised task.
+
+        If the coroutine raises and `restart` is set it is started again
+        after RESTART_DELAY seconds; cancellation always ends it.
+        """
+        health = TaskHealth(name)
+        self._health[name] = health
+        self._tasks[name] = asyncio.get_running_loop().create_task(
+            self._supervise(health, factory, restart), name=name)
+
+    async def _supervise(self, health, factory, restart):
+        while True:
+            health.state = "running"
+            try:
+                await factory()
+                health.state = "done"
+                return
+            except asyncio.CancelledError:
+                health.state = "cancelled"
+                raise
+            except Exception as e:
+                health.last_error = f"{type(e).__name__}: {e}"
+                log.exception("Task crashed", task=health.name, restart=restart)
+                if not restart:
+                    health.state = "failed"
+                    return
+            health.state = "restarting"
+            health.restarts += 1
+            await asyncio.sleep(RESTART_DELAY)
+
+    def beat(self):
+        """Record progress for the calling task (shown as last_beat_age_s)."""
+        task = asyncio.current_task()
+        health = self._health.get(task.get_name()) if task is not None else None
+        if health is not None:
+            health.last_beat = time.monotonic()
+
+    def health(self):
+        """Return {task name: health dict} for every supervised task."""
+        return {name: h.as_dict() for name, h in self._health.items()}
+
+    def print_health(self):
+        """Log every task's health (SIGUSR1)."""
+        for name, h in self.health().items():
+            log.info("Task health", task=name, **h)
+
+    # ── Lifecycle ────────────────────────────────────────────────────
+
+    def on_shutdown(self, hook):
+        """Register a callable run (in the executor) when the runtime stops."""
+        self._hooks.append(hook)
+
+    def on_signal(self, sig, callback):
+        """Run `callback()` on the event loop when the process receives `sig`."""
+        self.loop.add_signal_handler(sig, callback)
+
+    def request_shutdown(self):
+        if self._shutdown is not None:
+            self.loop.call_soon_threadsafe(self._shutdown.set)
+
+    def run(self, start):
+        """Run until SIGINT/SIGTERM. `start` is a coroutine function that spawns tasks."""
+        asyncio.run(self._main(start))
+
+    async def _main(self, start):
+        self.loop = asyncio.get_running_loop()
+        self._shutdown = asyncio.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            self.loop.add_signal_handler(sig, self._shutdown.set)
+        self.loop.add_signal_handler(signal.SIGUSR1, self.print_health)
+
+        try:
+            await start()
+            await self._shutdown.wait()
+        finally:
+            log.info("Shutting down")
+            for task in self._tasks.values():
+                task.cancel()
+            if self._tasks:
+                await asyncio.wait(list(self._tasks.values()), timeout=SHUTDOWN_TIMEOUT)
+            for hook in self._hooks:
+                try:
+                    await self.run_blocking(hook)
+                except Exception as e:
+                    log.exception("Shutdown hook failed", hook=getattr(hook, "__qualname__", hook))
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.serial_executor.shutdown(wait=False, cancel_futures=True)
+            log.info("Stopped")
@@ -0,0 +1,172 @@
+# sensor_filter.py — Streaming Outlier Rejection
+# ELEC 421 Design
+# ─────────────────────────────────────────────────────────────────────
+# Responsibilities:
+#   - Hampel filter per sensor channel: a reading further than K scaled
+#     MADs from the rolling median of the last WINDOW readings is an
+#     outlier and is replaced by that median
+#   - Rolling medians kept in two heaps with lazy deletion, so each poll
+#     costs O(log w) per channel
+#   - Count outliers per channel so DMS can publish them next to the raw
+#     and filtered values
+#   A genuine step change (fresh solution, a dose) still gets through once
+#   it fills half the window, because every raw reading enters the window.
+# ─────────────────────────────────────────────────────────────────────
+
+import collections
+import heapq
+
+# ─────────────────────────────────────────────────────────────────────
+# Configuration
+# ─────────────────────────────────────────────────────────────────────
+
+WINDOW      = 7        # Readings per window (~14 s at the 2 s poll)
+MIN_SAMPLES = 5        # Pass readings through until the window has this many
+MAD_SCALE   = 1.4826   # MAD -> standard deviation for normally distributed noise
+
+# channel -> (k, MAD floor). The floor stops a perfectly steady probe
+# (MAD 0) from rejecting the first small real change.
+CHANNELS = {
+    "ph":          (3.0, 0.02),
+    "ec":          (3.0, 5.0),
+    "temperature": (3.0, 0.1),
+}
+
+
+class RollingMedian:
+    """Median of the last `window` values in O(log w) per push.
+
+    `low` is a max-heap (negated) holding the smaller half, `high` a
+    min-heap holding the larger half. Values leaving the window are
+    deleted lazily: they are counted in `_delayed` and discarded when they
+    reach the top of their heap.
+    """
+
+    def __init__(self, window):
+        self.window   = window
+        self.values   = collections.deque()
+        self.low      = []
+        self.high     = []
+        self._delayed = collections.Counter()
+        self._low_n   = 0     # live (not delayed) sizes of each heap
+        self._high_n  = 0
+
+    def __len__(self):
+        return len(self.values)
+
+    def median(self):
+        if not self.values:
+            return None
+        if self._low_n > self._high_n:
+            return -self.low[0]
+        return (-self.low[0] + self.high[0]) / 2
+
+    def push(self, value):
+        if not self.low or value <= -self.low[0]:
+            heapq.heappush(self.low, -value)
+            self._low_n += 1
+        else:
+            heapq.heappush(self.high, value)
+            self._high_n += 1
+        self.values.append(value)
+        if len(self.values) > self.window:
+            self._remove(self.values.popleft())
+        self._balance()
+
+    def _remove(self, value):
+        self._delayed[value] += 1
+        if value <= -self.low[0]:
+            self._low_n -= 1
+            if value == -self.low[0]:
+                self._prune(self.low, -1)
+        else:
+            self._high_n -= 1
+            if self.high and value == self.high[0]:
+                self._prune(self.high, 1)
+
+    def _prune(self, heap, sign):
+        while heap:
+            value = sign * heap[0]
+            if not self._delayed.get(value):
+                return
+            self._delayed[value] -= 1
+            if not self._delayed[value]:
+                del self._delayed[value]
+            heapq.heappop(heap)
+
+    def _balance(self):
+        # Keep low with as many live values as high, or one more
+        if self._low_n > self._high_n + 1:
+            heapq.heappush(self.high, -heapq.heappop(self.low))
+            self._low_n -= 1
+            self._high_n += 1
+            self._prune(self.low, -1)
+        elif self._low_n < self._high_n:
+            heapq.heappush(self.low, -heapq.heappop(self.high))
+            self._low_n += 1
+            self._high_n -= 1
+            self._prune(self.high, 1)
+        self._prune(self.low, -1)
+        self._prune(self.high, 1)
+
+
+class HampelFilter:
+    """Streaming Hampel filter for one channel.
+
+    The MAD is the rolling median of each reading's absolute deviation from
+    the median when it arrived, which keeps updates O(log w) instead of
+    re-sorting the window on every poll.
+    """
+
+    def __init__(self, k=3.0, mad_floor=0.0, window=WINDOW, min_samples=MIN_SAMPLES):
+        self.k           = k
+        self.mad_floor   = mad_floor
+        self.min_samples = min_samples
+        self.values      = RollingMedian(window)
+        self.deviations  = RollingMedian(window)
+        self.outliers    = 0
+
+    def update(self, value):
+        """Return (filtered value, was_outlier) and add `value` to the window."""
+        median = self.values.median()
+        outlier = False
+        if median is not None:
+            deviation = abs(value - median)
+            if len(self.values) >= self.min_samples:
+                mad = max(self.deviations.median(), self.mad_floor)
+                outlier = deviation > self.k * MAD_SCALE * mad
+            self.deviations.push(deviation)
+        self.values.push(value)
+        if outlier:
+            self.outliers += 1
+            return median, True
+        return value, False
+
+    def state(self):
+        return {"median": self.values.median(), "mad": self.deviations.median(),
+                "outliers": self.outliers}
+
+
+class ChannelFilters:
+    """One HampelFilter per configured channel of a sensor reading."""
+
+    def __init__(self, channels=CHANNELS, window=WINDOW):
+        self.filters = {name: HampelFilter(k, floor, window)
+                        for name, (k, floor) in channels.items()}
+
+    def apply(self, reading):
+        """Return (filtered reading, {channel: (raw, replacement)} for outliers)."""
+        filtered = dict(reading)
+        rejected = {}
+        for name, hampel in self.filters.items():
+            raw = reading.get(name)
+            if raw is None:
+                continue
+            value, outlier = hampel.update(raw)
+            if outlier:
+                filtered[name] = value
+                rejected[name] = (raw, value)
+        return filtered, rejected
+
+    def counts(self):
+        return {name: hampel.outliers for name, hampel in self.filters.items()}
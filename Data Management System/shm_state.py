@@ -0,0 +1,157 @@
+# shm_state.py — Shared-Memory DMS State
+# ELEC 421 Design
+# ─────────────────────────────────────────────────────────────────────
+# Responsibilities:
+#   - DMS publishes the latest sensor snapshot, pump flags, limits and
+#     active alerts into a fixed-layout shared memory segment
+#     (/dev/shm/dms_state) after every poll
+#   - A seqlock-style sequence counter lets readers take a consistent
+#     copy without locks: the writer makes it odd while writing and even
+#     when done, and readers retry if it changed under them
+#   - Reader is a small library for other local processes (calibration,
+#     debugging tools, exporters) so they never poll the I2C bus or import
+#     DMS. Reads are plain memory accesses on a read-only mmap.
+#
+#   Run `python3 shm_state.py` to print the live state once a second.
+# ─────────────────────────────────────────────────────────────────────
+
+import mmap
+import os
+import struct
+import time
+
+# ─────────────────────────────────────────────────────────────────────
+# Layout
+# ─────────────────────────────────────────────────────────────────────
+
+SHM_NAME      = "dms_state"
+SHM_PATH      = f"/dev/shm/{SHM_NAME}"
+MAGIC         = 0x444D5353      # "DMSS"
+LAYOUT_VERSION = 1
+READ_RETRIES  = 1000            # seqlock retries before giving up on a read
+
+# Header: magic, layout version, writer pid, sequence counter
+HEADER = struct.Struct("<IHxxIxxxxQ")
+SEQ_OFFSET = 16                 # offset of the sequence counter in HEADER
+SEQ = struct.Struct("<Q")
+
+# Payload (little-endian, fixed offsets so other languages can read it too)
+FLOAT_FIELDS = ("updated", "ph", "ec", "temperature", "o2", "water_level",
+                "ph_min", "ph_max", "ec_min", "ec_max", "ec_set", "ph_set")
+PAYLOAD = struct.Struct("<" + "d" * len(FLOAT_FIELDS) + "IIIQ")
+#   ... floats, transpiration:u32, flags:u32, alert codes bitmask:u32, polls:u64
+FLAG_BITS = {"circulation": 0, "ph_pump": 1, "ec_pump": 2}
+
+SIZE = HEADER.size + PAYLOAD.size
+
+
+class Writer:
+    """Owns the segment in the DMS process. publish() is called on the event loop."""
+
+    def __init__(self, name=SHM_NAME):
+        from multiprocessing import shared_memory
+        try:
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()          # left behind by a DMS that did not exit cleanly
+        except FileNotFoundError:
+            pass
+        self._shm  = shared_memory.SharedMemory(name=name, create=True, size=SIZE)
+        self._buf  = self._shm.buf
+        self._seq  = 0
+        self.polls = 0
+        HEADER.pack_into(self._buf, 0, MAGIC, LAYOUT_VERSION, os.getpid(), 0)
+
+    def publish(self, state, limits, alert_codes=()):
+        """Write one snapshot. `state` is DMS.sensor_state, `limits` DMS.limits."""
+        self.polls += 1
+        flags = 0
+        for key, bit in FLAG_BITS.items():
+            if state.get(key):
+                flags |= 1 << bit
+        alert_mask = 0
+        for code in alert_codes:
+            alert_mask |= 1 << code
+        values = [time.time()] + [float(state.get(k, 0.0)) for k in FLOAT_FIELDS[1:6]] \
+                 + [float(limits.get(k, 0.0)) for k in FLOAT_FIELDS[6:]]
+
+        self._seq += 1                          # odd: write in progress
+        SEQ.pack_into(self._buf, SEQ_OFFSET, self._seq)
+        PAYLOAD.pack_into(self._buf, HEADER.size, *values,
+                          int(state.get("transpiration", 0)) & 0xFFFFFFFF,
+                          flags, alert_mask & 0xFFFFFFFF, self.polls)
+        self._seq += 1                          # even: snapshot complete
+        SEQ.pack_into(self._buf, SEQ_OFFSET, self._seq)
+
+    def close(self):
+        self._buf = None
+        self._shm.close()
+        try:
+            self._shm.unlink()
+        except FileNotFoundError:
+            pass
+
+
+class Reader:
+    """Read-only view of the DMS segment for other local processes.
+
+    Raises FileNotFoundError if DMS is not running (no segment).
+    """
+
+    def __init__(self, path=SHM_PATH):
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), SIZE, access=mmap.ACCESS_READ)
+        magic, version, self.writer_pid, _ = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != LAYOUT_VERSION:
+            self._map.close()
+            raise ValueError(f"{path} is not a v{LAYOUT_VERSION} DMS state segment")
+
+    def seq(self):
+        """Current sequence number; changes whenever DMS publishes."""
+        return SEQ.unpack_from(self._map, SEQ_OFFSET)[0]
+
+    def read(self):
+        """Return a consistent snapshot dict, or None before the first publish."""
+        for _ in range(READ_RETRIES):
+            before = SEQ.unpack_from(self._map, SEQ_OFFSET)[0]
+            if not before & 1:
+                values = PAYLOAD.unpack_from(self._map, HEADER.size)
+                if SEQ.unpack_from(self._map, SEQ_OFFSET)[0] == before:
+                    break
+            time.sleep(0)           # let the writer finish
+        else:
+            raise RuntimeError("DMS state kept changing during read")
+        if before == 0:
+            return None
+
+        n = len(FLOAT_FIELDS)
+        snapshot = dict(zip(FLOAT_FIELDS, values[:n]))
+        transpiration, flags, alert_mask, polls = values[n:]
+        snapshot["transpiration"] = transpiration
+        for key, bit in FLAG_BITS.items():
+            snapshot[key] = bool(flags & (1 << bit))
+        snapshot["alert_codes"] = [code for code in range(32) if alert_mask & (1 << code)]
+        snapshot["polls"] = polls
+        snapshot["seq"]   = before
+        return snapshot
+
+    def age(self):
+        """Seconds since DMS last published (grows if DMS has stopped polling)."""
+        snapshot = self.read()
+        return None if snapshot is None else time.time() - snapshot["updated"]
+
+    def close(self):
+        self._map.close()
+
+
+if __name__ == "__main__":
+    reader = Reader()
+    print(f"DMS state segment (writer pid {reader.writer_pid}). Ctrl+C to exit.")
+    try:
+        while True:
+            print(reader.read())
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        reader.close()
@@ -0,0 +1,313 @@
+# tracing.py — Opt-in DMS Trace Capture
+# ELEC 421 Design
+# ─────────────────────────────────────────────────────────────────────
+# Responsibilities:
+#   - Record spans (I2C transactions, EZO waits, lock waits/holds, AT
+#     commands, CSV writes, DCU phases) into a bounded in-memory ring
+#   - Dump the ring as a Chrome/Perfetto trace (JSON, open in
+#     ui.perfetto.dev or chrome://tracing)
+#   - Optionally sample tracemalloc while tracing is on
+#   - Cost next to nothing while tracing is off: every entry point checks
+#     the module-level `enabled` flag first and returns immediately
+# ─────────────────────────────────────────────────────────────────────
+
+import collections
+import json
+import os
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+
+import dms_log
+
+# ─────────────────────────────────────────────────────────────────────
+# Configuration
+# ─────────────────────────────────────────────────────────────────────
+
+RING_SIZE       = 50000      # Events kept; the oldest are dropped first
+TRACE_DIR       = Path("/home/ohm/Documents/traces")
+MALLOC_TOP      = 10         # Allocation sites listed per tracemalloc sample
+LOCK_WAIT_MIN_US = 20        # Shorter lock waits are not worth a span
+
+log = dms_log.get_logger("trace")
+
+enabled = False
+
+# Events are stored as compact tuples and only expanded on dump:
+#   (phase, name, category, ts_us, dur_us, tid, args)
+_ring       = collections.deque(maxlen=RING_SIZE)
+_tracks     = {}             # virtual track name -> tid
+_state_lock = threading.Lock()
+_malloc_stop = threading.Event()
+_malloc_thread = None
+_started_malloc = False
+_started_at = None
+
+
+def _now_us():
+    return time.perf_counter_ns() // 1000
+
+
+def _tid(track):
+    if track is None:
+        return threading.get_ident()
+    tid = _tracks.get(track)
+    if tid is None:
+        tid = _tracks.setdefault(track, 1000000 + len(_tracks))
+    return tid
+
+
+# ─────────────────────────────────────────────────────────────────────
+# Recording
+# ─────────────────────────────────────────────────────────────────────
+
+class _Span:
+    __slots__ = ("name", "cat", "args", "track", "start")
+
+    def __init__(self, name, cat, args, track):
+        self.name  = name
+        self.cat   = cat
+        self.args  = args
+        self.track = track
+
+    def __enter__(self):
+        self.start = _now_us()
+        return self
+
+    def __exit__(self, *exc):
+        _ring.append(("X", self.name, self.cat, self.start, _now_us() - self.start,
+                      _tid(self.track), self.args))
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(name, cat="dms", track=None, **args):
+    """Context manager recording `name` as a span on the calling thread.
+
+    Coroutines interleave on the event loop thread, so long async phases
+    should pass `track` to get their own row in the trace.
+    """
+    if not enabled:
+        return _NULL_SPAN
+    return _Span(name, cat, args or None, track)
+
+
+def complete(name, cat, seconds, track=None, **args):
+    """Record a span that just ended and lasted `seconds` (for timing hooks)."""
+    if not enabled:
+        return
+    end = _now_us()
+    dur = int(seconds * 1e6)
+    _ring.append(("X", name, cat, end - dur, dur, _tid(track), args or None))
+
+
+def instant(name, cat="dms", **args):
+    if enabled:
+        _ring.append(("i", name, cat, _now_us(), 0, threading.get_ident(), args or None))
+
+
+def counter(name, **values):
+    if enabled:
+        _ring.append(("C", name, "counter", _now_us(), 0, 0, values))
+
+
+class TracedLock:
+    """threading.Lock wrapper that records acquire waits and hold times.
+
+    While tracing is off it forwards straight to the wrapped lock.
+    """
+
+    def __init__(self, name, lock=None):
+        self.name  = name
+        self._lock = lock if lock is not None else threading.Lock()
+        self._held_since = None
+
+    def acquire(self, blocking=True, timeout=-1):
+        if not enabled:
+            return self._lock.acquire(blocking, timeout)
+        start = _now_us()
+        got = self._lock.acquire(blocking, timeout)
+        now = _now_us()
+        if now - start >= LOCK_WAIT_MIN_US:
+            _ring.append(("X", f"wait {self.name}", "lock", start, now - start,
+                          threading.get_ident(), None))
+        if got:
+            self._held_since = now
+        return got
+
+    def release(self):
+        held_since, self._held_since = self._held_since, None
+        self._lock.release()
+        if enabled and held_since is not None:
+            _ring.append(("X", f"hold {self.name}", "lock", held_since,
+                          _now_us() - held_since, threading.get_ident(), None))
+
+    def locked(self):
+        return self._lock.locked()
+
+    __enter__ = acquire
+
+    def __exit__(self, *exc):
+        self.release()
+        return False
+
+
+class TracedBus:
+    """SMBus proxy recording each block transfer and the EZO wait between them.
+
+    The gap between a write to a device and its next transaction is the
+    time the code spent waiting on the EZO circuit, so it is recorded as
+    an "EZO wait" span.
+    """
+
+    def __init__(self, bus):
+        self._bus = bus
+        self._last_write = {}
+
+    def _gap(self, addr, start):
+        written = self._last_write.pop(addr, None)
+        if written is not None:
+            _ring.append(("X", f"EZO wait 0x{addr:02X}", "i2c", written, start - written,
+                          threading.get_ident(), None))
+
+    def write_i2c_block_data(self, addr, register, data, *args):
+        start = _now_us()
+        self._gap(addr, start)
+        try:
+            return self._bus.write_i2c_block_data(addr, register, data, *args)
+        finally:
+            end = _now_us()
+            self._last_write[addr] = end
+            _ring.append(("X", f"i2c write 0x{addr:02X}", "i2c", start, end - start,
+                          threading.get_ident(), None))
+
+    def read_i2c_block_data(self, addr, register, length, *args):
+        start = _now_us()
+        self._gap(addr, start)
+        try:
+            return self._bus.read_i2c_block_data(addr, register, length, *args)
+        finally:
+            _ring.append(("X", f"i2c read 0x{addr:02X}", "i2c", start, _now_us() - start,
+                          threading.get_ident(), None))
+
+    def __getattr__(self, name):
+        return getattr(self._bus, name)
+
+
+def traced_bus(bus):
+    """Return `bus` wrapped in a TracedBus while tracing, else `bus` itself."""
+    return TracedBus(bus) if enabled else bus
+
+
+# ─────────────────────────────────────────────────────────────────────
+# tracemalloc sampling
+# ─────────────────────────────────────────────────────────────────────
+
+def _malloc_loop(interval):
+    while not _malloc_stop.wait(interval):
+        current, peak = tracemalloc.get_traced_memory()
+        counter("traced memory", current_kb=current // 1024, peak_kb=peak // 1024)
+        top = tracemalloc.take_snapshot().statistics("lineno")[:MALLOC_TOP]
+        instant("tracemalloc top", "memory",
+                **{str(stat.traceback[0]): f"{stat.size // 1024} KiB" for stat in top})
+
+
+# ─────────────────────────────────────────────────────────────────────
+# Control
+# ─────────────────────────────────────────────────────────────────────
+
+def start(malloc_interval=None):
+    """Start recording. With `malloc_interval` (s), sample tracemalloc too."""
+    global enabled, _malloc_thread, _started_malloc, _started_at
+    with _state_lock:
+        if enabled:
+            return
+        _ring.clear()
+        _started_at = time.time()
+        enabled = True
+        if malloc_interval:
+            _started_malloc = not tracemalloc.is_tracing()
+            if _started_malloc:
+                tracemalloc.start()
+            _malloc_stop.clear()
+            _malloc_thread = threading.Thread(target=_malloc_loop, args=(malloc_interval,),
+                                              name="trace-malloc", daemon=True)
+            _malloc_thread.start()
+    log.info("Tracing on", ring=RING_SIZE, malloc_interval_s=malloc_interval or None)
+
+
+def stop():
+    global enabled, _malloc_thread, _started_malloc
+    with _state_lock:
+        if not enabled:
+            return
+        enabled = False
+        if _malloc_thread is not None:
+            _malloc_stop.set()
+            _malloc_thread.join()
+            _malloc_thread = None
+        if _started_malloc:
+            tracemalloc.stop()
+            _started_malloc = False
+    log.info("Tracing off")
+
+
+def events():
+    """Return the ring as Chrome trace event dicts."""
+    names = {t.ident: t.name for t in threading.enumerate()}
+    pid = os.getpid()
+    out, seen = [], set()
+    for phase, name, cat, ts, dur, tid, args in list(_ring):
+        event = {"ph": phase, "name": name, "cat": cat, "ts": ts, "pid": pid, "tid": tid}
+        if phase == "X":
+            event["dur"] = dur
+        elif phase == "i":
+            event["s"] = "t"
+        if args:
+            event["args"] = args
+        out.append(event)
+        seen.add(tid)
+    for track, tid in _tracks.items():
+        names[tid] = track
+    for tid in seen:
+        if tid in names:
+            out.append({"ph": "M", "name": "thread_name", "pid": pid, "tid": tid,
+                        "args": {"name": names[tid]}})
+    return out
+
+
+def dump(path=None):
+    """Write the ring as a Chrome/Perfetto JSON trace and return its path."""
+    if path is None:
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(_started_at or time.time()))
+        path = TRACE_DIR / f"dms-trace-{stamp}.json"
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    trace = {"traceEvents": events(), "displayTimeUnit": "ms",
+             "otherData": {"started": _started_at, "ring_size": RING_SIZE}}
+    with open(path, "w") as f:
+        json.dump(trace, f)
+    log.info("Trace written", events=len(trace["traceEvents"]), path=path)
+    return path
+
+
+def toggle(malloc_interval=None):
+    """Start tracing, or stop it and dump. Returns the dump path when stopping."""
+    if not enabled:
+        start(malloc_interval)
+        return None
+    stop()
+    return dump()
@@ -0,0 +1,160 @@
+# transpiration.py — Transpiration Rate Estimator
+# ELEC 421 Design
+# ─────────────────────────────────────────────────────────────────────
+# Responsibilities:
+#   - Estimate how fast the plants draw water from the reservoir using the
+#     water-level readings DMS already takes every poll
+#   - Fit a rolling least-squares line through the last WINDOW_S seconds,
+#     kept as running sums so each sample costs O(1)
+#   - Leave out readings taken while dosing or just after, and restart
+#     the fit after a top-up, holding the last good estimate until the
+#     new fit has enough data
+#   - Convert the slope to L/m²/day, the unit the dashboard charts
+# ─────────────────────────────────────────────────────────────────────
+
+import collections
+import threading
+import time
+
+# ─────────────────────────────────────────────────────────────────────
+# Configuration
+# ─────────────────────────────────────────────────────────────────────
+
+TANK_LITRES  = 100.0      # Volume at 100 % water level (set for your tank)
+CANOPY_M2    = 1.0        # Growing area fed by the tank (set for your system)
+
+WINDOW_S     = 24 * 3600  # Fit over the last day (level moves in 5 % steps)
+MIN_SPAN_S   = 6 * 3600   # Need this much history before trusting a fit
+MIN_SAMPLES  = 30
+SAMPLE_S     = 60         # Keep at most one reading per minute in the fit
+SETTLE_S     = 120        # Ignore readings this long after a dose
+TOPUP_PCT    = 10         # Level this far above the fit's low point = top-up
+REBASE_EVERY = 4096       # Recompute the sums from scratch this often
+
+
+class TranspirationEstimator:
+    """Rolling linear regression of water level (%) against time (s)."""
+
+    def __init__(self, tank_litres=TANK_LITRES, canopy_m2=CANOPY_M2, window_s=WINDOW_S):
+        self.tank_litres = tank_litres
+        self.canopy_m2   = canopy_m2
+        self.window_s    = window_s
+        self.rate        = None    # L/m²/day from the last valid fit
+        self.resets      = 0
+        self._lock       = threading.Lock()
+        self._settle_until = 0.0
+        self._clear()
+
+    def _clear(self):
+        self._samples = collections.deque()   # (x, level), x relative to _origin
+        self._origin  = None
+        self._low     = None
+        self._n = self._sx = self._sy = self._sxx = self._sxy = 0.0
+        self._since_rebase = 0
+
+    def _reset(self):
+        if self._samples:
+            self.resets += 1
+        self._clear()
+
+    def mark_event(self, t):
+        """A dose just finished: skip readings for the next SETTLE_S seconds."""
+        with self._lock:
+            self._settle_until = t + SETTLE_S
+
+    def add(self, t, level, dosing=False):
+        """Add one reading taken at monotonic time `t`; return the current rate."""
+        with self._lock:
+            if dosing:
+                self._settle_until = t + SETTLE_S
+                return self.rate
+            if t < self._settle_until:
+                return self.rate
+            if self._low is not None and level >= self._low + TOPUP_PCT:
+                self._reset()     # topped up: the old line no longer applies
+
+            if self._origin is None:
+                self._origin = t
+            x = t - self._origin
+            if self._samples and x - self._samples[-1][0] < SAMPLE_S:
+                return self.rate
+            self._samples.append((x, level))
+            self._n   += 1
+            self._sx  += x
+            self._sy  += level
+            self._sxx += x * x
+            self._sxy += x * level
+            self._low = level if self._low is None else min(self._low, level)
+
+            while x - self._samples[0][0] > self.window_s:
+                old_x, old_y = self._samples.popleft()
+                self._n   -= 1
+                self._sx  -= old_x
+                self._sy  -= old_y
+                self._sxx -= old_x * old_x
+                self._sxy -= old_x * old_y
+
+            self._since_rebase += 1
+            if self._since_rebase >= REBASE_EVERY:
+                self._rebase()
+
+            if self._n >= MIN_SAMPLES and x - self._samples[0][0] >= MIN_SPAN_S:
+                slope = self._slope()
+                if slope is not None:
+                    self.rate = self._to_rate(slope)
+            return self.rate
+
+    def _rebase(self):
+        # Move the origin to the oldest sample and rebuild the sums, so
+        # neither x nor the rounding error in the running sums keeps growing
+        shift = self._samples[0][0]
+        self._origin += shift
+        self._samples = collections.deque((x - shift, y) for x, y in self._samples)
+        self._n   = float(len(self._samples))
+        self._sx  = sum(x for x, _ in self._samples)
+        self._sy  = sum(y for _, y in self._samples)
+        self._sxx = sum(x * x for x, _ in self._samples)
+        self._sxy = sum(x * y for x, y in self._samples)
+        self._since_rebase = 0
+
+    def _slope(self):
+        denom = self._n * self._sxx - self._sx * self._sx
+        if denom <= 0:
+            return None
+        return (self._n * self._sxy - self._sx * self._sy) / denom    # %/s
+
+    def _to_rate(self, slope):
+        litres_per_s = -slope / 100 * self.tank_litres
+        return max(0.0, litres_per_s * 86400 / self.canopy_m2)
+
+    def state(self):
+        """The fit's samples and timers, dated in Unix time (for checkpoint.py)."""
+        with self._lock:
+            offset = time.time() - time.monotonic()
+            return {
+                "rate":         self.rate,
+                "resets":       self.resets,
+                "settle_until": self._settle_until + offset,
+                "origin":       None if self._origin is None else self._origin + offset,
+                "low":          self._low,
+                "samples":      [[round(x, 1), y] for x, y in self._samples],
+            }
+
+    def restore(self, state):
+        """Resume from state(); samples older than the window drop out on the next add."""
+        with self._lock:
+            offset = time.time() - time.monotonic()
+            self._clear()
+            self.rate          = state["rate"]
+            self.resets        = state["resets"]
+            self._settle_until = state["settle_until"] - offset
+            if state["origin"] is not None and state["samples"]:
+                self._origin  = state["origin"] - offset
+                self._low     = state["low"]
+                self._samples = collections.deque((x, y) for x, y in state["samples"])
+                self._rebase()
+
+    def payload_value(self):
+        """The rate as the uplink's u8 field (whole L/m²/day, 0 until known)."""
+        rate = self.rate
+        return 0 if rate is None else min(255, int(round(rate)))
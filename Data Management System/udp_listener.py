@@ -0,0 +1,320 @@
+# udp_listener.py — Local UDP Ingestion
+# ELEC 421 Design
+# ─────────────────────────────────────────────────────────────────────
+# Responsibilities:
+#   - Listen on UDP_PORT (5001) for local updates (dms_tester.py, the
+#     mobile app) on the DMS asyncio loop
+#   - Accept the existing one-field JSON datagrams and a compact batched
+#     binary frame
+#   - Validate every field, coalesce a burst into one update per key and
+#     hand it to DMS once per batch. Pump flags are read-only: they follow
+#     the pump manager, never a LAN sender
+#   - Bound the backlog: datagrams beyond MAX_PENDING are dropped and
+#     counted, so a flood never grows memory or starves other tasks
+#   - Optionally acknowledge a datagram once its batch has been applied,
+#     so senders (fleet_loadgen.py) can measure ingest latency and loss
+#   - Pass {"type": "config", "key": ..., "value": ...} datagrams to the
+#     runtime settings (config.py) through the `configure` hook
+#   - Accept limit and config writes only from CONTROL_HOSTS; any LAN host
+#     may send readings
+# ─────────────────────────────────────────────────────────────────────
+
+import asyncio
+import collections
+import json
+import math
+import socket
+import struct
+
+import dms_log
+
+# ─────────────────────────────────────────────────────────────────────
+# Configuration
+# ─────────────────────────────────────────────────────────────────────
+
+UDP_HOST     = "0.0.0.0"
+UDP_PORT     = 5001
+MAX_PENDING  = 4096        # Raw datagrams buffered before new ones are dropped
+BATCH_SIZE   = 256         # Datagrams parsed per batch before yielding the loop
+READ_BURST   = 512         # Datagrams read from the socket per readiness callback
+COALESCE_S   = 0.02        # Let a burst collect before applying it as one batch
+MAX_DATAGRAM = 2048
+RCVBUF_BYTES = 1 << 20     # Kernel receive buffer to absorb bursts
+CONTROL_HOSTS = ("127.0.0.1", "::1")   # Senders allowed to change limits and settings
+
+log = dms_log.get_logger("udp")
+
+# Batched binary frame (big-endian):
+#   [magic:1 = 0xD5][version:1 = 1][seq:2][count:1]
+#   then `count` records of [field id:1][value:f32]
+# Setting FLAG_ACK in the version byte asks for an ack of `seq`.
+FRAME_MAGIC   = 0xD5
+FRAME_VERSION = 1
+FLAG_ACK      = 0x80
+FRAME_HEADER  = struct.Struct(">BBHB")
+FRAME_RECORD  = struct.Struct(">Bf")
+
+# Ack sent back to the sender after the datagram's batch is applied:
+#   [magic:1 = 0xD6][seq:2][status:1]   status 0 = applied, 1 = rejected
+# JSON datagrams ask for one with "seq": n, "ack": true.
+ACK_MAGIC     = 0xD6
+ACK           = struct.Struct(">BHB")
+ACK_APPLIED   = 0
+ACK_REJECTED  = 1
+
+# field id -> (name, min, max, kind); kind is "float", "int" or "bool".
+# Sensor fields update DMS.sensor_state, limit fields update DMS.limits.
+# 0x07/0x08 stay reserved for the pump flags but are always rejected.
+FIELDS = {
+    0x01: ("ph",            0.0,   14.0,   "float"),
+    0x02: ("ec",            0.0,   20000,  "float"),
+    0x03: ("water_level",   0.0,   100.0,  "float"),
+    0x04: ("circulation",   0,     1,      "bool"),
+    0x05: ("temperature",  -40.0,  150.0,  "float"),
+    0x06: ("o2",            0.0,   100.0,  "float"),
+    0x07: ("ph_pump",       0,     1,      "bool"),
+    0x08: ("ec_pump",       0,     1,      "bool"),
+    0x09: ("transpiration", 0,     1000,   "int"),
+    0x10: ("ph_min",        0.0,   14.0,   "float"),
+    0x11: ("ph_max",        0.0,   14.0,   "float"),
+    0x12: ("ec_min",        0.0,   20000,  "float"),
+    0x13: ("ec_max",        0.0,   20000,  "float"),
+    0x14: ("ec_set",        0.0,   20000,  "float"),
+    0x15: ("ph_set",        0.0,   14.0,   "float"),
+}
+FIELD_IDS    = {name: fid for fid, (name, *_) in FIELDS.items()}
+LIMIT_FIELDS = {"ph_min", "ph_max", "ec_min", "ec_max", "ec_set", "ph_set"}
+SUMMED_FIELDS = {"transpiration"}    # counts accumulate instead of overwrite
+READ_ONLY_FIELDS = {"ph_pump", "ec_pump"}   # actuator state, set by the pump manager
+CONFIG_TYPE   = "config"             # JSON "type" of a runtime setting change
+
+
+def validate(name, value):
+    """Return `value` coerced for field `name`, or raise ValueError."""
+    fid = FIELD_IDS.get(name) if isinstance(name, str) else None
+    if fid is None:
+        raise ValueError(f"unknown field {name!r}")
+    if name in READ_ONLY_FIELDS:
+        raise ValueError(f"{name} is read-only")
+    _, lo, hi, kind = FIELDS[fid]
+    if isinstance(value, bool):
+        value = int(value)
+    if not isinstance(value, (int, float)) or not math.isfinite(value):
+        raise ValueError(f"{name}: non-numeric value {value!r}")
+    if not lo <= value <= hi:
+        raise ValueError(f"{name}: {value} outside [{lo}, {hi}]")
+    if kind == "bool":
+        return bool(value)
+    if kind == "int":
+        return int(value)
+    return float(value)
+
+
+def encode_frame(updates, seq=0, ack=False):
+    """Pack {field: value} into a batched binary frame (for senders/tests)."""
+    body = b"".join(FRAME_RECORD.pack(FIELD_IDS[name], float(value))
+                    for name, value in updates.items())
+    version = FRAME_VERSION | (FLAG_ACK if ack else 0)
+    return FRAME_HEADER.pack(FRAME_MAGIC, version, seq & 0xFFFF, len(updates)) + body
+
+
+def parse_datagram(data):
+    """Return ([(field, raw value)], ack seq or None) from one datagram."""
+    if data[:1] == bytes([FRAME_MAGIC]):
+        if len(data) < FRAME_HEADER.size:
+            raise ValueError("short frame header")
+        _, version, seq, count = FRAME_HEADER.unpack_from(data)
+        if version & ~FLAG_ACK != FRAME_VERSION:
+            raise ValueError(f"unsupported frame version {version}")
+        body = data[FRAME_HEADER.size:]
+        if len(body) != count * FRAME_RECORD.size:
+            raise ValueError(f"frame length {len(body)} does not match count {count}")
+        out = []
+        for fid, value in FRAME_RECORD.iter_unpack(body):
+            if fid not in FIELDS:
+                raise ValueError(f"unknown field id 0x{fid:02X}")
+            out.append((FIELDS[fid][0], value))
+        return out, (seq if version & FLAG_ACK else None)
+
+    msg = json.loads(data)
+    if not isinstance(msg, dict) or "type" not in msg or "value" not in msg:
+        raise ValueError("JSON datagram needs 'type' and 'value'")
+    ack = msg.get("seq") if msg.get("ack") and isinstance(msg.get("seq"), int) else None
+    if msg["type"] == CONFIG_TYPE:
+        if not isinstance(msg.get("key"), str):
+            raise ValueError("config datagram needs a 'key'")
+        return [(CONFIG_TYPE, (msg["key"], msg["value"]))], ack
+    return [(msg["type"], msg["value"])], ack
+
+
+def decode_datagram(data):
+    """Return [(field, raw value)] from one datagram (JSON or binary frame)."""
+    return parse_datagram(data)[0]
+
+
+class UDPStats:
+    def __init__(self):
+        self.received  = 0     # datagrams accepted into the backlog
+        self.dropped   = 0     # datagrams dropped because the backlog was full
+        self.rejected  = 0     # datagrams or fields that failed validation
+        self.applied   = 0     # fields written to DMS state
+        self.coalesced = 0     # fields superseded by a newer value in the same batch
+        self.batches   = 0
+        self.acked     = 0     # acks sent back to senders
+
+    def as_dict(self):
+        return dict(vars(self))
+
+
+class UDPIngest:
+    """Buffers datagrams and applies validated, coalesced updates in batches.
+
+    `apply(sensor_updates, limit_updates)` is called on the event loop once
+    per batch; DMS uses it to take each state lock once. The socket is read
+    from a loop reader callback that drains up to READ_BURST datagrams per
+    wake-up (asyncio's datagram transport reads only one).
+
+    `configure(key, value)`, if given, applies a config datagram at once and
+    raises ValueError to reject it. Limit fields and config datagrams from
+    a host not in `control_hosts` are rejected.
+    """
+
+    def __init__(self, apply, max_pending=MAX_PENDING, batch_size=BATCH_SIZE, configure=None,
+                 control_hosts=CONTROL_HOSTS):
+        self.apply       = apply
+        self.configure   = configure
+        self.control_hosts = frozenset(control_hosts)
+        self.batch_size  = batch_size
+        self.stats       = UDPStats()
+        self._pending    = collections.deque()
+        self._max_pending = max_pending
+        self._ready      = asyncio.Event()
+        self.sock        = None
+
+    # ── Socket reading (keep this cheap) ─────────────────────────────
+
+    def on_readable(self):
+        for _ in range(READ_BURST):
+            try:
+                data, addr = self.sock.recvfrom(MAX_DATAGRAM)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as e:
+                log.error("Socket error", error=e)
+                return
+            self.datagram_received(data, addr)
+
+    def datagram_received(self, data, addr):
+        if len(self._pending) >= self._max_pending:
+            self.stats.dropped += 1
+            return
+        self._pending.append((data, addr))
+        self.stats.received += 1
+        self._ready.set()
+
+    def _reject(self, reason):
+        # Log the first few and then every 1000th so a bad sender can't flood stdout
+        self.stats.rejected += 1
+        if self.stats.rejected <= 10 or self.stats.rejected % 1000 == 0:
+            log.warning("Rejected datagram", total=self.stats.rejected, reason=reason)
+
+    # ── Batch processing ─────────────────────────────────────────────
+
+    def process_batch(self):
+        """Parse up to batch_size datagrams and apply them. Returns the count."""
+        sensor_updates, limit_updates = {}, {}
+        acks = []
+        n = 0
+        while self._pending and n < self.batch_size:
+            data, addr = self._pending.popleft()
+            n += 1
+            try:
+                fields, ack_seq = parse_datagram(data)
+            except (ValueError, UnicodeDecodeError) as e:
+                self._reject(e)
+                continue
+            status = ACK_APPLIED
+            control = addr[0] in self.control_hosts
+            for name, raw in fields:
+                if (name == CONFIG_TYPE or name in LIMIT_FIELDS) and not control:
+                    self._reject(f"{name} from {addr[0]} not in control_hosts")
+                    status = ACK_REJECTED
+                    continue
+                if name == CONFIG_TYPE:
+                    try:
+                        if self.configure is None:
+                            raise ValueError("config datagrams are not accepted")
+                        self.configure(*raw)
+                    except ValueError as e:
+                        self._reject(e)
+                        status = ACK_REJECTED
+                    continue
+                try:
+                    value = validate(name, raw)
+                except ValueError as e:
+                    self._reject(e)
+                    status = ACK_REJECTED
+                    continue
+                target = limit_updates if name in LIMIT_FIELDS else sensor_updates
+                if name in target:
+                    self.stats.coalesced += 1
+                    if name in SUMMED_FIELDS:
+                        value += target[name]
+                target[name] = value
+            if ack_seq is not None:
+                acks.append((ack_seq, status, addr))
+
+        if sensor_updates or limit_updates:
+            self.apply(sensor_updates, limit_updates)
+            self.stats.applied += len(sensor_updates) + len(limit_updates)
+        if acks:
+            self._send_acks(acks)
+        if n:
+            self.stats.batches += 1
+        return n
+
+    def _send_acks(self, acks):
+        if self.sock is None:
+            return
+        for seq, status, addr in acks:
+            try:
+                self.sock.sendto(ACK.pack(ACK_MAGIC, seq & 0xFFFF, status), addr)
+            except (BlockingIOError, InterruptedError):
+                return              # send buffer full: sender counts these as lost
+            except OSError:
+                continue
+            self.stats.acked += 1
+
+    async def drain(self):
+        """Process the backlog forever, yielding to other tasks between batches."""
+        while True:
+            await self._ready.wait()
+            await asyncio.sleep(COALESCE_S)
+            self._ready.clear()
+            while self.process_batch():
+                await asyncio.sleep(0)
+
+
+def open_socket(host=UDP_HOST, port=UDP_PORT):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RCVBUF_BYTES)
+    except OSError:
+        pass     # capped by net.core.rmem_max; the default still works
+    sock.bind((host, port))
+    sock.setblocking(False)
+    return sock
+
+
+async def serve(ingest, host=UDP_HOST, port=UDP_PORT):
+    """Run the UDP endpoint until cancelled (run as a runtime task)."""
+    loop = asyncio.get_running_loop()
+    ingest.sock = open_socket(host, port)
+    loop.add_reader(ingest.sock.fileno(), ingest.on_readable)
+    log.info("Listening", host=host, port=port)
+    try:
+        await ingest.drain()
+    finally:
+        loop.remove_reader(ingest.sock.fileno())
+        ingest.sock.close()
@@ -4,17 +4,25 @@
 #   - Monitor pH and EC from DMS at a regular interval
 #   - Dose pH up solution (base) when pH drops below ph_min
 #   - Dose nutrient solution when EC drops below ec_min
-#   - pH is always corrected before EC is considered
+#   - pH is always corrected before EC is considered, unless
+#     CONCURRENT_DOSING is set: then both pumps dose in one mixing window,
+#     with extra base for the pH shift the nutrient causes and pH keeping
+#     priority when it is far out of range (dose_coupling.py)
 #   - Uses Atlas Scientific EZO-PMP I2C peristaltic pump modules
+#   - Pump flags in DMS follow real pump activity (see pump_manager.py)
+#   - One control loop per DMS reservoir, each with its own pumps
+#   - Checkpoint the dosing cycle in progress and the learned dose model,
+#     and pick the cycle back up after a restart (see checkpoint.py)
 # ─────────────────────────────────────────────────────────────────────
 
 import time
 import DMS
-
-try:
-    from smbus2 import SMBus
-except ImportError:
-    from smbus import SMBus
+import checkpoint
+import config
+import dms_log
+import dose_coupling
+import tracing
+from pump_manager import PumpManager
 
 # ─────────────────────────────────────────────────────────────────────
 # Configuration
@@ -27,126 +35,367 @@ DOSE_PH_ML    = 1.0     # mL dispensed per pH correction dose
 DOSE_EC_ML    = 5.0     # mL dispensed per EC correction dose
 DOSE_RATE_ML  = 0.5     # mL/min — slow rate for dosing accuracy
 
-CIRC_WAIT     = 300    # Seconds to wait after a dose for solution to circulate
+CIRC_WAIT     = 300    # Seconds after a dose starts for solution to circulate
+SETTLE_AFTER_DOSE = 60  # Minimum seconds between a pump stopping and the re-read
+CONCURRENT_DOSING = False   # Correct pH and EC in the same mixing windows
+RESUME_MAX_AGE_S = 900  # Older checkpointed cycles are dropped, not resumed
+
+log = dms_log.get_logger("dcu")
 POLL_INTERVAL = 300    # Seconds between checks when both values are in range
-STARTUP_DELAY = 30      # Seconds to wait at boot for sensors to settle
 
 # ─────────────────────────────────────────────────────────────────────
-# EZO-PMP I2C helpers
+# EZO-PMP dosing
 # ─────────────────────────────────────────────────────────────────────
 
-def _send_command(bus, addr, command):
-    """Write an ASCII command string to an EZO-PMP over I2C."""
-    cmd_bytes = [ord(c) for c in command]
-    bus.write_i2c_block_data(addr, cmd_bytes[0], cmd_bytes[1:])
-    time.sleep(0.3)
+pumps = PumpManager(DMS.I2C_BUS, coordinator=DMS.coordinator)
+pumps.register("ph", PH_PUMP_ADDR, on_state=DMS.set_ph_pump)
+pumps.register("ec", EC_PUMP_ADDR, on_state=DMS.set_ec_pump)
+
+_tank_pumps = {}   # reservoir name -> PumpManager, for reservoirs other than main
+_models     = {}   # reservoir name -> dose_coupling.CouplingModel
+_cycles     = {}   # reservoir name -> dosing cycle in progress (checkpointed)
+_resume     = {}   # reservoir name -> cycle restored from the last checkpoint
+
+
+def pumps_for(tank):
+    """PumpManager driving `tank`'s EZO-PMPs (the module `pumps` for main)."""
+    if tank.is_main:
+        return pumps
+    manager = _tank_pumps.get(tank.name)
+    if manager is None:
+        manager = PumpManager(tank.i2c_bus, coordinator=DMS.coordinator,
+                              name=f"pumps-{tank.name}")
+        manager.register("ph", tank.ph_pump_addr, on_state=tank.set_ph_pump)
+        manager.register("ec", tank.ec_pump_addr, on_state=tank.set_ec_pump)
+        _tank_pumps[tank.name] = manager
+    return manager
+
+
+def coupling_model(tank):
+    """The tank's learned pH response to base and nutrient doses."""
+    model = _models.get(tank.name)
+    if model is None:
+        model = _models[tank.name] = dose_coupling.CouplingModel()
+    return model
+
+
+def _dispensed(job):
+    return job.dispensed_ml if job is not None else 0.0
+
+
+def _dose(pump, volume_ml, rate_ml_min=DOSE_RATE_ML, tank=None, reading=None, setpoint=None):
+    """Start a dose on `pump` and return its DoseJob.
+
+    If the pump is still dispensing an earlier dose, that job is returned
+    instead so doses are never stacked on top of each other. `reading` and
+    `setpoint` are recorded with the dose in DMS's dose journal, which gets
+    the dose when it starts, when it finishes, and if it fails to start.
+    """
+    tank = tank if tank is not None else DMS.main_reservoir
+    manager = pumps_for(tank)
+    job = manager.active(pump)
+    if job is not None:
+        log.info("Pump still dispensing, waiting on it instead", tank=tank.name, pump=pump, job=job)
+        return job
+    try:
+        job = manager.submit(pump, volume_ml, rate_ml_min)
+    except Exception:
+        DMS.record_dose_failure(pump, volume_ml, rate_ml_min, tank, reading, setpoint)
+        raise
+    DMS.record_dose_start(job, tank, reading, setpoint)
+    job.future.add_done_callback(lambda _: DMS.record_dose(job, tank, reading, setpoint))
+    return job
+
+
+def _track_cycle(tank, mode, jobs=(), ph_active=False, ec_active=False):
+    """Record the dosing cycle `tank` is in, for checkpoints.
+
+    `mode` is "ph", "ec" or "concurrent"; None means the cycle is over.
+    Called right after each dose starts, so a checkpoint is requested.
+    """
+    if mode is None:
+        if _cycles.pop(tank.name, None) is not None:
+            checkpoint.request()
+        return
+    offset = time.time() - time.monotonic()     # stored on the Unix clock
+    doses = [{"pump": job.pump, "volume_ml": job.volume_ml,
+              "rate_ml_min": job.rate_ml_min, "started": job.started + offset}
+             for job in jobs if job is not None and job.started is not None]
+    mix_until = max([d["started"] for d in doses], default=time.time()) + CIRC_WAIT
+    _cycles[tank.name] = {"mode": mode, "ph_active": ph_active, "ec_active": ec_active,
+                          "doses": doses, "mix_until": mix_until}
+    checkpoint.request()
+
+
+def checkpoint_state():
+    return {"cycles": dict(_cycles),
+            "models": {name: model.state() for name, model in _models.items()}}
+
+
+def restore_checkpoint(state, age_s):
+    """Restore the dose models and, if recent enough, the cycles in progress."""
+    for name, model_state in state.get("models", {}).items():
+        _models.setdefault(name, dose_coupling.CouplingModel()).restore(model_state)
+    cycles = state.get("cycles", {})
+    if cycles and age_s > RESUME_MAX_AGE_S:
+        log.warning("Checkpoint too old, not resuming dosing cycles",
+                    age_s=round(age_s), tanks=",".join(cycles))
+        return
+    _resume.update(cycles)
+
+
+checkpoint.register("dcu", checkpoint_state, restore_checkpoint)
+
 
+async def _resume_cycle(tank, cycle, worker, runtime, track):
+    """Finish the mixing window a checkpointed cycle was in.
+
+    Doses the pumps are still dispensing are taken over (their pump flags
+    and journal records follow them as usual); otherwise the remaining
+    mixing time is waited out. The caller then carries on with the cycle.
+    """
+    manager = pumps_for(tank)
+    offset = time.time() - time.monotonic()
+    jobs = []
+    for dose in cycle["doses"]:
+        try:
+            job = await runtime.run_blocking(manager.adopt, dose["pump"], dose["volume_ml"],
+                                             dose["rate_ml_min"], dose["started"] - offset)
+        except Exception as e:
+            log.error("Could not check pump", tank=tank.name, pump=dose["pump"], error=e)
+            continue
+        if job is not None:
+            DMS.resume_dose_record(job, tank)
+            job.future.add_done_callback(lambda _, job=job: DMS.record_dose(job, tank, None, None))
+            jobs.append(job)
+    _cycles[tank.name] = cycle
+    log.info("Resuming dosing cycle", tank=tank.name, mode=cycle["mode"],
+             running=",".join(job.pump for job in jobs) or "none")
+    with tracing.span("mix resumed", "dcu", track=track):
+        if jobs:
+            await _wait_for_mixing(jobs, worker)
+        else:
+            await worker.sleep(max(0, cycle["mix_until"] - time.time()))
+
+
+async def _wait_for_mixing(jobs, worker):
+    """Wait until the doses have finished and the tank has had time to mix.
+
+    Circulation mixes the tank while a pump is still running, so the
+    re-read is due CIRC_WAIT after each dose started, but never sooner than
+    SETTLE_AFTER_DOSE after the last pump actually stopped.
+    """
+    jobs = [job for job in jobs if job is not None]
+    if not jobs:
+        await worker.sleep(CIRC_WAIT)
+        return
+
+    for job in jobs:
+        job.future.add_done_callback(lambda _: worker.coordinator.wake())
+    if not await worker.sleep(None, until=lambda: all(job.done() for job in jobs)):
+        return
+    deadline = max(max(job.started + CIRC_WAIT, job.finished + SETTLE_AFTER_DOSE)
+                   for job in jobs)
+    await worker.sleep(max(0, deadline - time.monotonic()))
+
+
+async def _concurrent_cycle(tank, worker, runtime, track, ph_active, ec_active):
+    """Correct pH and EC together, one mixing window per round.
+
+    Each round doses what dose_coupling.plan() allows, waits one mixing
+    window and re-reads. A cycle ends when its value reaches its setpoint.
+    If a round plans no dose at all (nutrient held back for pH, with pH
+    itself in range) nothing would ever change, so the cycles still open
+    are returned as (ph_active, ec_active) for the sequential phases.
+    """
+    model = coupling_model(tank)
+    ph, ec = tank.read_ph(), tank.read_ec()
+    log.info("Starting concurrent dosing cycle", tank=tank.name, ph=ph, ec=ec,
+             ph_active=ph_active, ec_active=ec_active)
+    while True:
+        await worker.checkpoint()
+        ph_set, ec_set = tank.read_ph_set(), tank.read_ec_set()
+        ph_active = ph_active and ph < ph_set
+        ec_active = ec_active and ec < ec_set
+        if not (ph_active or ec_active):
+            break
+        base_ml, nutrient_ml, note = dose_coupling.plan(
+            model, ph, ec, tank.read_ph_min(), tank.read_ph_max(), ph_set, ec_set,
+            ph_active, ec_active, DOSE_PH_ML, DOSE_EC_ML)
+        if base_ml <= 0 and nutrient_ml <= 0:
+            log.info("Nothing to dose together, finishing sequentially", tank=tank.name,
+                     plan=note, ph_active=ph_active, ec_active=ec_active)
+            break
+
+        jobs = {}
+        for pump, ml, reading, setpoint in (("ph", base_ml, ph, ph_set),
+                                            ("ec", nutrient_ml, ec, ec_set)):
+            if ml <= 0:
+                continue
+            try:
+                with tracing.span(f"dose {pump}", "dcu", track=track, ml=ml):
+                    jobs[pump] = await runtime.run_blocking(_dose, pump, ml, DOSE_RATE_ML,
+                                                            tank, reading, setpoint)
+            except Exception as e:
+                log.error("Pump failed", tank=tank.name, pump=pump, error=e)
+        _track_cycle(tank, "concurrent", jobs.values(), ph_active, ec_active)
+        log.info("Dosing together", tank=tank.name, base_ml=round(base_ml, 2),
+                 nutrient_ml=nutrient_ml, plan=note, mix_s=CIRC_WAIT)
+
+        with tracing.span("mix", "dcu", track=track):
+            await _wait_for_mixing(jobs.values(), worker)
+
+        await worker.checkpoint()
+        ph_before = ph
+        ph, ec = tank.read_ph(), tank.read_ec()
+        model.observe(_dispensed(jobs.get("ph")), _dispensed(jobs.get("ec")), ph_before, ph)
+        log.info("Re-read", tank=tank.name, ph=ph, ph_set=ph_set, ec=ec, ec_set=ec_set)
+
+    _track_cycle(tank, None)
+    log.info("Concurrent dosing cycle done", tank=tank.name)
+    return ph_active, ec_active
+
+
+async def _idle(worker):
+    """Sleep POLL_INTERVAL, ending early if a setting changes (config.py)."""
+    await worker.sleep(POLL_INTERVAL, until=config.changed_since(config.generation))
 
-def _dose(i2c_bus, addr, volume_ml, rate_ml_min=DOSE_RATE_ML):
-    command = f"D,{volume_ml:.2f},{rate_ml_min:.2f}"
-    with SMBus(i2c_bus) as bus:
-        _send_command(bus, addr, command)
 # ─────────────────────────────────────────────────────────────────────
 # Control loop
 # ─────────────────────────────────────────────────────────────────────
 
 
 
-def control_loop(pause_event):
-    
-    print(f"[DCU] Waiting {STARTUP_DELAY}s for sensors to settle...")
-    time.sleep(STARTUP_DELAY)
-    print("[DCU] Control loop running.")
+async def control_loop(coordinator, runtime, tank=None):
+    tank = tank if tank is not None else DMS.main_reservoir
+    track = "dcu" if tank.is_main else f"dcu {tank.name}"
+    worker = coordinator.register("dcu" if tank.is_main else f"dcu-{tank.name}")
+    manager = pumps_for(tank)
+
+    log.info("Waiting for the first valid sensor reading", tank=tank.name)
+    while not await worker.sleep(None, until=tank.sensors_ready.is_set):
+        await worker.checkpoint()
+    log.info("Control loop running", tank=tank.name)
+
+    # A cycle cut short by a restart carries on where it was: its current
+    # mixing window is finished first, then its phase runs even though the
+    # re-read may no longer be below the trigger minimum
+    resume = _resume.pop(tank.name, None)
+    if resume is not None:
+        await _resume_cycle(tank, resume, worker, runtime, track)
+    resume_mode = resume["mode"] if resume is not None else None
 
     while True:
-        pause_event.wait()   # block here if calibration is active
+        await worker.checkpoint()   # block here if calibration is active
+        runtime.beat()
 
         try:
-            ph      = DMS.read_ph()
-            ec      = DMS.read_ec()
-            wl      = DMS.read_water_level()
-            ph_min  = DMS.read_ph_min()
-            ph_set  = DMS.read_ph_set()
-            ec_min  = DMS.read_ec_min()
-            ec_set  = DMS.read_ec_set()
+            ph      = tank.read_ph()
+            ec      = tank.read_ec()
+            wl      = tank.read_water_level()
+            ph_min  = tank.read_ph_min()
+            ph_set  = tank.read_ph_set()
+            ec_min  = tank.read_ec_min()
+            ec_set  = tank.read_ec_set()
 
-            print(f"[DCU] pH_live={ph:.2f}, ec_live={ec:.1f}, wl_live={wl}, ph_min={ph_min}, ph_set={ph_set}, ec_min={ec_min}, ec_set={ec_set}")
+            tracing.instant("dcu check", "dcu", tank=tank.name, ph=ph, ec=ec, water_level=wl)
+            log.debug("Check", tank=tank.name, ph=ph, ec=ec, water_level=wl,
+                      ph_min=ph_min, ph_set=ph_set, ec_min=ec_min, ec_set=ec_set)
 
             if wl == 0:
-                print("[DCU] Water level is 0 — skipping dosing cycle.")
-                for _ in range(int(POLL_INTERVAL / 0.1)):
-                    if not pause_event.is_set():
-                        break
-                    time.sleep(0.1)
+                log.warning("Water level is 0, skipping dosing cycle", tank=tank.name)
+                await _idle(worker)
                 continue
 
+            # ── Concurrent mode: both cycles share mixing windows; the
+            # sequential phases below then only pick up what is left ──
+            ph_left = ec_left = False
+            if resume_mode == "concurrent":
+                ph_left, ec_left = await _concurrent_cycle(
+                    tank, worker, runtime, track,
+                    resume["ph_active"] or ph < ph_min, resume["ec_active"] or ec < ec_min)
+                ph, ec = tank.read_ph(), tank.read_ec()
+            elif CONCURRENT_DOSING and (ph < ph_min or ec < ec_min):
+                ph_left, ec_left = await _concurrent_cycle(tank, worker, runtime, track,
+                                                           ph < ph_min, ec < ec_min)
+                ph, ec = tank.read_ph(), tank.read_ec()
+
             # ── Phase 1: correct pH first (triggered by min, dosed to setpoint) ──
-            if ph < ph_min:
-                DMS.set_ph_pump(True)
-                print(f"[DCU] pH {ph:.2f} below min {ph_min:.2f} — starting pH dosing cycle (target {ph_set:.2f}).")
-                while ph < DMS.read_ph_set():
-                    pause_event.wait()
+            if ph < ph_min or ph_left or resume_mode == "ph":
+                log.info("pH below min, starting pH dosing cycle", tank=tank.name,
+                         ph=ph, ph_min=ph_min, target=ph_set)
+                while ph < tank.read_ph_set():
+                    await worker.checkpoint()
 
+                    job = None
                     try:
-                        _dose(DMS.I2C_BUS, PH_PUMP_ADDR, DOSE_PH_ML)
-                        print(f"[DCU] Dosed {DOSE_PH_ML} mL base. Waiting {CIRC_WAIT}s...")
+                        with tracing.span("dose ph", "dcu", track=track, ml=DOSE_PH_ML):
+                            job = await runtime.run_blocking(_dose, "ph", DOSE_PH_ML,
+                                                             DOSE_RATE_ML, tank,
+                                                             ph, tank.read_ph_set())
+                        log.info("Dosing base", tank=tank.name, ml=job.volume_ml,
+                                 duration_s=round(job.expected_duration), mix_s=CIRC_WAIT)
                     except Exception as e:
-                        print(f"[DCU ERROR] pH pump failed: {e}")
+                        log.error("pH pump failed", tank=tank.name, error=e)
+                    _track_cycle(tank, "ph", [job])
 
-                    end_wait = time.time() + CIRC_WAIT
-                    while time.time() < end_wait:
-                        if not pause_event.is_set():
-                            break
-                        time.sleep(0.1)
+                    with tracing.span("mix ph", "dcu", track=track):
+                        await _wait_for_mixing([job], worker)
 
-                    pause_event.wait()
-                    ph = DMS.read_ph()
-                    print(f"[DCU] pH re-read: {ph:.2f} (setpoint {DMS.read_ph_set():.2f})")
+                    await worker.checkpoint()
+                    ph_before, ph = ph, tank.read_ph()
+                    coupling_model(tank).observe(_dispensed(job), 0.0, ph_before, ph)
+                    log.info("pH re-read", tank=tank.name, ph=ph, ph_set=tank.read_ph_set())
 
-                DMS.set_ph_pump(False)
-                print(f"[DCU] pH reached setpoint.")
+                _track_cycle(tank, None)
+                log.info("pH reached setpoint", tank=tank.name)
 
             # ── Phase 2: correct EC (triggered by min, dosed to setpoint) ──
-            if ec < ec_min:
-                DMS.set_ec_pump(True)
-                print(f"[DCU] EC {ec:.1f} below min {ec_min:.1f} — starting EC dosing cycle (target {ec_set:.1f}).")
-                while ec < DMS.read_ec_set():
-                    pause_event.wait()
+            if ec < ec_min or ec_left or resume_mode == "ec":
+                log.info("EC below min, starting EC dosing cycle", tank=tank.name,
+                         ec=ec, ec_min=ec_min, target=ec_set)
+                while ec < tank.read_ec_set():
+                    await worker.checkpoint()
 
+                    job = None
+                    ph_before = tank.read_ph()
                     try:
-                        _dose(DMS.I2C_BUS, EC_PUMP_ADDR, DOSE_EC_ML)
-                        print(f"[DCU] Dosed {DOSE_EC_ML} mL nutrients. Waiting {CIRC_WAIT}s...")
+                        with tracing.span("dose ec", "dcu", track=track, ml=DOSE_EC_ML):
+                            job = await runtime.run_blocking(_dose, "ec", DOSE_EC_ML,
+                                                             DOSE_RATE_ML, tank,
+                                                             ec, tank.read_ec_set())
+                        log.info("Dosing nutrients", tank=tank.name, ml=job.volume_ml,
+                                 duration_s=round(job.expected_duration), mix_s=CIRC_WAIT)
                     except Exception as e:
-                        print(f"[DCU ERROR] EC pump failed: {e}")
+                        log.error("EC pump failed", tank=tank.name, error=e)
+                    _track_cycle(tank, "ec", [job])
+
+                    with tracing.span("mix ec", "dcu", track=track):
+                        await _wait_for_mixing([job], worker)
 
-                    end_wait = time.time() + CIRC_WAIT
-                    while time.time() < end_wait:
-                        if not pause_event.is_set():
-                            break
-                        time.sleep(0.1)
+                    await worker.checkpoint()
+                    ec = tank.read_ec()
+                    coupling_model(tank).observe(0.0, _dispensed(job), ph_before, tank.read_ph())
+                    log.info("EC re-read", tank=tank.name, ec=ec, ec_set=tank.read_ec_set())
 
-                    pause_event.wait()
-                    ec = DMS.read_ec()
-                    print(f"[DCU] EC re-read: {ec:.1f} (setpoint {DMS.read_ec_set():.1f})")
+                _track_cycle(tank, None)
+                log.info("EC reached setpoint", tank=tank.name)
 
-                DMS.set_ec_pump(False)
-                print(f"[DCU] EC reached setpoint.")
+            resume_mode = None
 
             # ── Idle ──
-            print(f"[DCU] Both values at setpoint — idling {POLL_INTERVAL}s.")
-            end_idle = time.time() + POLL_INTERVAL
-            while time.time() < end_idle:
-                if not pause_event.is_set():
-                    break
-                time.sleep(0.1)
+            log.debug("Both values at setpoint, idling", tank=tank.name, idle_s=POLL_INTERVAL)
+            with tracing.span("idle", "dcu", track=track):
+                await _idle(worker)
 
         except Exception as e:
-            print(f"[DCU ERROR] Unhandled exception: {e}")
-            # Safety: clear pump flags on error so they don't get stuck
-            DMS.set_ph_pump(False)
-            DMS.set_ec_pump(False)
-            end_err = time.time() + POLL_INTERVAL
-            while time.time() < end_err:
-                if not pause_event.is_set():
-                    break
-                time.sleep(0.1)
+            log.exception("Unhandled exception", tank=tank.name)
+            _track_cycle(tank, None)
+            resume_mode = None
+            # Safety: clear pump flags on error so they don't get stuck,
+            # unless the pump really is still dispensing
+            if not manager.busy("ph"):
+                tank.set_ph_pump(False)
+            if not manager.busy("ec"):
+                tank.set_ec_pump(False)
+            await _idle(worker)
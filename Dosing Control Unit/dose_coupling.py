@@ -0,0 +1,106 @@
+# dose_coupling.py — pH/EC Dose Coupling Model
+# ELEC 421 Design
+# ─────────────────────────────────────────────────────────────────────
+# Responsibilities:
+#   - Model the pH change over one mixing window as
+#       Δph = ph_per_ml · base mL + coupling · nutrient mL
+#     where `coupling` is the pH shift nutrient additions cause (usually
+#     negative: nutrient concentrates are acidic)
+#   - Learn both terms per tank with recursive least squares from every
+#     mixing window the DCU runs, sequential or concurrent, forgetting old
+#     windows slowly so the model follows a changing nutrient mix
+#   - Plan a concurrent window: the base and nutrient volumes to dose
+#     together, with extra base to cancel the predicted nutrient shift,
+#     and pH keeping priority when it is far out of range
+#   Until MIN_WINDOWS windows have been seen (or with LEARN = False) the
+#   configured PH_PER_ML and COUPLING are used.
+# ─────────────────────────────────────────────────────────────────────
+
+import threading
+
+# ─────────────────────────────────────────────────────────────────────
+# Configuration
+# ─────────────────────────────────────────────────────────────────────
+
+PH_PER_ML      = 0.10    # pH rise per mL of base (set for your tank volume)
+COUPLING       = -0.01   # pH change per mL of nutrient
+LEARN          = True    # Refine both terms from observed windows
+MIN_WINDOWS    = 4       # Windows needed before the learned terms are used
+FORGET         = 0.98    # RLS forgetting factor per window
+PH_PER_ML_MIN  = 0.005   # Learned base effect is never taken below this
+PRIORITY_BAND  = 0.3     # pH this far below ph_min = dose pH only
+MAX_COMP_ML    = 1.0     # Most extra base added to cancel a nutrient dose
+
+
+class CouplingModel:
+    """Recursive least squares for (ph_per_ml, coupling), no intercept."""
+
+    def __init__(self, ph_per_ml=None, coupling=None):
+        self.theta   = [PH_PER_ML if ph_per_ml is None else ph_per_ml,
+                        COUPLING if coupling is None else coupling]
+        self.p       = [[1.0, 0.0], [0.0, 1e-2]]   # prior covariance
+        self.windows = 0
+        self._lock   = threading.Lock()
+
+    def terms(self):
+        """(ph_per_ml, coupling) to plan with."""
+        if not LEARN or self.windows < MIN_WINDOWS:
+            return PH_PER_ML, COUPLING
+        with self._lock:
+            return max(self.theta[0], PH_PER_ML_MIN), self.theta[1]
+
+    def observe(self, base_ml, nutrient_ml, ph_before, ph_after):
+        """Add one mixing window's doses (confirmed mL) and its pH change."""
+        x = (base_ml, nutrient_ml)
+        if x == (0, 0):
+            return
+        y = ph_after - ph_before
+        with self._lock:
+            p, th = self.p, self.theta
+            px = [p[0][0] * x[0] + p[0][1] * x[1], p[1][0] * x[0] + p[1][1] * x[1]]
+            denom = FORGET + x[0] * px[0] + x[1] * px[1]
+            gain = [px[0] / denom, px[1] / denom]
+            err = y - (th[0] * x[0] + th[1] * x[1])
+            self.theta = [th[0] + gain[0] * err, th[1] + gain[1] * err]
+            self.p = [[(p[i][j] - gain[i] * px[j]) / FORGET for j in range(2)] for i in range(2)]
+            self.windows += 1
+
+    def state(self):
+        with self._lock:
+            return {"theta": list(self.theta), "p": [list(r) for r in self.p],
+                    "windows": self.windows}
+
+    def restore(self, state):
+        with self._lock:
+            self.theta   = list(state["theta"])
+            self.p       = [list(r) for r in state["p"]]
+            self.windows = state["windows"]
+
+
+def plan(model, ph, ec, ph_min, ph_max, ph_set, ec_set, ph_active, ec_active,
+         dose_ph_ml, dose_ec_ml):
+    """Volumes for one concurrent mixing window.
+
+    `ph_active`/`ec_active` say whether each correction cycle is still
+    running. Returns (base_ml, nutrient_ml, note). The base dose is the
+    sequential step (when pH needs it) plus enough extra to cancel the
+    predicted nutrient shift, so pH moves no further than a sequential
+    window would. Nutrient is left out when pH is PRIORITY_BAND or more
+    below ph_min, or when it would take the predicted pH outside
+    [ph_min, ph_max] further than the base dose alone.
+    """
+    ph_per_ml, coupling = model.terms()
+    base_ml = dose_ph_ml if ph_active and ph < ph_set else 0.0
+    nutrient_ml = dose_ec_ml if ec_active and ec < ec_set else 0.0
+    if not nutrient_ml:
+        return base_ml, 0.0, "ph only"
+    if ph < ph_min - PRIORITY_BAND:
+        return base_ml, 0.0, "ph priority"
+
+    shift = coupling * nutrient_ml
+    comp_ml = min(max(0.0, -shift / ph_per_ml), MAX_COMP_ML)
+    without = ph + ph_per_ml * base_ml
+    predicted = without + ph_per_ml * comp_ml + shift
+    if predicted < min(without, ph_min) or predicted > max(without, ph_max):
+        return base_ml, 0.0, "ph priority"
+    return base_ml + comp_ml, nutrient_ml, "concurrent"
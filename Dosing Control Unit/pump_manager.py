@@ -0,0 +1,348 @@
+# pump_manager.py — EZO-PMP Dose Job Manager
+# ELEC 421 Design
+# ─────────────────────────────────────────────────────────────────────
+# Responsibilities:
+#   - Submit dose commands to Atlas Scientific EZO-PMP pumps without
+#     blocking the caller
+#   - Track each in-flight dose as a job and poll the pump over I2C for
+#     its dispensing state and dispensed volume
+#   - Report real pump activity through per-pump state callbacks so the
+#     DMS pump flags follow the hardware, not the control loop
+#   - Refuse to start a new dose on a pump that is still dispensing
+#   - Stop a pump that overruns its dose with X, and keep it busy until
+#     it reports idle; a pump that stops answering is marked faulted and
+#     stays busy until it answers idle again
+#   - Take over a dose that was started before a restart and is still
+#     running on the pump
+#   - Register the monitor thread with the DMS pause coordinator, when
+#     given one, so it stops polling I2C while calibration runs
+# ─────────────────────────────────────────────────────────────────────
+
+import logging
+import threading
+import time
+from concurrent.futures import Future, wait
+
+try:
+    from smbus2 import SMBus
+except ImportError:
+    from smbus import SMBus
+
+try:
+    import tracing          # DMS trace capture, when running under DMS
+except ImportError:
+    tracing = None
+
+log = logging.getLogger("dms.pump")   # written by dms_log under DMS
+
+# ─────────────────────────────────────────────────────────────────────
+# Configuration
+# ─────────────────────────────────────────────────────────────────────
+
+CMD_DELAY       = 0.3     # Seconds an EZO-PMP needs before a command reply is ready
+STATUS_POLL     = 5.0     # Seconds between status polls while a dose is in flight
+TIMEOUT_GRACE   = 60      # Extra seconds past the expected run time before giving up
+MAX_POLL_ERRORS = 5       # Consecutive I2C failures before a pump is marked faulted
+
+EZO_OK         = 1
+EZO_PENDING    = 254
+
+# ─────────────────────────────────────────────────────────────────────
+# EZO-PMP I2C helpers
+# ─────────────────────────────────────────────────────────────────────
+
+def _traced(bus):
+    return tracing.traced_bus(bus) if tracing is not None else bus
+
+
+def send_command(bus, addr, command):
+    """Write an ASCII command string to an EZO-PMP over I2C."""
+    cmd_bytes = [ord(c) for c in command]
+    bus.write_i2c_block_data(addr, cmd_bytes[0], cmd_bytes[1:])
+    time.sleep(CMD_DELAY)
+
+
+def query(bus, addr, command):
+    """Send a command and return the EZO-PMP text reply."""
+    send_command(bus, addr, command)
+    raw = bus.read_i2c_block_data(addr, 0x00, 32)
+    if raw[0] == EZO_PENDING:
+        time.sleep(CMD_DELAY)
+        raw = bus.read_i2c_block_data(addr, 0x00, 32)
+
+    status = raw[0]
+    text = "".join(chr(b) for b in raw[1:] if b not in (0, 255)).strip()
+
+    if status != EZO_OK:
+        raise RuntimeError(f"EZO-PMP 0x{addr:02X} error (status {status}): {text}")
+    return text
+
+
+def read_dispense_state(bus, addr):
+    """Return (dispensing, dispensed_ml) for the pump's current dose.
+
+    "D,?" answers "?D,<volume>,<state>" where state is 1 (forward),
+    -1 (reverse) or 0 (idle). "R" answers the volume dispensed so far.
+    """
+    state = query(bus, addr, "D,?").split(",")
+    if len(state) < 3 or state[0] != "?D":
+        raise RuntimeError(f"EZO-PMP 0x{addr:02X} unexpected D,? reply: {','.join(state)!r}")
+    dispensing = state[2].strip() not in ("0", "")
+
+    volume = query(bus, addr, "R")
+    try:
+        dispensed = abs(float(volume.split(",")[-1]))
+    except ValueError:
+        raise RuntimeError(f"EZO-PMP 0x{addr:02X} non-numeric R reply: {volume!r}")
+
+    return dispensing, dispensed
+
+# ─────────────────────────────────────────────────────────────────────
+# Dose jobs
+# ─────────────────────────────────────────────────────────────────────
+
+class DoseJob:
+    """One dose command and its progress on the pump.
+
+    `future` resolves to the dispensed volume in mL once the pump reports
+    it has stopped, so callers can block on `wait()` or wrap it with
+    asyncio.wrap_future().
+    """
+
+    def __init__(self, pump, addr, volume_ml, rate_ml_min):
+        self.pump         = pump
+        self.addr         = addr
+        self.volume_ml    = volume_ml
+        self.rate_ml_min  = rate_ml_min
+        self.started      = None    # time.monotonic() when the pump accepted the command
+        self.finished     = None    # time.monotonic() when the pump reported idle
+        self.dispensed_ml = 0.0
+        self.errors       = 0
+        self.error        = None    # failure reported once the pump is confirmed idle
+        self.faulted      = False   # unreachable: future failed, pump still counted busy
+        self.future       = Future()
+
+    @property
+    def expected_duration(self):
+        """Seconds the dose should take at the commanded rate."""
+        if self.rate_ml_min <= 0:
+            return 0.0
+        return self.volume_ml / self.rate_ml_min * 60
+
+    def done(self):
+        return self.future.done()
+
+    def wait(self, timeout=None):
+        """Block until the job finishes. Returns True if it did."""
+        done, _ = wait([self.future], timeout=timeout)
+        return bool(done)
+
+    def __repr__(self):
+        state = "faulted" if self.faulted else "done" if self.done() else "running"
+        return f"DoseJob({self.pump}, {self.dispensed_ml:.2f}/{self.volume_ml:.2f} mL, {state})"
+
+
+class PumpManager:
+    """Tracks in-flight doses for a set of EZO-PMP pumps on one I2C bus.
+
+    A single monitor thread polls the pumps while any job is running and
+    sleeps on a condition variable otherwise, so an idle system generates
+    no I2C traffic. With a `coordinator` the thread registers as worker
+    `name` and parks, without polling, while the coordinator is paused.
+    """
+
+    def __init__(self, i2c_bus, poll_interval=STATUS_POLL, coordinator=None, name="pumps"):
+        self.i2c_bus       = i2c_bus
+        self.poll_interval = poll_interval
+        self.coordinator   = coordinator
+        self.name          = name
+        self._pumps        = {}     # name -> (addr, on_state)
+        self._jobs         = {}     # name -> DoseJob (in flight only)
+        self._cond         = threading.Condition()
+        self._kicks        = 0      # bumped to cut the monitor's poll wait short
+        self._thread       = None
+        self._worker       = None
+
+    def register(self, name, addr, on_state=None):
+        """Add a pump. `on_state(active)` is called whenever its real state changes."""
+        with self._cond:
+            self._pumps[name] = (addr, on_state)
+
+    def active(self, name):
+        """Return the in-flight job for `name`, or None if the pump is idle.
+
+        A faulted pump keeps its (failed) job until it reports idle again.
+        """
+        with self._cond:
+            return self._jobs.get(name)
+
+    def busy(self, name):
+        return self.active(name) is not None
+
+    def start(self):
+        if self._thread is None:
+            if self.coordinator is not None:
+                self._worker = self.coordinator.register(self.name)
+            self._thread = threading.Thread(target=self._monitor_loop, daemon=True)
+            self._thread.start()
+
+    def submit(self, name, volume_ml, rate_ml_min):
+        """Start a dose and return its DoseJob without waiting for it to finish.
+
+        Raises RuntimeError if the pump already has a dose in flight.
+        """
+        with self._cond:
+            if name in self._jobs:
+                raise RuntimeError(f"{name} pump busy: {self._jobs[name]!r}")
+            addr, _ = self._pumps[name]
+            job = DoseJob(name, addr, volume_ml, rate_ml_min)
+            self._jobs[name] = job
+
+        try:
+            with SMBus(self.i2c_bus) as bus:
+                bus = _traced(bus)
+                send_command(bus, addr, f"D,{volume_ml:.2f},{rate_ml_min:.2f}")
+        except Exception as e:
+            self._finish(job, error=RuntimeError(f"{name} pump did not accept dose: {e}"))
+            raise
+
+        job.started = time.monotonic()
+        self._notify_state(name, True)
+        self._kick()
+        self.start()
+        return job
+
+    def adopt(self, name, volume_ml, rate_ml_min, started):
+        """Track a dose started before a restart, if the pump is still running it.
+
+        `started` is the dose's start on this process's time.monotonic()
+        clock. Returns the DoseJob, or None if the pump has gone idle.
+        """
+        addr, _ = self._pumps[name]
+        with SMBus(self.i2c_bus) as bus:
+            dispensing, dispensed = read_dispense_state(_traced(bus), addr)
+        if not dispensing:
+            return None
+        with self._cond:
+            if name in self._jobs:
+                return self._jobs[name]
+            job = DoseJob(name, addr, volume_ml, rate_ml_min)
+            job.started = started
+            job.dispensed_ml = dispensed
+            self._jobs[name] = job
+        self._notify_state(name, True)
+        self._kick()
+        self.start()
+        return job
+
+    def stop(self, name):
+        """Send X (stop dispensing) to a pump and let the monitor close out its job."""
+        addr, _ = self._pumps[name]
+        with SMBus(self.i2c_bus) as bus:
+            bus = _traced(bus)
+            send_command(bus, addr, "X")
+        self._kick()
+
+    def poll_once(self):
+        """Poll every in-flight job once and complete the ones that stopped."""
+        with self._cond:
+            jobs = [job for job in self._jobs.values() if job.started is not None]
+        if not jobs:
+            return
+
+        with SMBus(self.i2c_bus) as bus:
+            bus = _traced(bus)
+            for job in jobs:
+                try:
+                    dispensing, dispensed = read_dispense_state(bus, job.addr)
+                    job.errors = 0
+                except Exception as e:
+                    job.errors += 1
+                    log.warning("Status poll failed", extra={"fields": {
+                        "pump": job.pump, "errors": f"{job.errors}/{MAX_POLL_ERRORS}", "error": e}})
+                    if job.errors >= MAX_POLL_ERRORS and not job.faulted:
+                        self._fault(bus, job, RuntimeError(f"{job.pump} pump unreachable: {e}"))
+                    continue
+
+                job.dispensed_ml = dispensed
+                if not dispensing:
+                    self._finish(job, error=job.error)
+                    continue
+                limit = job.expected_duration + TIMEOUT_GRACE
+                if job.error is None and time.monotonic() - job.started > limit:
+                    job.error = TimeoutError(f"{job.pump} pump still dispensing after {limit:.0f}s")
+                    log.warning("Dose overran, stopping pump", extra={"fields": {
+                        "pump": job.pump, "dispensed_ml": dispensed, "volume_ml": job.volume_ml}})
+                if job.error is not None:
+                    self._send_stop(bus, job)    # again on every poll until it reports idle
+
+    def _send_stop(self, bus, job):
+        try:
+            send_command(bus, job.addr, "X")
+        except Exception as e:
+            log.error("Could not stop pump", extra={"fields": {"pump": job.pump, "error": e}})
+
+    def _fault(self, bus, job, error):
+        # The pump can't be read, so it may still be running: try to stop
+        # it, fail the job so callers stop waiting, but keep the job (and
+        # the pump flag) until a poll sees the pump idle
+        self._send_stop(bus, job)
+        job.faulted = True
+        job.error = error
+        job.finished = time.monotonic()
+        log.error("Pump unreachable, marked faulted until it reports idle",
+                  extra={"fields": {"pump": job.pump, "error": error}})
+        job.future.set_exception(error)
+
+    def _monitor_loop(self):
+        while True:
+            self._wait(None, until=lambda: bool(self._jobs))
+            try:
+                self.poll_once()
+            except Exception as e:
+                log.error("Status poll failed", extra={"fields": {"error": e}})
+            kicks = self._kicks
+            self._wait(self.poll_interval,
+                       until=lambda: not self._jobs or self._kicks != kicks)
+
+    def _wait(self, seconds, until):
+        # Sleep until `until()` holds or `seconds` pass, then hold off
+        # while the coordinator is paused. The worker is quiescent for
+        # the whole wait, so an idle monitor never delays a pause
+        if self._worker is None:
+            with self._cond:
+                self._cond.wait_for(until, seconds)
+            return
+        self._worker.sleep_blocking(seconds, until=until)
+        self._worker.checkpoint_blocking()
+
+    def _kick(self):
+        with self._cond:
+            self._kicks += 1
+            self._cond.notify_all()
+        if self.coordinator is not None:
+            self.coordinator.wake()
+
+    def _finish(self, job, error=None):
+        with self._cond:
+            if self._jobs.get(job.pump) is job:
+                del self._jobs[job.pump]
+        self._notify_state(job.pump, False)
+        if job.faulted:
+            log.info("Faulted pump reports idle again", extra={"fields": {"pump": job.pump}})
+            return
+        job.finished = time.monotonic()
+        if error is None:
+            log.info("Dose complete", extra={"fields": {
+                "pump": job.pump, "dispensed_ml": job.dispensed_ml, "volume_ml": job.volume_ml}})
+            job.future.set_result(job.dispensed_ml)
+        else:
+            job.future.set_exception(error)
+
+    def _notify_state(self, name, active):
+        _, on_state = self._pumps[name]
+        if on_state is not None:
+            try:
+                on_state(active)
+            except Exception as e:
+                log.error("State callback failed", extra={"fields": {"pump": name, "error": e}})
@@ -0,0 +1,78 @@
+# test_concurrent_dosing.py — Concurrent Dosing Regression Tests
+# ELEC 421 Design
+# ─────────────────────────────────────────────────────────────────────
+# Responsibilities:
+#   - Pin down the case where dose_coupling.plan() holds nutrient back
+#     for pH while pH itself is in range, so a concurrent round doses
+#     nothing at all
+#   - Check that _concurrent_cycle() then hands EC to the sequential
+#     phases instead of waiting out empty mixing windows forever
+#   Run with `python -m pytest` from this folder. The DCU test needs the
+#   Pi's hardware libraries (smbus2, gpiozero, pyserial) and is skipped
+#   without them.
+# ─────────────────────────────────────────────────────────────────────
+
+import asyncio
+import os
+import sys
+
+import pytest
+
+import dose_coupling
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+for folder in ("Data Management System", "Sensor Array Unit", "Network"):
+    sys.path.insert(0, os.path.join(HERE, "..", folder))
+
+
+def _learned_model():
+    """A model that has seen nutrient windows drop pH by ~0.1 per mL."""
+    model = dose_coupling.CouplingModel()
+    for _ in range(40):
+        model.observe(0.0, 5.0, 6.0, 5.5)
+    return model
+
+
+def test_plan_holds_nutrient_back_with_ph_in_range():
+    base_ml, nutrient_ml, note = dose_coupling.plan(
+        _learned_model(), ph=5.9, ec=800, ph_min=5.8, ph_max=6.5, ph_set=6.0,
+        ec_set=1200, ph_active=False, ec_active=True, dose_ph_ml=1.0, dose_ec_ml=5.0)
+    assert (base_ml, nutrient_ml, note) == (0.0, 0.0, "ph priority")
+
+
+class _Tank:
+    name = "main"
+    is_main = True
+
+    def read_ph(self):      return 5.9
+    def read_ec(self):      return 800
+    def read_ph_min(self):  return 5.8
+    def read_ph_max(self):  return 6.5
+    def read_ph_set(self):  return 6.0
+    def read_ec_set(self):  return 1200
+
+
+class _Worker:
+    async def checkpoint(self):
+        pass
+
+    async def sleep(self, seconds, until=None):
+        raise AssertionError("concurrent cycle waited out a window with no doses")
+
+
+def test_concurrent_cycle_hands_ec_to_sequential_phase(monkeypatch):
+    for module in ("smbus2", "gpiozero", "serial"):
+        pytest.importorskip(module)
+    import DCU_Logic as DCU
+
+    def no_dose(*args):
+        raise AssertionError("nothing should be dosed")
+
+    tank = _Tank()
+    monkeypatch.setattr(DCU, "_dose", no_dose)
+    monkeypatch.setitem(DCU._models, tank.name, _learned_model())
+
+    left = asyncio.run(DCU._concurrent_cycle(tank, _Worker(), None, "dcu",
+                                             ph_active=False, ec_active=True))
+    assert left == (False, True)
+    assert tank.name not in DCU._cycles
@@ -6,17 +6,22 @@
 #   1. On startup, configure the RAK3272 and join the LoRaWAN network (OTAA).
 #   2. Every 5 minutes, pull the latest encoded payload from DMS and send
 #      a confirmed uplink.
-#   3. Continuously monitor the serial port for downlink events and forward
-#      decoded payloads to DMS via downlink_queue.
+#   3. Monitor the serial port for downlink events between uplinks and
+#      forward decoded payloads to DMS via downlink_queue.
 #   4. Verify network status before every uplink and rejoin if needed.
 #      An uplink_busy flag pauses the downlink listener during transmission
 #      to prevent RX/TX collisions on the shared serial port.
 # ─────────────────────────────────────────────────────────────────────
 
 import json
+import logging
+import select
 import threading
 import time
-import serial
+
+serial = None   # pyserial, imported by _open_serial() so importing LoRa_run stays cheap
+
+log = logging.getLogger("dms.lora")   # written by dms_log under DMS
 
 # ─────────────────────────────────────────────────────────────────────
 # Configuration
@@ -43,6 +48,15 @@ def set_downlink_queue(q):
     downlink_queue_ref = q
 
 
+#Optional timing hook: called as hook(command_name, seconds) after each AT
+#command round trip (DMS feeds it into its metrics)
+timing_hook = None
+
+def set_timing_hook(fn):
+    global timing_hook
+    timing_hook = fn
+
+
 # ─────────────────────────────────────────────────────────────────────
 # Serial port and concurrency primitives
 # ─────────────────────────────────────────────────────────────────────
@@ -50,21 +64,26 @@ def set_downlink_queue(q):
 ser          = None
 serial_lock  = threading.Lock()
 uplink_busy  = threading.Event()    # Set during TX; pauses the downlink listener
+stop_event   = threading.Event()    # Set by shutdown(); ends join/open retries
+serial_ready = threading.Event()    # Set once the serial port is open
 
 
 def _open_serial():
     """Open the serial port with retries. Blocks until the port is available.
     Called once from lorawan_init() so the port is never opened at import time.
     """
-    global ser
-    while True:
+    global ser, serial
+    if serial is None:
+        import serial
+    while not stop_event.is_set():
         try:
             ser = serial.Serial(SERIAL_PORT, BAUD_RATE, timeout=2)
-            print(f"[LoRa] Serial port {SERIAL_PORT} opened.")
+            serial_ready.set()
+            log.info("Serial port opened", extra={"fields": {"port": SERIAL_PORT}})
             return
         except serial.SerialException as e:
-            print(f"[LoRa] Serial port not ready ({e}) — retrying in 5s...")
-            time.sleep(5)
+            log.warning("Serial port not ready, retrying in 5s", extra={"fields": {"error": e}})
+            stop_event.wait(5)
 
 # ─────────────────────────────────────────────────────────────────────
 # Serial helpers
@@ -82,12 +101,15 @@ def send_at(command, delay=1.0):
     before this function returns.
     """
     if ser is None:
-        print(f"[LoRa] Serial not ready — cannot send: {command}")
+        log.warning("Serial not ready, cannot send", extra={"fields": {"command": command}})
         return []
+    start = time.monotonic()
     with serial_lock:
         ser.write((command + "\r\n").encode())
         time.sleep(delay)
         raw = ser.read(ser.in_waiting).decode(errors="ignore")
+    if timing_hook is not None:
+        timing_hook(command.split("=", 1)[0], time.monotonic() - start)
     lines = _parse_lines(raw)
     for line in lines:
         _handle_downlink_line(line)
@@ -110,9 +132,12 @@ def lorawan_init():
     procedure. Blocks and retries until the join succeeds. Exits
     immediately if the device is already joined.
     """
-    _open_serial()
+    if ser is None:
+        _open_serial()
+    if stop_event.is_set():
+        return
     if _is_joined():
-        print("[LoRa] Already joined.")
+        log.info("Already joined")
         return
 
     # Write LoRaWAN parameters
@@ -131,20 +156,21 @@ def lorawan_init():
     attempt = 0
     while not _is_joined():
         attempt += 1
-        print(f"[LoRa] Join attempt {attempt} — starting OTAA procedure...")
+        log.info("Starting OTAA join", extra={"fields": {"attempt": attempt}})
         send_at(f"AT+JOIN=1:0:{JOIN_POLL_DELAY}:{JOIN_POLL_MAX}")
         for _ in range(JOIN_POLL_MAX):
-            time.sleep(JOIN_POLL_DELAY)
+            if stop_event.wait(JOIN_POLL_DELAY):
+                return
             if _is_joined():
                 break
 
-    print("[LoRa] Network join successful.")
+    log.info("Network join successful")
 
 
 def ensure_joined():
     """Verify the device is still joined; rejoin silently if the link was lost."""
     if not _is_joined():
-        print("[LoRa] Connection lost — rejoining...")
+        log.warning("Connection lost, rejoining")
         lorawan_init()
 
 # ─────────────────────────────────────────────────────────────────────
@@ -166,29 +192,33 @@ def _handle_downlink_line(line):
 
     if downlink_queue_ref is not None:
         downlink_queue_ref.put(hex_data)
-        print(f"[LoRa RX] Downlink forwarded: {hex_data}")
+        log.debug("Downlink forwarded", extra={"fields": {"payload": hex_data}})
     else:
-        print(f"[LoRa RX] Downlink received but no queue registered: {hex_data}")
+        log.warning("Downlink received but no queue registered", extra={"fields": {"payload": hex_data}})
 
 
-def downlink_listener():
-    """Background thread — drains the serial buffer between uplink cycles.
+def poll_downlinks(timeout):
+    """Wait up to `timeout` seconds for unsolicited serial data and forward downlinks.
 
-    Reads unsolicited RAK3272 events and forwards any downlinks to DMS.
-    Pauses while uplink_busy is set so the TX/ACK window is never
-    interrupted by a concurrent serial read.
+    Blocks in select() on the serial descriptor instead of polling, so an
+    idle link costs no wakeups. Backs off while uplink_busy is set so the
+    TX/ACK window is never interrupted by a concurrent serial read.
     """
-    while True:
-        if ser is None:
-            time.sleep(0.5)
-            continue
-        if not uplink_busy.is_set():
-            with serial_lock:
-                if ser.in_waiting:
-                    raw = ser.read(ser.in_waiting).decode(errors="ignore")
-                    for line in _parse_lines(raw):
-                        _handle_downlink_line(line)
+    if ser is None:
+        serial_ready.wait(timeout)
+        return
+    if uplink_busy.is_set():
         time.sleep(0.1)
+        return
+
+    readable, _, _ = select.select([ser.fileno()], [], [], timeout)
+    if not readable or uplink_busy.is_set():
+        return
+    with serial_lock:
+        if ser.in_waiting:
+            raw = ser.read(ser.in_waiting).decode(errors="ignore")
+            for line in _parse_lines(raw):
+                _handle_downlink_line(line)
 
 # ─────────────────────────────────────────────────────────────────────
 # Uplink
@@ -199,22 +229,37 @@ def send_uplink(payload_hex, port=UPLINK_PORT):
     """Verify the network connection and send a confirmed LoRaWAN uplink.
 
     Sets uplink_busy for the duration of the send so the downlink listener
-    does not contend with the active TX/ACK window.
+    does not contend with the active TX/ACK window. Returns True if the
+    module accepted the SEND command.
     """
 
     if ser is None:
-        print("[LoRa TX] Serial port not ready — skipping uplink.")
-        return
+        log.warning("Serial port not ready, skipping uplink")
+        return False
     ensure_joined()
     uplink_busy.set()
     try:
         resp = send_at(f"AT+SEND={port}:{payload_hex}", delay=2.0)
         if not any("OK" in line for line in resp):
-            print("[LoRa TX] Warning: module did not return OK for SEND command.")
+            log.warning("Module did not return OK for SEND", extra={"fields": {"port": port}})
+            return False
+        return True
     finally:
         uplink_busy.clear()
 
 
+def shutdown():
+    """Stop join/open retries and close the serial port."""
+    global ser
+    stop_event.set()
+    with serial_lock:
+        if ser is not None:
+            ser.close()
+            ser = None
+    serial_ready.clear()
+    log.info("Serial port closed")
+
+
 if __name__ == "__main__":
     pass
 
@@ -3,7 +3,6 @@
 #Sensor Reading Script
 
 import time
-from gpiozero import DigitalInputDevice
 
 #Enabling I2C Connection
 try:
@@ -34,81 +33,107 @@ POLL_S = 60
 
 #Initializing GPIO 16
 in_pin = None
+flow_pins = {}    # GPIO number -> DigitalInputDevice, for every tank's flow switch
+
+#Optional I2C mux (TCA9548A) for address sets that repeat across tanks,
+#e.g. the fixed 0x77/0x78 water-level boards
+MUX_ADDR = 0x70
+
+#Optional timing hook: called as hook(device, seconds) after each device
+#read (DMS feeds it into its metrics)
+timing_hook = None
+
+def set_timing_hook(fn):
+    global timing_hook
+    timing_hook = fn
+
+def _timed(device, fn, *args):
+    if timing_hook is None:
+        return fn(*args)
+    start = time.monotonic()
+    try:
+        return fn(*args)
+    finally:
+        timing_hook(device, time.monotonic() - start)
+
+
+#Address set for one tank's sensor array
+class TankAddresses:
+    def __init__(self, name="main", rtd=RTD_ADDR, ec=EC_ADDR, ph=PH_ADDR,
+                 level_low=ADDR_LOW, level_high=ADDR_HIGH, mux_channel=None,
+                 flow_pin=FLOW_PIN, isolated=False):
+        self.name        = name
+        self.rtd         = rtd
+        self.ec          = ec
+        self.ph          = ph
+        self.level_low   = level_low
+        self.level_high  = level_high
+        self.mux_channel = mux_channel   # mux channel of the level boards (None = no mux)
+        self.flow_pin    = flow_pin
+        self.isolated    = isolated      # EC/pH on isolation carriers: safe to measure together
+
+    def label(self, device):
+        return device if self.name == "main" else f"{self.name}.{device}"
+
+DEFAULT_TANK = TankAddresses()
 
 
 ###Defining Functions###
 
 #Initializing GPIO 16 for the Flow Switch
-def init_flow_pin():
+def init_flow_pin(pin=FLOW_PIN):
     global in_pin
-    if in_pin is None:
-        in_pin = DigitalInputDevice(FLOW_PIN, pull_up=True)
+    if pin not in flow_pins:
+        from gpiozero import DigitalInputDevice   # imported here so importing sensors needs no GPIO
+        flow_pins[pin] = DigitalInputDevice(pin, pull_up=True)
+    if pin == FLOW_PIN:
+        in_pin = flow_pins[pin]
 
-def get_flow_state():
-    global in_pin
-    if in_pin is None:
-        init_flow_pin()
-    return in_pin.value
+def get_flow_state(pin=FLOW_PIN):
+    if pin not in flow_pins:
+        init_flow_pin(pin)
+    return flow_pins[pin].value
 
-def read_rtd_temp_c(bus):
-    bus.write_i2c_block_data(RTD_ADDR, ord('R'), [0x00])
-    time.sleep(RTD_DELAY)
-    raw = bus.read_i2c_block_data(RTD_ADDR, 0x00, 32)
+def _ezo_write(bus, addr, command):
+    data = [ord(c) for c in command] + [0x00]
+    bus.write_i2c_block_data(addr, data[0], data[1:])
+
+def _ezo_read(bus, addr, label):
+    raw = bus.read_i2c_block_data(addr, 0x00, 32)
 
     status = raw[0]
     text = "".join(chr(b) for b in raw[1:] if b not in (0, 255)).strip()
 
     if status != 1:
-        raise RuntimeError(f"RTD error (status {status}): {text}")
+        raise RuntimeError(f"{label} error (status {status}): {text}")
 
     try:
         return float(text)
     except ValueError:
-        raise RuntimeError(f"RTD non-numeric response: {text!r}")
+        raise RuntimeError(f"{label} non-numeric response: {text!r}")
+
+def read_rtd_temp_c(bus, addr=RTD_ADDR):
+    _ezo_write(bus, addr, "R")
+    time.sleep(RTD_DELAY)
+    return _ezo_read(bus, addr, "RTD")
 
-def read_ec_temp_comp_uScm(bus, temp_c):
-    cmd = f"T,{temp_c:.2f}"
-    data = [ord(c) for c in cmd] + [0x00]
-    bus.write_i2c_block_data(EC_ADDR, data[0], data[1:])
+def read_ec_temp_comp_uScm(bus, temp_c, addr=EC_ADDR):
+    _ezo_write(bus, addr, f"T,{temp_c:.2f}")
     time.sleep(EC_TEMP_DELAY)
 
-    bus.write_i2c_block_data(EC_ADDR, ord('R'), [0x00])
+    _ezo_write(bus, addr, "R")
     time.sleep(EC_MEAS_DELAY)
 
-    raw = bus.read_i2c_block_data(EC_ADDR, 0x00, 32)
-
-    status = raw[0]
-    text = "".join(chr(b) for b in raw[1:] if b not in (0, 255)).strip()
-
-    if status != 1:
-        raise RuntimeError(f"EC error (status {status}): {text}")
-
-    try:
-        return float(text)
-    except ValueError:
-        raise RuntimeError(f"EC non-numeric response: {text!r}")
+    return _ezo_read(bus, addr, "EC")
 
-def read_ph_temp_comp(bus, temp_c):
-    cmd = f"T,{temp_c:.2f}"
-    data = [ord(c) for c in cmd] + [0x00]
-    bus.write_i2c_block_data(PH_ADDR, data[0], data[1:])
+def read_ph_temp_comp(bus, temp_c, addr=PH_ADDR):
+    _ezo_write(bus, addr, f"T,{temp_c:.2f}")
     time.sleep(PH_TEMP_DELAY)
 
-    bus.write_i2c_block_data(PH_ADDR, ord('R'), [0x00])
+    _ezo_write(bus, addr, "R")
     time.sleep(PH_MEAS_DELAY)
 
-    raw = bus.read_i2c_block_data(PH_ADDR, 0x00, 32)
-
-    status = raw[0]
-    text = "".join(chr(b) for b in raw[1:] if b not in (0, 255)).strip()
-
-    if status != 1:
-        raise RuntimeError(f"pH error (status {status}): {text}")
-
-    try:
-        return float(text)
-    except ValueError:
-        raise RuntimeError(f"pH non-numeric response: {text!r}")
+    return _ezo_read(bus, addr, "pH")
 
 def decode_u16_list(byte_list, little_endian=True):
     if len(byte_list) % 2 != 0:
@@ -124,12 +149,24 @@ def decode_u16_list(byte_list, little_endian=True):
 
     return values
 
-def read_sections(bus):
+#A muxed tank's channel is closed again after its read (even a failed one),
+#so unmuxed boards at the same addresses never answer alongside it.
+def read_sections(bus, tank=DEFAULT_TANK):
+    if tank.mux_channel is None:
+        return _read_level_boards(bus, tank)
+
+    bus.write_byte(MUX_ADDR, 1 << tank.mux_channel)
+    try:
+        return _read_level_boards(bus, tank)
+    finally:
+        bus.write_byte(MUX_ADDR, 0)
+
+def _read_level_boards(bus, tank):
     # 8 pads * 2 bytes each = 16 bytes
-    low_bytes = bus.read_i2c_block_data(ADDR_LOW, 0x00, 16)
+    low_bytes = bus.read_i2c_block_data(tank.level_low, 0x00, 16)
 
     # 12 pads * 2 bytes each = 24 bytes
-    high_bytes = bus.read_i2c_block_data(ADDR_HIGH, 0x00, 24)
+    high_bytes = bus.read_i2c_block_data(tank.level_high, 0x00, 24)
 
     low = decode_u16_list(low_bytes, little_endian=True)
     high = decode_u16_list(high_bytes, little_endian=True)
@@ -149,29 +186,101 @@ def sections_wet(low, high, threshold=THRESHOLD):
 
     return count
 
+#One pipelined EZO stage: command every device, wait once, then read them
+#all, so tanks on the same bus share each EZO delay.
+#jobs are (tank index, tank, device, addr, label); tanks already in
+#`errors` are skipped. Returns {(tank index, device): value}.
+def _ezo_stage(bus, jobs, errors, temps=None, temp_delay=0.0, meas_delay=0.0):
+    jobs = [job for job in jobs if job[0] not in errors]
+    if not jobs:
+        return {}
+    started = {}
+
+    if temps is not None:
+        for i, tank, device, addr, label in jobs:
+            started[(i, device)] = time.monotonic()
+            try:
+                _ezo_write(bus, addr, f"T,{temps[i]:.2f}")
+            except Exception as e:
+                errors[i] = e
+        time.sleep(temp_delay)
+
+    for i, tank, device, addr, label in jobs:
+        if i in errors:
+            continue
+        started.setdefault((i, device), time.monotonic())
+        try:
+            _ezo_write(bus, addr, "R")
+        except Exception as e:
+            errors[i] = e
+    time.sleep(meas_delay)
+
+    values = {}
+    for i, tank, device, addr, label in jobs:
+        if i in errors:
+            continue
+        try:
+            values[(i, device)] = _ezo_read(bus, addr, label)
+        except Exception as e:
+            errors[i] = e
+        if timing_hook is not None:
+            timing_hook(tank.label(device), time.monotonic() - started[(i, device)])
+    return values
+
+#Read several tanks' sensor arrays on one bus. EZO waits overlap across
+#tanks, so a second tank adds only its I2C transfers, not another ~3.3 s.
+#Returns one reading dict (or the exception that tank raised) per tank.
+def read_tanks(bus, tanks):
+    errors = {}
+    idx = list(enumerate(tanks))
+
+    values = _ezo_stage(bus, [(i, t, "rtd", t.rtd, "RTD") for i, t in idx], errors,
+                        meas_delay=RTD_DELAY)
+    temps = {i: values[(i, "rtd")] for i, _ in idx if (i, "rtd") in values}
+
+    # EC and pH in the same tank interfere unless the probes are isolated,
+    # so pH normally gets its own stage after EC
+    ec_jobs    = [(i, t, "ec", t.ec, "EC") for i, t in idx]
+    ph_with_ec = [(i, t, "ph", t.ph, "pH") for i, t in idx if t.isolated]
+    ph_after   = [(i, t, "ph", t.ph, "pH") for i, t in idx if not t.isolated]
+
+    if ph_with_ec:
+        values.update(_ezo_stage(bus, ec_jobs + ph_with_ec, errors, temps,
+                                 max(EC_TEMP_DELAY, PH_TEMP_DELAY),
+                                 max(EC_MEAS_DELAY, PH_MEAS_DELAY)))
+    else:
+        values.update(_ezo_stage(bus, ec_jobs, errors, temps, EC_TEMP_DELAY, EC_MEAS_DELAY))
+    values.update(_ezo_stage(bus, ph_after, errors, temps, PH_TEMP_DELAY, PH_MEAS_DELAY))
+
+    results = []
+    for i, tank in idx:
+        if i in errors:
+            results.append(errors[i])
+            continue
+        try:
+            low, high = _timed(tank.label("level"), read_sections, bus, tank)
+            n = sections_wet(low, high)
+            flow_state = get_flow_state(tank.flow_pin)
+        except Exception as e:
+            results.append(e)
+            continue
+
+        results.append({
+            "temperature": values[(i, "rtd")],
+            "ec": values[(i, "ec")],
+            "ph": values[(i, "ph")],
+            "water_level": n * 5,
+            "circulation": bool(flow_state),
+            "o2": 0.0,
+        })
+    return results
+
 #Function Utilized in DMS script
-def read_all_sensors(bus):
-    if in_pin is None:
-        init_flow_pin()
-
-    temp_c = read_rtd_temp_c(bus)
-    ec_uS = read_ec_temp_comp_uScm(bus, temp_c)
-    ph_val = read_ph_temp_comp(bus, temp_c)
-
-    low, high = read_sections(bus)
-    n = sections_wet(low, high)
-    percent = n * 5
-
-    flow_state = in_pin.value
-
-    return {
-        "temperature": temp_c,
-        "ec": ec_uS,
-        "ph": ph_val,
-        "water_level": percent,
-        "circulation": bool(flow_state),
-        "o2": 0.0,
-    }
+def read_all_sensors(bus, tank=DEFAULT_TANK):
+    result = read_tanks(bus, [tank])[0]
+    if isinstance(result, Exception):
+        raise result
+    return result
 
 #Leaving Main for Debugging in Case of Errors.
 def main():
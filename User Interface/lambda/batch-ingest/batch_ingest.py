@@ -0,0 +1,696 @@
+# batch_ingest.py — Batched Measurement Ingestion
+# ELEC 421 Design
+# ─────────────────────────────────────────────────────────────────────
+# Responsibilities:
+#   - Stand-in for the per-event supabase-writer Lambda when many uplinks
+#     arrive at once (backfill, several devices)
+#   - Accept IoT uplink events from a file drop directory (*.jsonl) or a
+#     local TCP queue (newline-delimited JSON on 127.0.0.1:5002)
+#   - Decode payloads in batches (numpy when installed) with the same
+#     validation as the Lambda: 10-byte length check and all-zero rejection
+#   - Accept sequenced (version 2) payloads too: rebuild each reading's
+#     measurement time from its anchor and drop retransmitted frames, in
+#     O(1) per frame whatever order they arrive in
+#   - Write each batch with one bulk upsert through a reused connection
+#     (SQLite) or a connection pool (Postgres via psycopg2), keyed on the
+#     row time and its stream (device, FPort) so two reservoirs sampled on
+#     the same tick keep separate rows
+#   - Report rows/s while running
+#
+#   python3 batch_ingest.py --drop ./drop --sqlite measurements.db
+#   python3 batch_ingest.py --listen 5002 --postgres "dbname=ohm user=ohm"
+#   python3 batch_ingest.py --bench 100000        (synthetic throughput run)
+# ─────────────────────────────────────────────────────────────────────
+
+import argparse
+import base64
+import collections
+import json
+import queue
+import random
+import socketserver
+import sqlite3
+import struct
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import psycopg2
+    import psycopg2.pool
+    from psycopg2.extras import execute_values
+except ImportError:
+    psycopg2 = None
+
+# ─────────────────────────────────────────────────────────────────────
+# Configuration
+# ─────────────────────────────────────────────────────────────────────
+
+EXPECTED_LEN  = 10         # Payload bytes (same as the Lambda)
+BATCH_SIZE    = 2000       # Events decoded and written per batch
+BATCH_WAIT_S  = 0.5        # Max wait for a batch to fill before writing it
+MAX_QUEUE     = 50000      # Events buffered; producers block beyond this
+REPORT_S      = 5.0        # Seconds between rows/s reports
+DROP_POLL_S   = 1.0        # File drop directory scan interval
+LISTEN_HOST   = "127.0.0.1"
+LISTEN_PORT   = 5002
+PG_POOL_MAX   = 4
+
+# Payload layout (big-endian), see parsePayload() in supabase-writer:
+#   [ec:u16][ph x10:u8][temperature x10:i16][o2 x10:u16]
+#   [water level:u8][transpiration:u8][flags:u8]
+RECORD = struct.Struct(">HBhHBBB")
+FLAG_EC_DOSING  = 0x80
+FLAG_PH_DOSING  = 0x40
+FLAG_WATER_FLOW = 0x20
+
+# Sequenced payload (version 2, DMS.PAYLOAD_VERSION = 2): the 10-byte
+# record above followed by
+#   [seq:u16][offset s:u16]       14 bytes, seconds after the group's anchor
+#   [seq:u16][Unix time:u32]      16 bytes, an anchor
+# Frames come in groups of ANCHOR_EVERY sequence numbers; the group's first
+# frame is its anchor, and any frame may be sent as an anchor instead.
+SEQ_DELTA     = struct.Struct(">HH")
+SEQ_ANCHOR    = struct.Struct(">HI")
+SEQUENCED_LEN = (EXPECTED_LEN + SEQ_DELTA.size, EXPECTED_LEN + SEQ_ANCHOR.size)
+ANCHOR_EVERY  = 16         # Must match DMS.ANCHOR_EVERY
+ANCHORS_MAX   = 2048       # Anchors remembered (under half a 16-bit seq wrap)
+SEEN_MAX      = 65536      # Recent frames remembered for duplicate checks
+WAITING_MAX   = 10000      # Frames held for an anchor that has not arrived yet
+
+if np is not None:
+    RECORD_DTYPE = np.dtype([
+        ("ec", ">u2"), ("ph", "u1"), ("temperature", ">i2"), ("o2", ">u2"),
+        ("water_level", "u1"), ("transpiration", "u1"), ("flags", "u1"),
+    ])
+
+# measurements columns written by the Lambda, in insert order, then the
+# stream the row came from
+COLUMNS = (
+    "recorded_at", "ec", "ph", "temperature", "dissolved_oxygen", "water_level",
+    "transpiration_rate", "ec_dosing_flag", "ph_dosing_flag", "water_flow_ok",
+    "network_status", "device_id", "fport",
+)
+KEY = ("recorded_at", "device_id", "fport")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS measurements (
+    recorded_at         TEXT NOT NULL,
+    ec                  REAL,
+    ph                  REAL,
+    temperature         REAL,
+    dissolved_oxygen    REAL,
+    water_level         REAL,
+    transpiration_rate  INTEGER,
+    ec_dosing_flag      INTEGER,
+    ph_dosing_flag      INTEGER,
+    water_flow_ok       INTEGER,
+    network_status      TEXT,
+    device_id           TEXT NOT NULL DEFAULT '',
+    fport               INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (recorded_at, device_id, fport)
+)
+"""
+
+# Upsert on the (recorded_at, device_id, fport) key, like Prefer:
+# resolution=merge-duplicates on the Lambda's recorded_at key
+_UPDATE = ", ".join(f"{c} = excluded.{c}" for c in COLUMNS if c not in KEY)
+SQLITE_UPSERT = (f"INSERT INTO measurements ({', '.join(COLUMNS)}) "
+                 f"VALUES ({', '.join('?' * len(COLUMNS))}) "
+                 f"ON CONFLICT ({', '.join(KEY)}) DO UPDATE SET {_UPDATE}")
+PG_UPSERT = (f"INSERT INTO measurements ({', '.join(COLUMNS)}) VALUES %s "
+             f"ON CONFLICT ({', '.join(KEY)}) DO UPDATE SET {_UPDATE}")
+PG_SCHEMA = SCHEMA.replace("recorded_at         TEXT", "recorded_at         TIMESTAMPTZ")
+# Tables created before device_id/fport were keyed on recorded_at alone
+PG_MIGRATE = """
+ALTER TABLE measurements ADD COLUMN IF NOT EXISTS device_id TEXT NOT NULL DEFAULT '';
+ALTER TABLE measurements ADD COLUMN IF NOT EXISTS fport INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE measurements DROP CONSTRAINT IF EXISTS measurements_pkey;
+ALTER TABLE measurements ADD PRIMARY KEY (recorded_at, device_id, fport);
+"""
+
+
+# ─────────────────────────────────────────────────────────────────────
+# Event parsing and validation
+# ─────────────────────────────────────────────────────────────────────
+
+def get_payload_bytes(event):
+    """Payload bytes from an IoT event (PayloadData base64 or payloadHex)."""
+    if event.get("PayloadData"):
+        return base64.b64decode(event["PayloadData"])
+    if event.get("payloadHex"):
+        return bytes.fromhex(event["payloadHex"])
+    return None
+
+
+def event_time(event, received_at):
+    """ISO timestamp for the row.
+
+    The Lambda stamps rows with its own clock, which is right for live
+    events but not for backfill, so an explicit recorded_at or the LoRaWAN
+    gateway timestamp wins when present.
+    """
+    if event.get("recorded_at"):
+        return event["recorded_at"]
+    lorawan = (event.get("WirelessMetadata") or {}).get("LoRaWAN") or {}
+    if lorawan.get("Timestamp"):
+        return lorawan["Timestamp"]
+    return received_at
+
+
+class IngestStats:
+    def __init__(self):
+        self.received     = 0     # events taken off the queue
+        self.no_payload   = 0     # events without PayloadData/payloadHex
+        self.bad_length   = 0     # payloads that were not EXPECTED_LEN bytes
+        self.skipped_zero = 0     # all-zero readings (rejected like the Lambda)
+        self.duplicates   = 0     # same row key twice in one batch (last wins)
+        self.sequenced    = 0     # version 2 frames received
+        self.retransmits  = 0     # version 2 frames already ingested (dropped)
+        self.unanchored   = 0     # version 2 frames whose anchor never came (event time used)
+        self.written      = 0     # rows upserted
+        self.batches      = 0
+        self.write_seconds = 0.0
+
+    def as_dict(self):
+        return dict(vars(self))
+
+
+def stream_id(event):
+    """(device, FPort) an event came from: its row key and version 2 sequence.
+
+    Events without LoRaWAN metadata (backfill files) get ("", 0).
+    """
+    lorawan = (event.get("WirelessMetadata") or {}).get("LoRaWAN") or {}
+    return (event.get("WirelessDeviceId") or lorawan.get("DevEui") or "",
+            lorawan.get("FPort") or 0)
+
+
+class Sequencer:
+    """Measurement times and duplicate filtering for version 2 frames.
+
+    Anchors are looked up by (stream, first seq of the group), repeats by
+    (stream, seq, time), and frames that arrive before their anchor wait
+    under the anchor's key, so every frame costs a few dict operations.
+    Each table is bounded; the oldest entries go first.
+    """
+
+    def __init__(self, stats):
+        self.stats    = stats
+        self.anchors  = collections.OrderedDict()  # (stream, anchor seq) -> Unix time
+        self._seen    = collections.OrderedDict()  # (stream, seq, Unix time) -> None
+        self._waiting = collections.OrderedDict()  # (stream, anchor seq) -> [frames]
+        self._waiting_count = 0
+
+    def add(self, stream, frame, fallback_time):
+        """Take one frame; return the (recorded_at, record) pairs now ready.
+
+        That is usually the frame itself; nothing for a repeat or a frame
+        still waiting for its anchor; and the waiting frames as well when
+        an anchor arrives. `fallback_time` is used if the anchor is never seen.
+        """
+        record, trailer = frame[:EXPECTED_LEN], frame[EXPECTED_LEN:]
+        ready = []
+        if len(trailer) == SEQ_ANCHOR.size:
+            seq, t = SEQ_ANCHOR.unpack(trailer)
+            if seq % ANCHOR_EVERY == 0:
+                key = (stream, seq)
+                self.anchors[key] = t
+                self.anchors.move_to_end(key)
+                if len(self.anchors) > ANCHORS_MAX:
+                    self.anchors.popitem(last=False)
+                for w_seq, w_offset, w_record, _ in self._waiting.pop(key, ()):
+                    self._waiting_count -= 1
+                    self._emit(ready, stream, w_seq, t + w_offset, w_record)
+            self._emit(ready, stream, seq, t, record)
+            return ready
+
+        seq, offset = SEQ_DELTA.unpack(trailer)
+        key = (stream, seq - seq % ANCHOR_EVERY)
+        t = self.anchors.get(key)
+        if t is not None:
+            self._emit(ready, stream, seq, t + offset, record)
+            return ready
+        self._waiting.setdefault(key, []).append((seq, offset, record, fallback_time))
+        self._waiting_count += 1
+        while self._waiting_count > WAITING_MAX:
+            # Give up on the oldest group: its frames keep their event times
+            _, group = self._waiting.popitem(last=False)
+            self._waiting_count -= len(group)
+            self.stats.unanchored += len(group)
+            ready.extend((w_fallback, w_record) for _, _, w_record, w_fallback in group)
+        return ready
+
+    def _emit(self, ready, stream, seq, t, record):
+        key = (stream, seq, t)
+        if key in self._seen:
+            self.stats.retransmits += 1
+            return
+        self._seen[key] = None
+        if len(self._seen) > SEEN_MAX:
+            self._seen.popitem(last=False)
+        ready.append((datetime.fromtimestamp(t, timezone.utc).isoformat(), record))
+
+
+# ─────────────────────────────────────────────────────────────────────
+# Batch decoding
+# ─────────────────────────────────────────────────────────────────────
+
+def decode_batch(payloads, times, streams=None):
+    """Decode equal-length payloads into measurement rows (tuples in COLUMNS order).
+
+    `streams` holds each payload's (device, FPort); ("", 0) when omitted.
+    Returns (rows, zero_count). All-zero readings (temperature, pH and EC
+    all 0) are dropped, as in the Lambda.
+    """
+    if not payloads:
+        return [], 0
+    if streams is None:
+        streams = [("", 0)] * len(payloads)
+    if np is not None:
+        return _decode_numpy(payloads, times, streams)
+    return _decode_struct(payloads, times, streams)
+
+
+def _decode_numpy(payloads, times, streams):
+    arr = np.frombuffer(b"".join(payloads), dtype=RECORD_DTYPE)
+    keep = (arr["temperature"] != 0) | (arr["ph"] != 0) | (arr["ec"] != 0)
+    zero = len(arr) - int(keep.sum())
+    arr = arr[keep]
+    flags = arr["flags"]
+    keep_list = keep.tolist()
+    columns = (
+        [t for t, k in zip(times, keep_list) if k],
+        arr["ec"].astype(np.float64).tolist(),
+        (arr["ph"] / 10).tolist(),
+        (arr["temperature"] / 10).tolist(),
+        (arr["o2"] / 10).tolist(),
+        (arr["water_level"] / 10).tolist(),
+        arr["transpiration"].astype(np.int64).tolist(),
+        ((flags & FLAG_EC_DOSING) != 0).astype(np.int64).tolist(),
+        ((flags & FLAG_PH_DOSING) != 0).astype(np.int64).tolist(),
+        ((flags & FLAG_WATER_FLOW) != 0).astype(np.int64).tolist(),
+    )
+    kept = [s for s, k in zip(streams, keep_list) if k]
+    return [row + ("online",) + stream for row, stream in zip(zip(*columns), kept)], zero
+
+
+def _decode_struct(payloads, times, streams):
+    rows, zero = [], 0
+    for recorded_at, stream, (ec, ph, temp, o2, wl, trans, flags) in zip(
+            times, streams, RECORD.iter_unpack(b"".join(payloads))):
+        if temp == 0 and ph == 0 and ec == 0:
+            zero += 1
+            continue
+        rows.append((
+            recorded_at, float(ec), ph / 10, temp / 10, o2 / 10, wl / 10, trans,
+            1 if flags & FLAG_EC_DOSING else 0,
+            1 if flags & FLAG_PH_DOSING else 0,
+            1 if flags & FLAG_WATER_FLOW else 0,
+            "online",
+        ) + stream)
+    return rows, zero
+
+
+# ─────────────────────────────────────────────────────────────────────
+# Storage
+# ─────────────────────────────────────────────────────────────────────
+
+class SQLiteSink:
+    """Local stand-in for the Supabase measurements table (one reused connection)."""
+
+    def __init__(self, path):
+        self.conn = sqlite3.connect(str(path), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        with self.conn:
+            self._migrate()
+            self.conn.execute(SCHEMA)
+
+    def _migrate(self):
+        # SQLite can't change a primary key in place: rebuild a table keyed
+        # on recorded_at alone, its rows taking the ("", 0) stream
+        old = [row[1] for row in self.conn.execute("PRAGMA table_info(measurements)")]
+        if not old or "device_id" in old:
+            return
+        self.conn.execute("ALTER TABLE measurements RENAME TO measurements_v1")
+        self.conn.execute(SCHEMA)
+        cols = ", ".join(old)
+        self.conn.execute(f"INSERT INTO measurements ({cols}) SELECT {cols} FROM measurements_v1")
+        self.conn.execute("DROP TABLE measurements_v1")
+
+    def write(self, rows):
+        with self.conn:
+            self.conn.executemany(SQLITE_UPSERT, rows)
+
+    def count(self):
+        return self.conn.execute("SELECT COUNT(*) FROM measurements").fetchone()[0]
+
+    def close(self):
+        self.conn.close()
+
+
+class PostgresSink:
+    """Bulk upserts into Postgres through a psycopg2 connection pool."""
+
+    def __init__(self, dsn, max_connections=PG_POOL_MAX):
+        if psycopg2 is None:
+            raise RuntimeError("psycopg2 is not installed (pip install psycopg2-binary)")
+        self.pool = psycopg2.pool.ThreadedConnectionPool(1, max_connections, dsn)
+        conn = self.pool.getconn()
+        try:
+            with conn, conn.cursor() as cur:
+                cur.execute(PG_SCHEMA)
+                cur.execute("SELECT 1 FROM information_schema.columns "
+                            "WHERE table_name = 'measurements' AND column_name = 'device_id'")
+                if cur.fetchone() is None:
+                    cur.execute(PG_MIGRATE)
+        finally:
+            self.pool.putconn(conn)
+
+    def write(self, rows):
+        conn = self.pool.getconn()
+        try:
+            with conn, conn.cursor() as cur:
+                execute_values(cur, PG_UPSERT, rows, page_size=BATCH_SIZE)
+        finally:
+            self.pool.putconn(conn)
+
+    def count(self):
+        conn = self.pool.getconn()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT COUNT(*) FROM measurements")
+                return cur.fetchone()[0]
+        finally:
+            self.pool.putconn(conn)
+
+    def close(self):
+        self.pool.closeall()
+
+
+# ─────────────────────────────────────────────────────────────────────
+# Ingestor
+# ─────────────────────────────────────────────────────────────────────
+
+class Ingestor:
+    """Drains the event queue in batches: validate, decode, upsert."""
+
+    def __init__(self, sink, batch_size=BATCH_SIZE, batch_wait=BATCH_WAIT_S):
+        self.sink       = sink
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.events     = queue.Queue(maxsize=MAX_QUEUE)
+        self.stats      = IngestStats()
+        self.sequencer  = Sequencer(self.stats)
+        self._stop      = threading.Event()
+        self._warned    = 0
+
+    def submit(self, event):
+        """Queue one event dict (blocks while the queue is full)."""
+        self.events.put(event)
+
+    def stop(self):
+        self._stop.set()
+
+    def _warn(self, message):
+        # First few and then every 1000th, so a bad backfill can't flood the log
+        self._warned += 1
+        if self._warned <= 10 or self._warned % 1000 == 0:
+            print(f"[INGEST] {message}")
+
+    def _take_batch(self):
+        try:
+            batch = [self.events.get(timeout=self.batch_wait)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.batch_wait
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.events.get_nowait())
+            except queue.Empty:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.events.get(timeout=remaining))
+                except queue.Empty:
+                    break
+        return batch
+
+    def process(self, batch):
+        """Validate, decode and write one batch of events. Returns rows written."""
+        stats = self.stats
+        stats.received += len(batch)
+        received_at = datetime.now(timezone.utc).isoformat()
+        payloads, times, streams = [], [], []
+        for event in batch:
+            try:
+                payload = get_payload_bytes(event)
+            except (ValueError, TypeError) as e:
+                payload = None
+                self._warn(f"Undecodable payload: {e}")
+            if payload is None:
+                stats.no_payload += 1
+                continue
+            stream = stream_id(event)
+            if len(payload) in SEQUENCED_LEN:
+                stats.sequenced += 1
+                for recorded_at, record in self.sequencer.add(
+                        stream, payload, event_time(event, received_at)):
+                    payloads.append(record)
+                    times.append(recorded_at)
+                    streams.append(stream)
+                continue
+            if len(payload) != EXPECTED_LEN:
+                stats.bad_length += 1
+                self._warn(f"Bad payload length: {len(payload)} (expected {EXPECTED_LEN})")
+                continue
+            payloads.append(payload)
+            times.append(event_time(event, received_at))
+            streams.append(stream)
+
+        rows, zero = decode_batch(payloads, times, streams)
+        stats.skipped_zero += zero
+
+        # One statement can't upsert the same key twice; keep the newest
+        unique = {(row[0],) + row[-2:]: row for row in rows}
+        stats.duplicates += len(rows) - len(unique)
+        if unique:
+            start = time.perf_counter()
+            self.sink.write(list(unique.values()))
+            stats.write_seconds += time.perf_counter() - start
+            stats.written += len(unique)
+        stats.batches += 1
+        return len(unique)
+
+    def run(self):
+        """Consume the queue until stop() and the queue is empty."""
+        last_report, last_written = time.monotonic(), 0
+        while not (self._stop.is_set() and self.events.empty()):
+            batch = self._take_batch()
+            if batch:
+                try:
+                    self.process(batch)
+                except Exception as e:
+                    print(f"[INGEST ERROR] Batch of {len(batch)} failed: {e}")
+            now = time.monotonic()
+            if now - last_report >= REPORT_S:
+                rate = (self.stats.written - last_written) / (now - last_report)
+                print(f"[INGEST] {rate:,.0f} rows/s  queue={self.events.qsize()}  "
+                      f"{self.stats.as_dict()}")
+                last_report, last_written = now, self.stats.written
+
+
+# ─────────────────────────────────────────────────────────────────────
+# Sources
+# ─────────────────────────────────────────────────────────────────────
+
+def parse_line(line):
+    """One event from a JSON line; a bare hex string is taken as payloadHex."""
+    line = line.strip()
+    if not line:
+        return None
+    if line.startswith("{"):
+        return json.loads(line)
+    return {"payloadHex": line}
+
+
+def watch_drop_dir(directory, ingestor, stop):
+    """Queue every event in *.jsonl files dropped into `directory`.
+
+    Each file is renamed to *.done once all its lines are queued.
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    print(f"[INGEST] Watching {directory} for *.jsonl")
+    while not stop.is_set():
+        for path in sorted(directory.glob("*.jsonl")):
+            queued = 0
+            with open(path) as f:
+                for n, line in enumerate(f, 1):
+                    try:
+                        event = parse_line(line)
+                    except ValueError as e:
+                        ingestor._warn(f"{path.name}:{n}: {e}")
+                        continue
+                    if event is not None:
+                        ingestor.submit(event)
+                        queued += 1
+            path.rename(path.with_suffix(".done"))
+            print(f"[INGEST] Queued {queued} events from {path.name}")
+        stop.wait(DROP_POLL_S)
+
+
+class _QueueHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for raw in self.rfile:
+            try:
+                event = parse_line(raw.decode())
+            except ValueError as e:
+                self.server.ingestor._warn(f"Bad line from {self.client_address}: {e}")
+                continue
+            if event is not None:
+                self.server.ingestor.submit(event)
+
+
+class QueueServer(socketserver.ThreadingTCPServer):
+    """Local TCP queue: newline-delimited JSON events (or bare hex payloads)."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, ingestor, host=LISTEN_HOST, port=LISTEN_PORT):
+        self.ingestor = ingestor
+        super().__init__((host, port), _QueueHandler)
+
+
+# ─────────────────────────────────────────────────────────────────────
+# Benchmark
+# ─────────────────────────────────────────────────────────────────────
+
+def synthetic_events(n, seed=1, sequenced=False):
+    """`n` plausible events (plus a few zero/short ones) one minute apart.
+
+    With `sequenced` they are version 2 frames; about 3% are sent twice and
+    delivery is shuffled within runs of 8, as store-and-forward would.
+    """
+    rng = random.Random(seed)
+    t0 = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    events = []
+    for i in range(n):
+        if i % 500 == 499:
+            payload = bytes(EXPECTED_LEN)                 # all-zero, rejected
+        elif i % 500 == 250:
+            payload = bytes(EXPECTED_LEN - 1)             # short, rejected
+        else:
+            flags = (rng.random() < 0.05) * FLAG_EC_DOSING | (rng.random() < 0.05) * FLAG_PH_DOSING \
+                    | FLAG_WATER_FLOW
+            payload = RECORD.pack(rng.randint(900, 1800), rng.randint(58, 72),
+                                  rng.randint(180, 260), rng.randint(60, 90),
+                                  rng.randint(70, 95), rng.randint(0, 20), flags)
+        if not sequenced:
+            events.append({"payloadHex": payload.hex(),
+                           "recorded_at": (t0 + timedelta(minutes=i)).isoformat()})
+            continue
+        seq = i & 0xFFFF
+        if seq % ANCHOR_EVERY == 0:
+            payload += SEQ_ANCHOR.pack(seq, int(t0.timestamp()) + 60 * i)
+        else:
+            payload += SEQ_DELTA.pack(seq, 60 * (seq % ANCHOR_EVERY))
+        events.append({"payloadHex": payload.hex()})
+        if rng.random() < 0.03:
+            events.append(events[-1])                     # retransmission
+    if sequenced:
+        for i in range(0, len(events), 8):
+            run = events[i:i + 8]
+            rng.shuffle(run)
+            events[i:i + 8] = run
+    return events
+
+
+def bench(sink, n, per_row=False, sequenced=False):
+    events = synthetic_events(n, sequenced=sequenced)
+    ingestor = Ingestor(sink)
+    start = time.perf_counter()
+    if per_row:
+        # One decode and one commit per event, like one Lambda invocation each
+        for event in events:
+            ingestor.process([event])
+    else:
+        for i in range(0, n, ingestor.batch_size):
+            ingestor.process(events[i:i + ingestor.batch_size])
+    elapsed = time.perf_counter() - start
+    stats = ingestor.stats
+    mode = "per-row" if per_row else f"batch {ingestor.batch_size}"
+    if sequenced:
+        mode += ", sequenced"
+    print(f"[BENCH] {mode}, {'numpy' if np is not None else 'struct'} decode: "
+          f"{stats.written} rows in {elapsed:.2f}s = {stats.written / elapsed:,.0f} rows/s "
+          f"(write {stats.write_seconds:.2f}s)")
+    print(f"[BENCH] {stats.as_dict()}")
+
+
+# ─────────────────────────────────────────────────────────────────────
+# Main
+# ─────────────────────────────────────────────────────────────────────
+
+def main():
+    parser = argparse.ArgumentParser(description="Batched measurement ingestion (supabase-writer stand-in)")
+    parser.add_argument("--sqlite", default="measurements.db",
+                        help="SQLite database file (default: measurements.db)")
+    parser.add_argument("--postgres", metavar="DSN", help="write to Postgres instead of SQLite")
+    parser.add_argument("--drop", metavar="DIR", help="watch DIR for *.jsonl event files")
+    parser.add_argument("--listen", metavar="PORT", type=int, nargs="?", const=LISTEN_PORT,
+                        help=f"accept events over local TCP (default port {LISTEN_PORT})")
+    parser.add_argument("--bench", metavar="N", type=int, help="ingest N synthetic events and exit")
+    parser.add_argument("--per-row", action="store_true",
+                        help="with --bench: one write per event, for comparison")
+    parser.add_argument("--sequenced", action="store_true",
+                        help="with --bench: version 2 frames with retransmissions and reordering")
+    args = parser.parse_args()
+
+    sink = PostgresSink(args.postgres) if args.postgres else SQLiteSink(args.sqlite)
+    try:
+        if args.bench:
+            bench(sink, args.bench, args.per_row, args.sequenced)
+            return
+        if not args.drop and args.listen is None:
+            parser.error("give --drop DIR and/or --listen [PORT] (or --bench N)")
+
+        ingestor = Ingestor(sink)
+        stop = threading.Event()
+        if args.drop:
+            threading.Thread(target=watch_drop_dir, args=(args.drop, ingestor, stop),
+                             name="drop-watch", daemon=True).start()
+        server = None
+        if args.listen is not None:
+            server = QueueServer(ingestor, port=args.listen)
+            threading.Thread(target=server.serve_forever, name="queue-server",
+                             daemon=True).start()
+            print(f"[INGEST] Listening on {LISTEN_HOST}:{args.listen}")
+
+        print("[INGEST] Running. Ctrl+C to exit.")
+        try:
+            ingestor.run()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            stop.set()
+            if server is not None:
+                server.shutdown()
+            ingestor.stop()
+            ingestor.run()      # write whatever is still queued
+            print(f"[INGEST] Stopped. {ingestor.stats.as_dict()}")
+    finally:
+        sink.close()
+
+
+if __name__ == "__main__":
+    main()